@@ -1,22 +1,124 @@
 from app.services.florida_browser_service import FloridaBrowserService
+from app.services.florida_http_service import FloridaHttpService
 from app.db import DB
+from app.models.crawl_job import CrawlJobDao, SweepReport, FINISHED_STATUSES, CANCELLED, RUNNING
 from app.models.entity import EntityDao
-from fastapi import APIRouter, Body
-from typing import Annotated
-import asyncio
+from app.services.registry_sweep import initial_prefixes
+from fastapi import APIRouter, Body, HTTPException, Query
+from typing import List, Optional, Union
+from dataclasses import asdict
+import os
 
 
 crawler: APIRouter = APIRouter()
-florida_browser_service: FloridaBrowserService = FloridaBrowserService()
+
+
+def get_crawler_engine() -> Union[FloridaHttpService, FloridaBrowserService]:
+    # Sunbiz pages are server-rendered, so plain HTTP is the default. The
+    # Playwright engine stays available as a fallback via CRAWLER_ENGINE=browser.
+    engine = os.getenv("CRAWLER_ENGINE", "http")
+    if engine == "http":
+        return FloridaHttpService()
+    if engine == "browser":
+        return FloridaBrowserService()
+    raise ValueError(f"Unknown crawler engine: {engine}")
 
 
 @crawler.post("/initiate_crawl", status_code=201)
 async def initiate_crawl(search_term: str = Body(..., embed=True)): 
-    await florida_browser_service.ensure_ready()
+    # Crawl workers (worker.py, or CRAWL_API_WORKERS in this process) pick the job up.
+    # A term already queued or running, in any case, returns that job.
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    job = await crawl_job_dao.create(search_term)
+    return {"message": "Crawl already running" if job.status == RUNNING else "Crawl queued", "job": asdict(job)}
+
+
+@crawler.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    return [asdict(job) for job in await crawl_job_dao.list(status, limit)]
+
+
+@crawler.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    job = await crawl_job_dao.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    return asdict(job)
+
+
+@crawler.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    job = await crawl_job_dao.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    if job.status in FINISHED_STATUSES and job.status != CANCELLED:
+        raise HTTPException(status_code=409, detail=f"Crawl job already {job.status}")
+    return asdict(job)
+
+
+@crawler.post("/refresh", status_code=201)
+async def start_refresh():
+    # One refresh job at a time; asking again returns the one in progress.
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    job = await crawl_job_dao.create_refresh()
+    return {"message": "Refresh queued", "job": asdict(job)}
+
+
+@crawler.get("/dead_letters")
+async def list_dead_letters(limit: int = Query(50, ge=1, le=500)):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    return [asdict(dead_letter) for dead_letter in await crawl_job_dao.list_dead_letters(limit)]
+
+
+@crawler.post("/dead_letters/requeue", status_code=201)
+async def requeue_dead_letters():
+    # One retry job at a time; dead letters requeued meanwhile join the one in progress.
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    job = await crawl_job_dao.requeue_dead_letters()
+    if job is None:
+        raise HTTPException(status_code=404, detail="No dead letters to retry")
+    return {"message": "Retry queued", "job": asdict(job)}
+
+
+@crawler.get("/entities/{document_number}/changes")
+async def entity_changes(document_number: str, limit: int = Query(50, ge=1, le=500)):
     entity_dao: EntityDao = DB().entity_dao
-    async def crawl():
-        async for entity in florida_browser_service.search(search_term, entity_dao.is_not_indexed):
-            if entity:
-                await entity_dao.insert(entity)
-    asyncio.create_task(crawl())
-    return {"message": "Crawl initiated"}
+    return [asdict(change) for change in await entity_dao.changes(document_number, limit)]
+
+
+def serialize_sweep(report: SweepReport) -> dict:
+    return {
+        **asdict(report),
+        "is_finished": report.is_finished,
+        "documents_per_second": report.documents_per_second,
+        "eta_seconds": report.eta_seconds,
+    }
+
+
+@crawler.post("/sweeps", status_code=201)
+async def start_sweep(max_pages: int = Body(int(os.getenv("SWEEP_MAX_PAGES", "50")), embed=True, ge=1), prefixes: Optional[List[str]] = Body(None, embed=True)):
+    # Each prefix is a crawl job, so the sweep spreads over every running worker.
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    sweep_id = await crawl_job_dao.create_sweep(prefixes or initial_prefixes(), max_pages)
+    return serialize_sweep(await crawl_job_dao.sweep_report(sweep_id))
+
+
+@crawler.get("/sweeps/{sweep_id}")
+async def get_sweep(sweep_id: int):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    report = await crawl_job_dao.sweep_report(sweep_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    return serialize_sweep(report)
+
+
+@crawler.post("/sweeps/{sweep_id}/cancel")
+async def cancel_sweep(sweep_id: int):
+    crawl_job_dao: CrawlJobDao = DB().crawl_job_dao
+    if await crawl_job_dao.sweep_report(sweep_id) is None:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    await crawl_job_dao.cancel_sweep(sweep_id)
+    return serialize_sweep(await crawl_job_dao.sweep_report(sweep_id))
@@ -1,40 +1,75 @@
-import psycopg
-from psycopg.rows import dict_row, DictRow
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from app.db.crawl_job import ICrawlJobDao
 from app.db.entity import IEntityDao
+from app.db.indexed_documents import IndexedDocuments
+from app.db.entity_writer import EntityWriter
+from app.models.crawl_job import CrawlJobDao
 from app.models.entity import EntityDao
 from typing import Optional
-import asyncio
 import os
 from app.utils.singleton import Singleton
 
 
 class DB(metaclass=Singleton):
-    __conn: psycopg.AsyncConnection[DictRow] = None
-    __loop: Optional[asyncio.AbstractEventLoop] = None
+    __pool: Optional[AsyncConnectionPool] = None
     is_connected: bool = False
 
     def __init__(self, conn_str: Optional[str] = None):
-        if self.__conn is None:
+        self.__indexed_documents = IndexedDocuments.from_env()
+        self.__entity_writer: Optional[EntityWriter] = None
+        if self.__pool is None:
             if conn_str is None:
                 conn_str = os.getenv("DATABASE_URL")
             
     async def connect(self, conn_str: str):
         if not self.is_connected:
-            self.__conn = await psycopg.AsyncConnection.connect(conn_str, row_factory=dict_row)
+            self.__pool = AsyncConnectionPool(
+                conn_str,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                kwargs={"row_factory": dict_row},
+                # Connections are validated when leased, so dropped ones are replaced.
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await self.__pool.open(wait=True)
+            if self.__indexed_documents.warm_on_connect:
+                async with self.__pool.connection() as conn:
+                    await self.__indexed_documents.warm(conn)
             self.is_connected = True
 
     @property
     def entity_dao(self) -> EntityDao:
         if not self.is_connected:
             raise Exception("Database connection has not been established")
-        return IEntityDao(self.__conn)
+        return IEntityDao(self.__pool, self.__indexed_documents)
+
+
+    @property
+    def crawl_job_dao(self) -> CrawlJobDao:
+        if not self.is_connected:
+            raise Exception("Database connection has not been established")
+        return ICrawlJobDao(self.__pool)
+
+
+    @property
+    def entity_writer(self) -> EntityWriter:
+        if self.__entity_writer is None:
+            self.__entity_writer = EntityWriter(
+                self.entity_dao,
+                batch_size=int(os.getenv("ENTITY_WRITER_BATCH_SIZE", "500")),
+                max_age=float(os.getenv("ENTITY_WRITER_MAX_AGE", "2")),
+                max_buffered=int(os.getenv("ENTITY_WRITER_MAX_BUFFERED", "5000")),
+            )
+        return self.__entity_writer
     
 
     async def dispose(self):
-        self.__conn.close()
-        self.__conn = None
-        Singleton.dispose()
-        self.__loop.stop()
-        while self.__loop.is_running():
-            await asyncio.sleep(0.1)
-        self.__loop.close()
\ No newline at end of file
+        if self.__entity_writer is not None:
+            await self.__entity_writer.close()
+        await self.__pool.close()
+        self.__pool = None
+        self.is_connected = False
+        Singleton.dispose(DB)
@@ -0,0 +1,401 @@
+from psycopg_pool import AsyncConnectionPool
+from typing import List, Optional, Set
+from app.models.crawl_job import CrawlJob, CrawlJobDao, DeadLetter, SweepReport, QUEUED, RUNNING, COMPLETED, SPLIT, CANCELLED, FAILED, FINISHED_STATUSES, REFRESH, RETRY, SEARCH
+
+
+class ICrawlJobDao(CrawlJobDao):
+    def __init__(self, pool: AsyncConnectionPool):
+        self.__pool = pool
+
+    async def create(self, search_term: str) -> CrawlJob:
+        # Returns the job already queued or running for the term, if any. The
+        # conflict target spells out crawl_jobs_active_search_idx's predicate.
+        sql = """
+INSERT INTO crawl_jobs (search_term) VALUES (%(search_term)s)
+ON CONFLICT (lower(search_term)) WHERE kind = 'search' AND sweep_id IS NULL AND status IN ('queued', 'running') DO NOTHING
+RETURNING *;
+"""
+        active = """
+SELECT * FROM crawl_jobs
+WHERE lower(search_term) = lower(%(search_term)s) AND kind = %(search)s AND sweep_id IS NULL AND status IN (%(queued)s, %(running)s);
+"""
+        params = {"search_term": search_term, "search": SEARCH, "queued": QUEUED, "running": RUNNING}
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            while True:
+                await cur.execute(sql, params)
+                row = await cur.fetchone()
+                if row is None:
+                    await cur.execute(active, params)
+                    row = await cur.fetchone()
+                # None when the active job finished in between; queue a new one.
+                if row is not None:
+                    return CrawlJob(**row)
+
+
+    async def get(self, job_id: int) -> Optional[CrawlJob]:
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT * FROM crawl_jobs WHERE id = %s;", (job_id,))
+            row = await cur.fetchone()
+            return CrawlJob(**row) if row else None
+
+
+    async def list(self, status: Optional[str] = None, limit: int = 50) -> List[CrawlJob]:
+        sql = """
+SELECT * FROM crawl_jobs
+WHERE %(status)s::text IS NULL OR status = %(status)s
+ORDER BY id DESC
+LIMIT %(limit)s;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"status": status, "limit": limit})
+            return [CrawlJob(**row) for row in await cur.fetchall()]
+
+
+    async def claim(self, worker_id: str, stale_after: float, max_attempts: int) -> Optional[CrawlJob]:
+        # Jobs whose worker died are reclaimed once their heartbeat is stale,
+        # unless they were cancelled meanwhile or have been lost too often.
+        settle_abandoned = """
+UPDATE crawl_jobs SET
+    status = CASE WHEN cancel_requested THEN %(cancelled)s ELSE %(failed)s END,
+    error = CASE WHEN cancel_requested THEN error ELSE 'Worker lost after ' || attempts || ' attempts' END,
+    finished_at = NOW(),
+    updated_at = NOW()
+WHERE status = %(running)s
+    AND heartbeat_at < NOW() - make_interval(secs => %(stale_after)s)
+    AND (cancel_requested OR attempts >= %(max_attempts)s);
+"""
+        claim = """
+UPDATE crawl_jobs SET
+    status = %(running)s,
+    worker_id = %(worker_id)s,
+    attempts = attempts + 1,
+    started_at = COALESCE(started_at, NOW()),
+    heartbeat_at = NOW(),
+    updated_at = NOW()
+WHERE id = (
+    SELECT id FROM crawl_jobs
+    WHERE status = %(queued)s
+        OR (status = %(running)s AND heartbeat_at < NOW() - make_interval(secs => %(stale_after)s))
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING *;
+"""
+        params = {
+            "worker_id": worker_id,
+            "stale_after": stale_after,
+            "max_attempts": max_attempts,
+            "queued": QUEUED,
+            "running": RUNNING,
+            "cancelled": CANCELLED,
+            "failed": FAILED,
+        }
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(settle_abandoned, params)
+            await cur.execute(claim, params)
+            row = await cur.fetchone()
+            return CrawlJob(**row) if row else None
+
+
+    async def processed_documents(self, job_id: int) -> Set[str]:
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT document_number FROM crawl_job_documents WHERE job_id = %s;", (job_id,))
+            return {row["document_number"] for row in await cur.fetchall()}
+
+
+    async def checkpoint(
+        self,
+        job_id: int,
+        worker_id: str,
+        cursor_url: Optional[str],
+        pages_crawled: int,
+        document_numbers: List[str],
+        documents_failed: int,
+        documents_processed: Optional[int] = None,
+    ) -> bool:
+        """
+        Records progress and heartbeats the job. Returns False once the job
+        should stop: it was cancelled or another worker reclaimed it.
+        `documents_processed` overrides the count of recorded documents for
+        jobs that do not record them, i.e. refreshes.
+        """
+        sql = """
+WITH processed AS (
+    INSERT INTO crawl_job_documents (job_id, document_number)
+    SELECT %(job_id)s, document_number FROM unnest(%(document_numbers)s::text[]) AS document_number
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+UPDATE crawl_jobs SET
+    cursor_url = %(cursor_url)s,
+    pages_crawled = %(pages_crawled)s,
+    documents_processed = COALESCE(%(documents_processed)s, documents_processed + (SELECT count(*) FROM processed)),
+    documents_failed = %(documents_failed)s,
+    heartbeat_at = NOW(),
+    updated_at = NOW()
+WHERE id = %(job_id)s AND worker_id = %(worker_id)s AND status = %(running)s
+RETURNING cancel_requested;
+"""
+        params = {
+            "job_id": job_id,
+            "worker_id": worker_id,
+            "cursor_url": cursor_url,
+            "pages_crawled": pages_crawled,
+            "document_numbers": document_numbers,
+            "documents_failed": documents_failed,
+            "documents_processed": documents_processed,
+            "running": RUNNING,
+        }
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            row = await cur.fetchone()
+            return row is not None and not row["cancel_requested"]
+
+
+    async def finish(self, job_id: int, worker_id: str, status: str, error: Optional[str] = None) -> None:
+        sql = """
+UPDATE crawl_jobs SET status = %s, error = %s, finished_at = NOW(), updated_at = NOW()
+WHERE id = %s AND worker_id = %s AND status = %s;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, (status, error, job_id, worker_id, RUNNING))
+
+
+    async def release(self, job_id: int, worker_id: str) -> None:
+        # A worker shutting down hands its job back instead of waiting for it to go stale.
+        sql = """
+UPDATE crawl_jobs SET status = %s, worker_id = NULL, heartbeat_at = NULL, updated_at = NOW()
+WHERE id = %s AND worker_id = %s AND status = %s;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, (QUEUED, job_id, worker_id, RUNNING))
+
+
+    async def cancel(self, job_id: int) -> Optional[CrawlJob]:
+        # Queued jobs are cancelled outright; a running one stops at its next checkpoint.
+        sql = """
+UPDATE crawl_jobs SET
+    status = CASE WHEN status = %(queued)s THEN %(cancelled)s ELSE status END,
+    finished_at = CASE WHEN status = %(queued)s THEN NOW() ELSE finished_at END,
+    cancel_requested = TRUE,
+    updated_at = NOW()
+WHERE id = %(job_id)s AND status IN (%(queued)s, %(running)s)
+RETURNING *;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"job_id": job_id, "queued": QUEUED, "running": RUNNING, "cancelled": CANCELLED})
+            row = await cur.fetchone()
+        if row is None:
+            return await self.get(job_id)
+        return CrawlJob(**row)
+
+
+    async def create_refresh(self) -> CrawlJob:
+        # Returns the refresh job already queued or running, if any. The
+        # conflict target spells out crawl_jobs_active_refresh_idx's predicate.
+        sql = """
+INSERT INTO crawl_jobs (search_term, kind) VALUES ('', %(refresh)s)
+ON CONFLICT (kind) WHERE kind = 'refresh' AND status IN ('queued', 'running') DO NOTHING
+RETURNING *;
+"""
+        params = {"refresh": REFRESH, "queued": QUEUED, "running": RUNNING}
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            row = await cur.fetchone()
+            if row is None:
+                await cur.execute("SELECT * FROM crawl_jobs WHERE kind = %(refresh)s AND status IN (%(queued)s, %(running)s);", params)
+                row = await cur.fetchone()
+            return CrawlJob(**row)
+
+
+    async def record_dead_letters(self, job_id: int, dead_letters: List[DeadLetter]) -> None:
+        # A document that fails again is open again, even if a retry job had claimed it.
+        sql = """
+INSERT INTO crawl_dead_letters (document_number, detail_url, error, attempts, job_id)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT (document_number) DO UPDATE SET
+    detail_url = COALESCE(EXCLUDED.detail_url, crawl_dead_letters.detail_url),
+    error = EXCLUDED.error,
+    attempts = EXCLUDED.attempts,
+    failures = crawl_dead_letters.failures + 1,
+    job_id = EXCLUDED.job_id,
+    retry_job_id = NULL,
+    last_failed_at = NOW();
+"""
+        unique = {dead_letter.document_number: dead_letter for dead_letter in dead_letters}
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.executemany(sql, [
+                (dead_letter.document_number, dead_letter.detail_url, dead_letter.error, dead_letter.attempts, job_id)
+                for dead_letter in unique.values()
+            ])
+
+
+    async def list_dead_letters(self, limit: int = 50) -> List[DeadLetter]:
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT * FROM crawl_dead_letters ORDER BY last_failed_at DESC LIMIT %s;", (limit,))
+            return [DeadLetter(**row) for row in await cur.fetchall()]
+
+
+    async def requeue_dead_letters(self) -> Optional[CrawlJob]:
+        """
+        Hands the open dead letters, and those of retry jobs that ended
+        without storing them, to the active retry job, queuing one if needed.
+        None when there is nothing to retry.
+        """
+        params = {"retry": RETRY, "queued": QUEUED, "running": RUNNING, "finished": list(FINISHED_STATUSES)}
+        open_letters = """
+SELECT 1 FROM crawl_dead_letters
+LEFT JOIN crawl_jobs ON crawl_jobs.id = crawl_dead_letters.retry_job_id
+WHERE crawl_dead_letters.retry_job_id IS NULL OR crawl_jobs.status = ANY(%(finished)s)
+LIMIT 1;
+"""
+        create = """
+INSERT INTO crawl_jobs (search_term, kind) VALUES ('', %(retry)s)
+ON CONFLICT (kind) WHERE kind = 'retry' AND status IN ('queued', 'running') DO NOTHING
+RETURNING *;
+"""
+        claim = """
+UPDATE crawl_dead_letters SET retry_job_id = %(job_id)s
+WHERE retry_job_id IS NULL
+    OR retry_job_id IN (SELECT id FROM crawl_jobs WHERE kind = %(retry)s AND status = ANY(%(finished)s));
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(open_letters, params)
+            if await cur.fetchone() is None:
+                return None
+            await cur.execute(create, params)
+            row = await cur.fetchone()
+            if row is None:
+                await cur.execute("SELECT * FROM crawl_jobs WHERE kind = %(retry)s AND status IN (%(queued)s, %(running)s);", params)
+                row = await cur.fetchone()
+            await cur.execute(claim, {**params, "job_id": row["id"]})
+            return CrawlJob(**row)
+
+
+    async def retry_batch(self, job_id: int, after: Optional[str], limit: int) -> List[DeadLetter]:
+        sql = """
+SELECT * FROM crawl_dead_letters
+WHERE retry_job_id = %(job_id)s AND (%(after)s::text IS NULL OR document_number > %(after)s)
+ORDER BY document_number
+LIMIT %(limit)s;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"job_id": job_id, "after": after, "limit": limit})
+            return [DeadLetter(**row) for row in await cur.fetchall()]
+
+
+    async def resolve_dead_letters(self, job_id: int) -> int:
+        # Only documents the job got through: those that failed again were handed
+        # back (retry_job_id NULL), and ones requeued after the job passed them
+        # stay with it until the next requeue.
+        sql = """
+DELETE FROM crawl_dead_letters
+WHERE retry_job_id = %(job_id)s
+    AND document_number IN (SELECT document_number FROM crawl_job_documents WHERE job_id = %(job_id)s);
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"job_id": job_id})
+            return cur.rowcount
+
+
+    async def create_sweep(self, prefixes: List[str], max_pages: int) -> int:
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute("INSERT INTO crawl_sweeps (max_pages) VALUES (%s) RETURNING id;", (max_pages,))
+            sweep_id = (await cur.fetchone())["id"]
+            await cur.execute(
+                """
+INSERT INTO crawl_jobs (search_term, sweep_id, max_pages)
+SELECT prefix, %s, %s FROM unnest(%s::text[]) AS prefix;
+""",
+                (sweep_id, max_pages, prefixes),
+            )
+            return sweep_id
+
+
+    async def split(self, job_id: int, worker_id: str, prefixes: List[str]) -> None:
+        # Children are queued in the same transaction that closes the parent.
+        sql = """
+WITH parent AS (
+    UPDATE crawl_jobs SET status = %(split)s, finished_at = NOW(), updated_at = NOW()
+    WHERE id = %(job_id)s AND worker_id = %(worker_id)s AND status = %(running)s
+    RETURNING id, sweep_id, max_pages
+)
+INSERT INTO crawl_jobs (search_term, sweep_id, parent_id, max_pages)
+SELECT prefix, parent.sweep_id, parent.id, parent.max_pages
+FROM parent, unnest(%(prefixes)s::text[]) AS prefix;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"job_id": job_id, "worker_id": worker_id, "prefixes": prefixes, "split": SPLIT, "running": RUNNING})
+
+
+    async def claim_documents(self, sweep_id: int, job_id: int, document_numbers: List[str]) -> List[str]:
+        """
+        Claims documents for a sweep shard and returns the ones it owns. A
+        shard that resumes gets its own earlier claims back.
+        """
+        sql = """
+INSERT INTO crawl_sweep_documents (sweep_id, document_number, job_id)
+SELECT %(sweep_id)s, document_number, %(job_id)s FROM unnest(%(document_numbers)s::text[]) AS document_number
+ON CONFLICT (sweep_id, document_number) DO UPDATE SET job_id = EXCLUDED.job_id
+    WHERE crawl_sweep_documents.job_id = EXCLUDED.job_id
+RETURNING document_number;
+"""
+        if not document_numbers:
+            return []
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"sweep_id": sweep_id, "job_id": job_id, "document_numbers": document_numbers})
+            return [row["document_number"] for row in await cur.fetchall()]
+
+
+    async def sweep_report(self, sweep_id: int) -> Optional[SweepReport]:
+        sql = """
+SELECT
+    s.id AS sweep_id,
+    s.max_pages,
+    s.created_at,
+    min(j.started_at) AS started_at,
+    max(j.updated_at) AS updated_at,
+    count(j.id) AS shards,
+    count(j.id) FILTER (WHERE j.status = %(queued)s) AS queued,
+    count(j.id) FILTER (WHERE j.status = %(running)s) AS running,
+    count(j.id) FILTER (WHERE j.status = %(completed)s) AS completed,
+    count(j.id) FILTER (WHERE j.status = %(split)s) AS split,
+    count(j.id) FILTER (WHERE j.status = %(failed)s) AS failed,
+    count(j.id) FILTER (WHERE j.status = %(cancelled)s) AS cancelled,
+    coalesce(sum(j.pages_crawled), 0) AS pages_crawled,
+    coalesce(sum(j.documents_failed), 0) AS documents_failed,
+    -- Shards overlap, so their documents_processed counts do too.
+    (SELECT count(*) FROM crawl_sweep_documents d WHERE d.sweep_id = s.id) AS documents_claimed
+FROM crawl_sweeps s
+LEFT JOIN crawl_jobs j ON j.sweep_id = s.id
+WHERE s.id = %(sweep_id)s
+GROUP BY s.id;
+"""
+        params = {
+            "sweep_id": sweep_id,
+            "queued": QUEUED,
+            "running": RUNNING,
+            "completed": COMPLETED,
+            "split": SPLIT,
+            "failed": FAILED,
+            "cancelled": CANCELLED,
+        }
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            row = await cur.fetchone()
+            return SweepReport(**row) if row else None
+
+
+    async def cancel_sweep(self, sweep_id: int) -> int:
+        sql = """
+UPDATE crawl_jobs SET
+    status = CASE WHEN status = %(queued)s THEN %(cancelled)s ELSE status END,
+    finished_at = CASE WHEN status = %(queued)s THEN NOW() ELSE finished_at END,
+    cancel_requested = TRUE,
+    updated_at = NOW()
+WHERE sweep_id = %(sweep_id)s AND status IN (%(queued)s, %(running)s);
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, {"sweep_id": sweep_id, "queued": QUEUED, "running": RUNNING, "cancelled": CANCELLED})
+            return cur.rowcount
@@ -1,73 +1,137 @@
-from psycopg import AsyncConnection
-from typing import Awaitable
-from app.models.entity import EntityDao, EntityDetail
-from psycopg.rows import DictRow
-from dataclasses import asdict
-import json
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool
+from psycopg.types.json import Jsonb
+from datetime import timedelta
+from typing import Any, Awaitable, List, Optional
+from app.models.entity import CONTENT_FIELDS, EntityChange, EntityDao, EntityDetail, RefreshCandidate, RefreshPosition, content_hash
+from app.db.indexed_documents import IndexedDocuments
+from app.utils.metrics import INSERT
+
+
+_COLUMNS = CONTENT_FIELDS + ("detail_url", "content_hash")
+_JSON_COLUMNS = ("authorized_persons", "annual_reports", "document_images")
+# Postgres accepts at most 65535 bind parameters per statement.
+_MAX_ROWS_PER_STATEMENT = 65535 // len(_COLUMNS)
+
+# Re-crawled documents refresh the stored row instead of duplicating it,
+# and only when their content changed; unchanged rows are not returned.
+_UPSERT = """
+INSERT INTO entity_details ({columns})
+VALUES {values}
+ON CONFLICT (document_number) DO UPDATE SET
+    {updates},
+    updated_at = NOW()
+WHERE entity_details.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+RETURNING id;
+"""
+
+
+def _upsert_query(row_count: int) -> sql.Composed:
+    row = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * len(_COLUMNS)))
+    return sql.SQL(_UPSERT).format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, _COLUMNS)),
+        values=sql.SQL(", ").join([row] * row_count),
+        updates=sql.SQL(",\n    ").join(
+            sql.SQL("{column} = EXCLUDED.{column}").format(column=sql.Identifier(column))
+            for column in _COLUMNS if column != "document_number"
+        ),
+    )
+
+
+def _row_params(detail: EntityDetail) -> List[Any]:
+    params = []
+    for column in _COLUMNS:
+        value = content_hash(detail) if column == "content_hash" else getattr(detail, column)
+        params.append(Jsonb(value) if column in _JSON_COLUMNS else value)
+    return params
+
 
 class IEntityDao(EntityDao):
-    def __init__(self, conn: AsyncConnection[DictRow]):
-        self.__conn = conn
-
-    async def insert(self, detail: EntityDetail) -> int:
-        query = """
-        INSERT INTO entity_details (
-            entity_type,
-            entity_name,
-            document_number,
-            fe_ein_number,
-            date_filed,
-            effective_date,
-            state,
-            status,
-            principal_address,
-            principal_address_changed,
-            mailing_address,
-            mailing_address_changed,
-            registered_agent_name,
-            registered_agent_address,
-            registered_agent_address_changed,
-            authorized_persons,
-            annual_reports,
-            document_images
-        ) VALUES (
-            %(entity_type)s,
-            %(entity_name)s,
-            %(document_number)s,
-            %(fe_ein_number)s,
-            %(date_filed)s,
-            %(effective_date)s,
-            %(state)s,
-            %(status)s,
-            %(principal_address)s,
-            %(principal_address_changed)s,
-            %(mailing_address)s,
-            %(mailing_address_changed)s,
-            %(registered_agent_name)s,
-            %(registered_agent_address)s,
-            %(registered_agent_address_changed)s,
-            to_jsonb(%(authorized_persons)s::json),
-            to_jsonb(%(annual_reports)s::json),
-            to_jsonb(%(document_images)s::json)
-        )
-        RETURNING id;
-        """
+    def __init__(self, pool: AsyncConnectionPool, indexed_documents: IndexedDocuments):
+        self.__pool = pool
+        self.__indexed_documents = indexed_documents
+
+    async def insert(self, detail: EntityDetail) -> Optional[int]:
+        """Returns the row id, or None when the stored row already had this content."""
+        with INSERT.labels("insert").time():
+            async with self.__pool.connection() as conn, conn.cursor() as cur:
+                await cur.execute(_upsert_query(1), _row_params(detail))
+                row = await cur.fetchone()
+        self.__indexed_documents.add(detail.document_number)
+        return row["id"] if row else None
 
-        async with self.__conn.cursor() as cur:
-            data = asdict(detail)
-            data["authorized_persons"] = json.dumps(data["authorized_persons"])
-            data["annual_reports"] = json.dumps(data["annual_reports"])
-            data["document_images"] = json.dumps(data["document_images"])
-            print(data)
-            await cur.execute(query, dict(data))
-            row = await cur.fetchone()
-            print("Inserted with id: ", row["id"])
-            await self.__conn.commit()
-            return row["id"]
+
+    async def upsert_many(self, details: List[EntityDetail]) -> int:
+        # ON CONFLICT cannot touch the same row twice in one statement.
+        unique = list({detail.document_number: detail for detail in details}.values())
+        if not unique:
+            return 0
+        written = 0
+        # The pooled connection commits all chunks together when the block exits.
+        with INSERT.labels("upsert_many").time():
+            async with self.__pool.connection() as conn, conn.cursor() as cur:
+                for start in range(0, len(unique), _MAX_ROWS_PER_STATEMENT):
+                    chunk = unique[start:start + _MAX_ROWS_PER_STATEMENT]
+                    params = [param for detail in chunk for param in _row_params(detail)]
+                    await cur.execute(_upsert_query(len(chunk)), params)
+                    written += cur.rowcount
+        self.__indexed_documents.update(detail.document_number for detail in unique)
+        return written
         
 
     async def is_not_indexed(self, document_number: str) -> bool:
-        sql = "SELECT id FROM entity_details WHERE document_number = %s;"
-        async with self.__conn.cursor() as cur:
-            await cur.execute(sql, (document_number,))
-            return not bool(await cur.fetchone())
\ No newline at end of file
+        return bool(await self.filter_not_indexed([document_number]))
+
+
+    async def filter_not_indexed(self, document_numbers: List[str]) -> List[str]:
+        candidates = self.__indexed_documents.unknown(document_numbers)
+        if not candidates:
+            return []
+        query = "SELECT document_number FROM entity_details WHERE document_number = ANY(%s);"
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(query, (candidates,))
+            indexed = {row["document_number"] for row in await cur.fetchall()}
+        self.__indexed_documents.update(indexed)
+        return [document_number for document_number in candidates if document_number not in indexed]
+
+
+    async def refresh_candidates(self, after: Optional[RefreshPosition], active_after: timedelta, inactive_after: timedelta, limit: int) -> List[RefreshCandidate]:
+        """
+        Entities not updated for `active_after` (active ones) or
+        `inactive_after` (the rest), in RefreshCandidate.position order and
+        past `after`. Served by entity_details_refresh_idx.
+        """
+        sql = """
+SELECT id, document_number, status, detail_url, content_hash, updated_at
+FROM entity_details
+WHERE (%(after_inactive)s::boolean IS NULL
+        OR (status IS DISTINCT FROM 'ACTIVE', updated_at, id) > (%(after_inactive)s::boolean, %(after_updated_at)s::timestamptz, %(after_id)s::int))
+    AND updated_at < NOW() - CASE WHEN status IS DISTINCT FROM 'ACTIVE' THEN %(inactive_after)s::interval ELSE %(active_after)s::interval END
+ORDER BY status IS DISTINCT FROM 'ACTIVE', updated_at, id
+LIMIT %(limit)s;
+"""
+        after_inactive, after_updated_at, after_id = after or (None, None, None)
+        params = {
+            "after_inactive": after_inactive,
+            "after_updated_at": after_updated_at,
+            "after_id": after_id,
+            "active_after": active_after,
+            "inactive_after": inactive_after,
+            "limit": limit,
+        }
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return [RefreshCandidate(**row) for row in await cur.fetchall()]
+
+
+    async def changes(self, document_number: str, limit: int = 50) -> List[EntityChange]:
+        sql = """
+SELECT id, entity_id, document_number, changes, changed_at
+FROM entity_changes
+WHERE document_number = %s
+ORDER BY changed_at DESC, id DESC
+LIMIT %s;
+"""
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, (document_number, limit))
+            return [EntityChange(**row) for row in await cur.fetchall()]
@@ -0,0 +1,111 @@
+from app.models.entity import EntityDao, EntityDetail
+from app.utils.logger import get_logger
+from typing import List, Optional
+import asyncio
+
+
+logger = get_logger(__name__)
+
+
+class EntityWriter:
+    """
+    Buffers crawled entities and writes them with EntityDao.upsert_many.
+    A batch is flushed once `batch_size` entities are waiting or the oldest
+    one is `max_age` seconds old. `add` blocks while `max_buffered` entities
+    are pending, which slows the crawl down to the database's pace.
+    """
+
+    def __init__(self, entity_dao: EntityDao, batch_size: int = 500, max_age: float = 2.0, max_buffered: int = 5000):
+        self.__entity_dao = entity_dao
+        self.__batch_size = batch_size
+        self.__max_age = max_age
+        self.__max_buffered = max_buffered
+        self.__buffer: List[EntityDetail] = []
+        self.__oldest_at: Optional[float] = None
+        self.__space = asyncio.Condition()
+        self.__batch_ready = asyncio.Event()
+        self.__flush_mutex = asyncio.Lock()
+        self.__flusher: Optional[asyncio.Task] = None
+        self.is_closed = False
+        self.written = 0
+
+
+    def __len__(self) -> int:
+        return len(self.__buffer)
+
+
+    def start(self):
+        if self.__flusher is None:
+            self.__flusher = asyncio.create_task(self.__flush_periodically())
+
+
+    async def add(self, entity: EntityDetail):
+        if self.is_closed:
+            raise RuntimeError("Entity writer is closed")
+        self.start()
+        async with self.__space:
+            await self.__space.wait_for(lambda: len(self.__buffer) < self.__max_buffered)
+            if not self.__buffer:
+                self.__oldest_at = asyncio.get_running_loop().time()
+            self.__buffer.append(entity)
+            if len(self.__buffer) >= self.__batch_size:
+                self.__batch_ready.set()
+
+
+    async def flush(self) -> int:
+        async with self.__flush_mutex:
+            batch, self.__buffer = self.__buffer[:self.__batch_size], self.__buffer[self.__batch_size:]
+            self.__oldest_at = asyncio.get_running_loop().time() if self.__buffer else None
+            if len(self.__buffer) < self.__batch_size:
+                self.__batch_ready.clear()
+            if not batch:
+                return 0
+            try:
+                written = await self.__entity_dao.upsert_many(batch)
+            except BaseException:
+                # Keep the batch; it is retried on the next flush.
+                self.__buffer[:0] = batch
+                self.__oldest_at = asyncio.get_running_loop().time()
+                raise
+            self.written += written
+        async with self.__space:
+            self.__space.notify_all()
+        return written
+
+
+    async def drain(self):
+        """Returns once every entity added so far has been written."""
+        while True:
+            while self.__buffer:
+                await self.flush()
+            # A background flush may still be writing the last batch.
+            async with self.__flush_mutex:
+                if not self.__buffer:
+                    return
+
+
+    async def __flush_periodically(self):
+        while not self.is_closed:
+            timeout = self.__max_age
+            if self.__oldest_at is not None:
+                timeout = max(0.0, self.__oldest_at + self.__max_age - asyncio.get_running_loop().time())
+            try:
+                await asyncio.wait_for(self.__batch_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self.__buffer and not self.is_closed:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error("Error flushing entities: %r", e)
+                    await asyncio.sleep(self.__max_age)
+
+
+    async def close(self):
+        """Flush-on-shutdown hook: stops the background flusher and drains the buffer."""
+        self.is_closed = True
+        if self.__flusher is not None:
+            self.__batch_ready.set()
+            await self.__flusher
+            self.__flusher = None
+        await self.drain()
@@ -0,0 +1,91 @@
+from psycopg import AsyncConnection
+from psycopg.rows import DictRow
+from app.utils.logger import get_logger
+from collections import OrderedDict
+from typing import Iterable, List
+import os
+
+
+logger = get_logger(__name__)
+
+
+class IndexedDocuments:
+    """
+    Process-local LRU of document numbers known to be in entity_details,
+    holding at most `max_size` of them (about 140 bytes each). A hit is
+    authoritative (rows are never deleted), so it skips the database; a
+    miss, evicted or never seen, is confirmed by filter_not_indexed's query,
+    since other crawler processes insert too. Warming loads the `max_size`
+    newest rows.
+    """
+    WARM_BATCH_SIZE = 50_000
+
+    def __init__(self, max_size: int = 500_000, warm_on_connect: bool = True):
+        self.__max_size = max_size
+        self.warm_on_connect = warm_on_connect
+        self.__known: "OrderedDict[str, None]" = OrderedDict()
+
+
+    @classmethod
+    def from_env(cls) -> "IndexedDocuments":
+        return cls(
+            max_size=int(os.getenv("INDEXED_DOCUMENTS_MAX", "500000")),
+            warm_on_connect=os.getenv("INDEXED_DOCUMENTS_WARM", "true").lower() == "true",
+        )
+
+
+    def __len__(self) -> int:
+        return len(self.__known)
+
+
+    def __contains__(self, document_number: str) -> bool:
+        return document_number in self.__known
+
+
+    def add(self, document_number: str):
+        if self.__max_size <= 0:
+            return
+        self.__known[document_number] = None
+        self.__known.move_to_end(document_number)
+        if len(self.__known) > self.__max_size:
+            self.__known.popitem(last=False)
+
+
+    def update(self, document_numbers: Iterable[str]):
+        for document_number in document_numbers:
+            self.add(document_number)
+
+
+    def unknown(self, document_numbers: Iterable[str]) -> List[str]:
+        missing = []
+        for document_number in document_numbers:
+            if document_number in self.__known:
+                self.__known.move_to_end(document_number)
+            else:
+                missing.append(document_number)
+        return missing
+
+
+    async def warm(self, conn: AsyncConnection[DictRow]):
+        if self.__max_size <= 0:
+            return
+        # Named (server-side) cursor: the newest rows are streamed in batches,
+        # oldest first, so the newest end up most recently used.
+        async with conn.cursor(name="indexed_documents_warmup") as cur:
+            cur.itersize = self.WARM_BATCH_SIZE
+            await cur.execute(
+                """
+SELECT document_number FROM (
+    SELECT id, document_number FROM entity_details
+    WHERE document_number IS NOT NULL
+    ORDER BY id DESC
+    LIMIT %s
+) AS newest
+ORDER BY id;
+""",
+                (self.__max_size,),
+            )
+            async for row in cur:
+                self.add(row["document_number"])
+        await conn.commit()
+        logger.info("Warmed indexed document filter with %d document numbers", len(self.__known))
@@ -0,0 +1,198 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Set
+from abc import ABC, abstractmethod
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+# A sweep shard that was too deep and was replaced by longer prefixes.
+SPLIT = "split"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (COMPLETED, SPLIT, FAILED, CANCELLED)
+
+# Job kinds: a search term or sweep shard, a refresh of stored entities, or
+# a retry of dead-lettered documents.
+SEARCH = "search"
+REFRESH = "refresh"
+RETRY = "retry"
+
+
+@dataclass
+class CrawlJob:
+    id: int
+    search_term: str
+    kind: str = SEARCH
+    status: str = QUEUED
+    cursor_url: Optional[str] = None
+    pages_crawled: int = 0
+    documents_processed: int = 0
+    documents_failed: int = 0
+    attempts: int = 0
+    worker_id: Optional[str] = None
+    cancel_requested: bool = False
+    error: Optional[str] = None
+
+    sweep_id: Optional[int] = None
+    parent_id: Optional[int] = None
+    max_pages: Optional[int] = None
+
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+
+
+@dataclass
+class DeadLetter:
+    """A document that failed every fetch attempt, kept until a retry job stores it."""
+    document_number: str
+    detail_url: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 1
+    failures: int = 1
+    job_id: Optional[int] = None
+    retry_job_id: Optional[int] = None
+    first_failed_at: Optional[datetime] = None
+    last_failed_at: Optional[datetime] = None
+
+
+@dataclass
+class SweepReport:
+    sweep_id: int
+    max_pages: int
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    shards: int = 0
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    split: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    pages_crawled: int = 0
+    documents_failed: int = 0
+    documents_claimed: int = 0
+
+    @property
+    def is_finished(self) -> bool:
+        return self.queued == 0 and self.running == 0
+
+
+    @property
+    def documents_per_second(self) -> Optional[float]:
+        if self.started_at is None or self.updated_at is None or self.updated_at <= self.started_at:
+            return None
+        return self.documents_claimed / (self.updated_at - self.started_at).total_seconds()
+
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """
+        Rough estimate: the shards still open are assumed to hold as many
+        documents as the finished ones did on average, and the current
+        throughput is assumed to hold.
+        """
+        finished = self.completed + self.split
+        rate = self.documents_per_second
+        if self.is_finished:
+            return 0.0
+        if not finished or not rate:
+            return None
+        remaining = (self.queued + self.running) * self.documents_claimed / finished
+        return remaining / rate
+
+
+class CrawlJobDao(ABC):
+    @abstractmethod
+    async def create(self, search_term: str) -> CrawlJob:
+        pass
+
+    @abstractmethod
+    async def get(self, job_id: int) -> Optional[CrawlJob]:
+        pass
+
+    @abstractmethod
+    async def list(self, status: Optional[str] = None, limit: int = 50) -> List[CrawlJob]:
+        pass
+
+    @abstractmethod
+    async def claim(self, worker_id: str, stale_after: float, max_attempts: int) -> Optional[CrawlJob]:
+        pass
+
+    @abstractmethod
+    async def processed_documents(self, job_id: int) -> Set[str]:
+        pass
+
+    @abstractmethod
+    async def checkpoint(
+        self,
+        job_id: int,
+        worker_id: str,
+        cursor_url: Optional[str],
+        pages_crawled: int,
+        document_numbers: List[str],
+        documents_failed: int,
+        documents_processed: Optional[int] = None,
+    ) -> bool:
+        pass
+
+    @abstractmethod
+    async def finish(self, job_id: int, worker_id: str, status: str, error: Optional[str] = None) -> None:
+        pass
+
+    @abstractmethod
+    async def release(self, job_id: int, worker_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def cancel(self, job_id: int) -> Optional[CrawlJob]:
+        pass
+
+    @abstractmethod
+    async def create_refresh(self) -> CrawlJob:
+        pass
+
+    @abstractmethod
+    async def record_dead_letters(self, job_id: int, dead_letters: List[DeadLetter]) -> None:
+        pass
+
+    @abstractmethod
+    async def list_dead_letters(self, limit: int = 50) -> List[DeadLetter]:
+        pass
+
+    @abstractmethod
+    async def requeue_dead_letters(self) -> Optional[CrawlJob]:
+        pass
+
+    @abstractmethod
+    async def retry_batch(self, job_id: int, after: Optional[str], limit: int) -> List[DeadLetter]:
+        pass
+
+    @abstractmethod
+    async def resolve_dead_letters(self, job_id: int) -> int:
+        pass
+
+    @abstractmethod
+    async def create_sweep(self, prefixes: List[str], max_pages: int) -> int:
+        pass
+
+    @abstractmethod
+    async def split(self, job_id: int, worker_id: str, prefixes: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    async def claim_documents(self, sweep_id: int, job_id: int, document_numbers: List[str]) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def sweep_report(self, sweep_id: int) -> Optional[SweepReport]:
+        pass
+
+    @abstractmethod
+    async def cancel_sweep(self, sweep_id: int) -> int:
+        pass
@@ -1,7 +1,9 @@
 from dataclasses import dataclass, field
-from datetime import date
-from typing import List, Optional, Any
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Any, Tuple
 from abc import ABC, abstractmethod
+import hashlib
+import json
 
 @dataclass
 class EntityDetail:
@@ -33,15 +35,102 @@ class EntityDetail:
     annual_reports: List[Any] = field(default_factory=list)
     document_images: List[Any] = field(default_factory=list)
 
+    detail_url: Optional[str] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
 
+# The entity_details columns a crawl fills in; the content hash covers these.
+CONTENT_FIELDS = (
+    "entity_type",
+    "entity_name",
+    "document_number",
+    "fe_ein_number",
+    "date_filed",
+    "effective_date",
+    "state",
+    "status",
+    "principal_address",
+    "principal_address_changed",
+    "mailing_address",
+    "mailing_address_changed",
+    "registered_agent_name",
+    "registered_agent_address",
+    "registered_agent_address_changed",
+    "authorized_persons",
+    "annual_reports",
+    "document_images",
+)
+
+
+def content_hash(entity: EntityDetail) -> str:
+    content = json.dumps([getattr(entity, name) for name in CONTENT_FIELDS], default=str, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class SearchResultRow:
+    entity_name: str
+    document_number: str
+    status: str
+    detail_url: str
+
+
+@dataclass
+class SearchResultsPage:
+    url: str
+    rows: List[SearchResultRow] = field(default_factory=list)
+    next_url: Optional[str] = None
+
+
+# Refresh order: active entities first, then oldest updated_at, then id.
+RefreshPosition = Tuple[bool, datetime, int]
+
+
+@dataclass
+class RefreshCandidate:
+    id: int
+    document_number: str
+    status: Optional[str]
+    detail_url: Optional[str]
+    content_hash: Optional[str]
+    updated_at: datetime
+
+    @property
+    def position(self) -> RefreshPosition:
+        return (self.status != "ACTIVE", self.updated_at, self.id)
+
+
+@dataclass
+class EntityChange:
+    id: int
+    entity_id: int
+    document_number: str
+    changes: dict
+    changed_at: Optional[datetime] = None
+
+
 class EntityDao(ABC):
     @abstractmethod
-    async def insert(self, entity: EntityDetail) -> int:
+    async def insert(self, entity: EntityDetail) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    async def upsert_many(self, entities: List[EntityDetail]) -> int:
         pass
 
     @abstractmethod
     async def is_not_indexed(self, document_number: str) -> bool:
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def filter_not_indexed(self, document_numbers: List[str]) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def refresh_candidates(self, after: Optional[RefreshPosition], active_after: timedelta, inactive_after: timedelta, limit: int) -> List[RefreshCandidate]:
+        pass
+
+    @abstractmethod
+    async def changes(self, document_number: str, limit: int = 50) -> List[EntityChange]:
+        pass
@@ -0,0 +1,233 @@
+from playwright.async_api import Browser, BrowserContext, Page
+from app.services.browser_profile import BrowserTraffic
+from app.utils.logger import get_logger
+from app.utils.metrics import BROWSER_PROCESSES, BROWSER_RSS, BROWSERS_RECYCLED
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = get_logger(__name__)
+
+PAGE_BUDGET = "page_budget"
+MEMORY = "memory"
+
+
+@dataclass
+class BrowserPoolPolicy:
+    """
+    Sizing of the browser engine. `processes` Chromium processes serve the
+    page pool, each retired after opening `max_pages_per_process` pages. The
+    pool holds between `min_pages` and `max_pages` pages and is resized every
+    `interval` seconds: it grows while checkouts queue or wait longer than
+    `target_wait`, and shrinks while pages sit idle. With `rss_limit_mb` the
+    Chromium processes' resident memory caps growth, and above the limit
+    the pool shrinks and the oldest browser is recycled. An `interval` of 0
+    keeps the pool at its starting size.
+    """
+    processes: int = 2
+    min_pages: int = 2
+    max_pages: int = 20
+    max_pages_per_process: int = 500
+    rss_limit_mb: Optional[float] = None
+    target_wait: float = 0.05
+    interval: float = 5.0
+    step: int = 2
+
+    @classmethod
+    def from_env(cls) -> "BrowserPoolPolicy":
+        rss_limit_mb = float(os.getenv("BROWSER_RSS_LIMIT_MB", "0"))
+        return cls(
+            processes=int(os.getenv("BROWSER_PROCESSES", "2")),
+            min_pages=int(os.getenv("BROWSER_POOL_MIN_PAGES", "2")),
+            max_pages=int(os.getenv("BROWSER_POOL_MAX_PAGES", "20")),
+            max_pages_per_process=int(os.getenv("BROWSER_MAX_PAGES_PER_PROCESS", "500")),
+            rss_limit_mb=rss_limit_mb if rss_limit_mb > 0 else None,
+            target_wait=float(os.getenv("BROWSER_POOL_TARGET_WAIT", "0.05")),
+            interval=float(os.getenv("BROWSER_AUTOSCALE_INTERVAL", "5")),
+        )
+
+
+class _BrowserProcess:
+    def __init__(self, browser: Browser, context: BrowserContext):
+        self.browser = browser
+        self.context = context
+        self.pages: Set[Page] = set()
+        self.pages_opened = 0
+        self.retiring = False
+
+
+class BrowserFleet:
+    """
+    Several Chromium processes behind one page factory. New pages go to the
+    active browser with the fewest open pages. A browser is retired once it
+    has opened its page budget, or when the fleet is over its memory limit:
+    it opens no new pages, a replacement is launched on the next page
+    request, and it is closed once its last page is. In-flight extractions
+    on its pages finish undisturbed; the page pool closes those pages as
+    they come back instead of reusing them.
+    """
+
+    def __init__(
+            self,
+            launch: Callable[[], Awaitable[Browser]],
+            traffic: BrowserTraffic,
+            processes: int = 2,
+            max_pages_per_process: int = 500,
+            on_retire: Optional[Callable[[], None]] = None,
+            rss_limit_mb: Optional[float] = None):
+        self.__launch_browser = launch
+        self.__traffic = traffic
+        self.__processes_wanted = max(1, processes)
+        self.__max_pages_per_process = max_pages_per_process
+        self.__rss_limit_mb = rss_limit_mb
+        # Called after a browser is retired, so idle pages of it can be let go.
+        self.on_retire = on_retire
+        self.__processes: List[_BrowserProcess] = []
+        self.__by_page: Dict[Page, _BrowserProcess] = {}
+        self.__closing: Set[asyncio.Task] = set()
+        self.__launching = asyncio.Lock()
+        self.recycled = 0
+
+
+    def __len__(self) -> int:
+        return len(self.__processes)
+
+
+    async def __launch(self) -> _BrowserProcess:
+        browser = await self.__launch_browser()
+        try:
+            context = await self.__traffic.open(browser)
+        except BaseException:
+            await browser.close()
+            raise
+        process = _BrowserProcess(browser, context)
+        self.__processes.append(process)
+        BROWSER_PROCESSES.inc()
+        browser.on("disconnected", lambda _: self.__disconnected(process))
+        return process
+
+
+    def __disconnected(self, process: _BrowserProcess):
+        # A crashed browser: its pages are closed too, and the pool replaces them.
+        if process in self.__processes:
+            logger.warning("A browser disconnected with %d pages open", len(process.pages))
+            process.retiring = True
+            self.__close_later(process)
+
+
+    async def __active(self) -> List[_BrowserProcess]:
+        # Retired browsers are replaced here, when a page is next needed.
+        async with self.__launching:
+            active = [process for process in self.__processes if not process.retiring]
+            while len(active) < self.__processes_wanted:
+                active.append(await self.__launch())
+            return active
+
+
+    async def start(self):
+        if self.__rss_limit_mb and psutil is None:
+            logger.warning("BROWSER_RSS_LIMIT_MB is set but psutil is not installed; browser memory is not limited")
+        await self.__active()
+
+
+    async def new_page(self) -> Page:
+        """The page pool's page factory."""
+        process = min(await self.__active(), key=lambda candidate: len(candidate.pages))
+        page = await process.context.new_page()
+        process.pages.add(page)
+        process.pages_opened += 1
+        self.__by_page[page] = process
+        page.on("close", self.__page_closed)
+        if process.pages_opened >= self.__max_pages_per_process:
+            self.__retire(process, PAGE_BUDGET)
+        return page
+
+
+    def is_retired(self, page: Page) -> bool:
+        process = self.__by_page.get(page)
+        return process is not None and process.retiring
+
+
+    def __retire(self, process: _BrowserProcess, reason: str):
+        if process.retiring:
+            return
+        process.retiring = True
+        self.recycled += 1
+        BROWSERS_RECYCLED.labels(reason).inc()
+        logger.info("Retiring a browser after %d pages (%s), %d still open", process.pages_opened, reason, len(process.pages))
+        if not process.pages:
+            self.__close_later(process)
+        if self.on_retire is not None:
+            self.on_retire()
+
+
+    def __page_closed(self, page: Page):
+        process = self.__by_page.pop(page, None)
+        if process is None:
+            return
+        process.pages.discard(page)
+        if process.retiring and not process.pages:
+            self.__close_later(process)
+
+
+    def __close_later(self, process: _BrowserProcess):
+        task = asyncio.create_task(self.__close_process(process))
+        self.__closing.add(task)
+        task.add_done_callback(self.__closing.discard)
+
+
+    async def __close_process(self, process: _BrowserProcess):
+        if process not in self.__processes:
+            return
+        self.__processes.remove(process)
+        BROWSER_PROCESSES.dec()
+        for page in process.pages:
+            self.__by_page.pop(page, None)
+        try:
+            await self.__traffic.close_context(process.context)
+            await process.browser.close()
+        except Exception as e:
+            logger.warning("Error closing a retired browser: %r", e)
+
+
+    def rss_bytes(self) -> Optional[int]:
+        """
+        Resident memory of this process's descendants, i.e. the Playwright
+        driver and the Chromium processes; None without psutil.
+        """
+        if psutil is None:
+            return None
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        BROWSER_RSS.set(total)
+        return total
+
+
+    def recycle_oldest(self) -> bool:
+        """Retires the active browser that opened the most pages, unless one is already draining."""
+        if any(process.retiring for process in self.__processes):
+            return False
+        active = [process for process in self.__processes if not process.retiring]
+        if not active:
+            return False
+        self.__retire(max(active, key=lambda process: process.pages_opened), MEMORY)
+        return True
+
+
+    async def close(self):
+        for task in list(self.__closing):
+            await task
+        for process in list(self.__processes):
+            await self.__close_process(process)
+        await self.__traffic.close()
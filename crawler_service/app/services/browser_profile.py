@@ -0,0 +1,165 @@
+from playwright.async_api import Browser, BrowserContext, Page, Request, Route
+from dataclasses import dataclass
+from typing import FrozenSet, Optional, Set, Tuple
+import asyncio
+import os
+import weakref
+
+
+@dataclass
+class BrowserProfile:
+    """
+    How crawler pages are set up. The extractors only read the DOM of the
+    main document, so by default every other resource type is aborted and
+    page scripts are turned off (Playwright's evaluate still runs).
+    Each stage of a page visit has its own timeout in seconds: loading the
+    document, waiting for a selector or clicking, and running an extraction
+    script.
+    """
+    allowed_resource_types: FrozenSet[str] = frozenset({"document", "xhr", "fetch"})
+    block_resources: bool = True
+    javascript_enabled: bool = False
+    viewport: Tuple[int, int] = (800, 600)
+    navigation_timeout: float = 30.0
+    action_timeout: float = 15.0
+    extraction_timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "BrowserProfile":
+        width, height = os.getenv("BROWSER_VIEWPORT", "800x600").lower().split("x")
+        return cls(
+            allowed_resource_types=frozenset(
+                resource_type.strip()
+                for resource_type in os.getenv("BROWSER_ALLOWED_RESOURCE_TYPES", "document,xhr,fetch").split(",")
+                if resource_type.strip()
+            ),
+            block_resources=os.getenv("BROWSER_BLOCK_RESOURCES", "true").lower() == "true",
+            javascript_enabled=os.getenv("BROWSER_JAVASCRIPT_ENABLED", "false").lower() == "true",
+            viewport=(int(width), int(height)),
+            navigation_timeout=float(os.getenv("BROWSER_NAVIGATION_TIMEOUT", "30")),
+            action_timeout=float(os.getenv("BROWSER_ACTION_TIMEOUT", "15")),
+            extraction_timeout=float(os.getenv("BROWSER_EXTRACTION_TIMEOUT", "10")),
+        )
+
+
+@dataclass
+class BrowserTrafficStats:
+    navigations: int
+    allowed_requests: int
+    blocked_requests: int
+    bytes_received: int
+    total_domcontentloaded: float
+    max_domcontentloaded: float
+
+    @property
+    def average_bytes(self) -> float:
+        return self.bytes_received / self.navigations if self.navigations else 0.0
+
+    @property
+    def average_domcontentloaded(self) -> float:
+        return self.total_domcontentloaded / self.navigations if self.navigations else 0.0
+
+
+class BrowserTraffic:
+    """
+    Browser contexts for the crawler pages plus the request policy and the
+    per-page traffic counters. Each browser process gets one context, so its
+    pages share that context's cache and the route handler is installed once
+    per browser; the counters cover all of them. Playwright bypasses the
+    HTTP cache while a route is active, which costs little here because only
+    documents get through.
+    """
+
+    def __init__(self, profile: BrowserProfile):
+        self.__profile = profile
+        self.__contexts: Set[BrowserContext] = set()
+        self.__page_bytes: "weakref.WeakKeyDictionary[Page, int]" = weakref.WeakKeyDictionary()
+        self.__counting: Set[asyncio.Task] = set()
+        self.__navigations = 0
+        self.__allowed = 0
+        self.__blocked = 0
+        self.__bytes = 0
+        self.__total_domcontentloaded = 0.0
+        self.__max_domcontentloaded = 0.0
+
+
+    async def open(self, browser: Browser) -> BrowserContext:
+        width, height = self.__profile.viewport
+        context = await browser.new_context(
+            java_script_enabled=self.__profile.javascript_enabled,
+            viewport={"width": width, "height": height},
+            service_workers="block",
+        )
+        context.set_default_navigation_timeout(self.__profile.navigation_timeout * 1000)
+        context.set_default_timeout(self.__profile.action_timeout * 1000)
+        if self.__profile.block_resources:
+            await context.route("**/*", self.__route)
+        context.on("requestfinished", self.__on_request_finished)
+        self.__contexts.add(context)
+        return context
+
+
+    @property
+    def profile(self) -> BrowserProfile:
+        return self.__profile
+
+
+    @property
+    def stats(self) -> BrowserTrafficStats:
+        return BrowserTrafficStats(
+            navigations=self.__navigations,
+            allowed_requests=self.__allowed,
+            blocked_requests=self.__blocked,
+            bytes_received=self.__bytes,
+            total_domcontentloaded=self.__total_domcontentloaded,
+            max_domcontentloaded=self.__max_domcontentloaded,
+        )
+
+
+    async def __route(self, route: Route):
+        if route.request.resource_type in self.__profile.allowed_resource_types:
+            self.__allowed += 1
+            await route.continue_()
+        else:
+            self.__blocked += 1
+            await route.abort("blockedbyclient")
+
+
+    def __on_request_finished(self, request: Request):
+        task = asyncio.create_task(self.__count(request))
+        self.__counting.add(task)
+        task.add_done_callback(self.__counting.discard)
+
+
+    async def __count(self, request: Request):
+        try:
+            sizes = await request.sizes()
+            page = request.frame.page
+        except Exception:
+            # The page or context went away before the sizes were read.
+            return
+        received = sizes["responseHeadersSize"] + sizes["responseBodySize"]
+        self.__bytes += received
+        self.__page_bytes[page] = self.__page_bytes.get(page, 0) + received
+
+
+    def bytes_for(self, page: Page) -> int:
+        """Bytes received so far by requests of `page`; counted shortly after each request finishes."""
+        return self.__page_bytes.get(page, 0)
+
+
+    def record_navigation(self, domcontentloaded: float):
+        self.__navigations += 1
+        self.__total_domcontentloaded += domcontentloaded
+        self.__max_domcontentloaded = max(self.__max_domcontentloaded, domcontentloaded)
+
+
+    async def close_context(self, context: BrowserContext):
+        if context in self.__contexts:
+            self.__contexts.remove(context)
+            await context.close()
+
+
+    async def close(self):
+        for context in list(self.__contexts):
+            await self.close_context(context)
@@ -0,0 +1,82 @@
+from app.utils.logger import get_logger
+from app.utils.metrics import COALESCED_FETCHES
+from app.utils.singleton import Singleton
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import os
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        # Set once the fetch succeeded; the result is reused until then.
+        self.expires_at: Optional[float] = None
+
+
+class CrawlCoordinator(metaclass=Singleton):
+    """
+    Shares detail fetches between the crawls of one process. Overlapping
+    terms ("acme", "acme holdings") list the same documents, and both crawls
+    pass the index check before either has stored them; the first to fetch a
+    document number runs the fetch and the others await the same task. A
+    result is kept for `linger` seconds so a crawl that reaches the document
+    a moment later, while the entity is still in a write buffer, reuses it.
+    A failure is shared with the crawls waiting on it but not kept. The
+    fetch is cancelled only when every crawl waiting on it was cancelled.
+    """
+
+    def __init__(self, linger: float = 5.0):
+        self.__linger = linger
+        self.__flights: Dict[str, _Flight] = {}
+
+
+    @classmethod
+    def from_env(cls) -> "CrawlCoordinator":
+        return cls(linger=float(os.getenv("CRAWL_COALESCE_LINGER", "5")))
+
+
+    def __len__(self) -> int:
+        return len(self.__flights)
+
+
+    async def fetch(self, document_number: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        flight = self.__flights.get(document_number)
+        if flight is not None and flight.expires_at is not None and flight.expires_at <= loop.time():
+            flight = None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            self.__flights[document_number] = flight
+            flight.task.add_done_callback(lambda task: self.__landed(document_number, flight))
+        else:
+            logger.debug("Joining the fetch of %s", document_number)
+            COALESCED_FETCHES.inc()
+        flight.waiters += 1
+        try:
+            # Shielded, so one crawl's cancellation leaves the fetch to the others.
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+
+    def __landed(self, document_number: str, flight: _Flight):
+        if flight.task.cancelled() or flight.task.exception() is not None or self.__linger <= 0:
+            self.__forget(document_number, flight)
+            return
+        loop = asyncio.get_running_loop()
+        flight.expires_at = loop.time() + self.__linger
+        loop.call_later(self.__linger, self.__forget, document_number, flight)
+
+
+    def __forget(self, document_number: str, flight: _Flight):
+        # A newer flight for the document may have replaced this one.
+        if self.__flights.get(document_number) is flight:
+            del self.__flights[document_number]
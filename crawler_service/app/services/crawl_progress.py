@@ -0,0 +1,90 @@
+from app.models.crawl_job import DeadLetter
+from app.models.entity import SearchResultsPage
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set
+
+
+class CrawlProgress:
+    """
+    Tracks which documents of a search are done so the crawl can resume.
+    Details of several results pages are fetched at once, so the resume
+    point (`cursor`) is the earliest results page that still has documents
+    outstanding; documents already done on it are skipped on resume.
+    Documents that failed for good are kept as dead letters until the next
+    checkpoint records them.
+    """
+
+    def __init__(self, start_url: Optional[str] = None, processed: Iterable[str] = (), pages_crawled: int = 0, documents_failed: int = 0):
+        self.start_url = start_url
+        self.pages_crawled = pages_crawled
+        self.documents_failed = documents_failed
+        self.__processed: Set[str] = set(processed)
+        self.__unsaved: List[str] = []
+        self.__dead_letters: List[DeadLetter] = []
+        self.__outstanding: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self.__last_page: Optional[SearchResultsPage] = None
+
+
+    def __contains__(self, document_number: str) -> bool:
+        return document_number in self.__processed
+
+
+    def page_started(self, page: SearchResultsPage, document_numbers: Iterable[str]):
+        """Called with the documents of `page` that will be fetched; the others are done already."""
+        self.pages_crawled += 1
+        self.__last_page = page
+        self.__outstanding[page.url] = set(document_numbers)
+        for row in page.rows:
+            if row.document_number not in self.__outstanding[page.url]:
+                self.__mark(row.document_number)
+
+
+    def document_done(self, document_number: str, failed: bool = False):
+        if failed:
+            self.documents_failed += 1
+        for pending in self.__outstanding.values():
+            pending.discard(document_number)
+        self.__mark(document_number)
+
+
+    def document_failed(self, document_number: str, detail_url: Optional[str], error: str, attempts: int):
+        self.__dead_letters.append(DeadLetter(document_number, detail_url, error, attempts))
+        self.document_done(document_number, failed=True)
+
+
+    def __mark(self, document_number: str):
+        if document_number not in self.__processed:
+            self.__processed.add(document_number)
+            self.__unsaved.append(document_number)
+
+
+    @property
+    def cursor(self) -> Optional[str]:
+        while self.__outstanding:
+            url, pending = next(iter(self.__outstanding.items()))
+            if pending:
+                return url
+            self.__outstanding.popitem(last=False)
+        if self.__last_page is None:
+            return self.start_url
+        return self.__last_page.next_url or self.__last_page.url
+
+
+    def take_unsaved(self) -> List[str]:
+        """Documents finished since the last call, for the next checkpoint."""
+        unsaved, self.__unsaved = self.__unsaved, []
+        return unsaved
+
+
+    def restore_unsaved(self, document_numbers: List[str]):
+        """Puts back documents whose checkpoint failed."""
+        self.__unsaved[:0] = document_numbers
+
+
+    def take_dead_letters(self) -> List[DeadLetter]:
+        dead_letters, self.__dead_letters = self.__dead_letters, []
+        return dead_letters
+
+
+    def restore_dead_letters(self, dead_letters: List[DeadLetter]):
+        self.__dead_letters[:0] = dead_letters
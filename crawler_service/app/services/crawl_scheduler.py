@@ -0,0 +1,350 @@
+from app.utils.logger import get_logger
+from app.utils.metrics import CIRCUIT_OPENED
+from typing import Optional, Callable, Awaitable, AsyncIterator, Deque, Dict, List, Set, Tuple, Type, TypeVar
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+import asyncio
+import os
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = float(burst)
+        self.__updated_at: Optional[float] = None
+        self.__mutex = asyncio.Lock()
+
+
+    @property
+    def rate(self) -> float:
+        return self.__rate
+
+
+    @rate.setter
+    def rate(self, rate: float):
+        self.__refill()
+        self.__rate = rate
+
+
+    def __refill(self):
+        now = asyncio.get_running_loop().time()
+        if self.__updated_at is not None:
+            self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated_at) * self.__rate)
+        self.__updated_at = now
+
+
+    async def acquire(self):
+        # The lock keeps acquirers in FIFO order while the head one sleeps.
+        async with self.__mutex:
+            self.__refill()
+            while self.__tokens < 1:
+                await asyncio.sleep((1 - self.__tokens) / self.__rate)
+                self.__refill()
+            self.__tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Pauses requests to one host while it is failing. Once `failure_ratio`
+    of the last `window` requests (and at least `min_requests`) failed, the
+    circuit opens: new requests wait instead of piling onto the outage.
+    After `open_for` seconds a single probe goes through; its success
+    closes the circuit and releases the waiters, its failure re-opens it.
+    """
+
+    def __init__(self, host: str, window: int = 20, min_requests: int = 10, failure_ratio: float = 0.5, open_for: float = 30.0):
+        self.host = host
+        self.__outcomes: Deque[bool] = deque(maxlen=window)
+        self.__min_requests = min_requests
+        self.__failure_ratio = failure_ratio
+        self.__open_for = open_for
+        self.__opened_at: Optional[float] = None
+        self.__probing = False
+        self.__closed = asyncio.Event()
+        self.__closed.set()
+        self.opened = 0
+
+
+    @property
+    def is_open(self) -> bool:
+        return self.__opened_at is not None
+
+
+    async def admit(self) -> bool:
+        """Waits while the circuit is open; True when the caller is the probe."""
+        loop = asyncio.get_running_loop()
+        while self.__opened_at is not None:
+            remaining = self.__opened_at + self.__open_for - loop.time()
+            if remaining <= 0 and not self.__probing:
+                self.__probing = True
+                return True
+            try:
+                await asyncio.wait_for(self.__closed.wait(), remaining if remaining > 0 else self.__open_for)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+
+    def record(self, ok: Optional[bool], probe: bool = False):
+        """An outcome: True, False, or None for a request that was cancelled."""
+        if probe:
+            self.__probing = False
+            if ok:
+                logger.info("Circuit for %s closed", self.host)
+                self.__outcomes.clear()
+                self.__opened_at = None
+                self.__closed.set()
+            elif ok is not None:
+                self.__open()
+            return
+        # Requests admitted before the circuit opened do not decide it.
+        if ok is None or self.__opened_at is not None:
+            return
+        self.__outcomes.append(ok)
+        failures = self.__outcomes.count(False)
+        if len(self.__outcomes) >= self.__min_requests and failures >= self.__failure_ratio * len(self.__outcomes):
+            self.__open()
+
+
+    def __open(self):
+        if self.__opened_at is None:
+            self.opened += 1
+            CIRCUIT_OPENED.labels(self.host).inc()
+            logger.warning("Circuit for %s opened, pausing its requests for %.0fs", self.host, self.__open_for)
+        self.__opened_at = asyncio.get_running_loop().time()
+        self.__closed.clear()
+
+
+@dataclass
+class CrawlRequest:
+    url: str
+    status: Optional[int] = None
+
+
+@dataclass
+class CrawlSchedulerStats:
+    rate: float
+    in_flight: int
+    requests: int
+    slowdowns: int
+    circuit_opens: int
+    open_circuits: List[str]
+
+
+class CrawlScheduler:
+    """
+    Shapes crawl traffic: a global and a per-host concurrency cap, a token
+    bucket on request starts and AIMD rate control - the rate is cut on
+    429/5xx responses and timeouts, then grows back slowly on success.
+    A CircuitBreaker per host pauses requests altogether while most of
+    them fail.
+    """
+    SLOWDOWN_STATUSES = (429,)
+
+    def __init__(
+            self,
+            max_concurrency: int = 10,
+            per_host_concurrency: int = 4,
+            requests_per_second: float = 5.0,
+            burst: int = 5,
+            prefetch_pages: int = 1,
+            min_requests_per_second: float = 0.2,
+            backoff_factor: float = 0.5,
+            recovery_step: float = 0.05,
+            slowdown_cooldown: float = 2.0,
+            circuit_window: int = 20,
+            circuit_failure_ratio: float = 0.5,
+            circuit_open_for: float = 30.0,
+            timeout_errors: Tuple[Type[BaseException], ...] = ()):
+        self.__global = asyncio.Semaphore(max_concurrency)
+        self.__per_host_concurrency = per_host_concurrency
+        self.__hosts: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.__per_host_concurrency))
+        self.__bucket = TokenBucket(requests_per_second, burst)
+        self.__breakers: Dict[str, CircuitBreaker] = {}
+        self.__circuit_window = circuit_window
+        self.__circuit_failure_ratio = circuit_failure_ratio
+        self.__circuit_open_for = circuit_open_for
+        self.__max_rate = requests_per_second
+        self.__min_rate = min_requests_per_second
+        self.__backoff_factor = backoff_factor
+        self.__recovery_step = recovery_step
+        self.__slowdown_cooldown = slowdown_cooldown
+        self.__last_slowdown: Optional[float] = None
+        self.__timeout_errors = (asyncio.TimeoutError,) + tuple(timeout_errors)
+        self.__max_pending = max_concurrency * 2
+        self.__prefetch_pages = prefetch_pages
+        self.__in_flight = 0
+        self.__requests = 0
+        self.__slowdowns = 0
+
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "CrawlScheduler":
+        return cls(
+            max_concurrency=int(os.getenv("CRAWL_MAX_CONCURRENCY", "10")),
+            per_host_concurrency=int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "4")),
+            requests_per_second=float(os.getenv("CRAWL_REQUESTS_PER_SECOND", "5")),
+            prefetch_pages=int(os.getenv("CRAWL_PREFETCH_PAGES", "1")),
+            circuit_window=int(os.getenv("CRAWL_CIRCUIT_WINDOW", "20")),
+            circuit_failure_ratio=float(os.getenv("CRAWL_CIRCUIT_FAILURE_RATIO", "0.5")),
+            circuit_open_for=float(os.getenv("CRAWL_CIRCUIT_OPEN_SECONDS", "30")),
+            **kwargs,
+        )
+
+
+    @property
+    def stats(self) -> CrawlSchedulerStats:
+        return CrawlSchedulerStats(
+            rate=self.__bucket.rate,
+            in_flight=self.__in_flight,
+            requests=self.__requests,
+            slowdowns=self.__slowdowns,
+            circuit_opens=sum(breaker.opened for breaker in self.__breakers.values()),
+            open_circuits=[host for host, breaker in self.__breakers.items() if breaker.is_open],
+        )
+
+
+    def __breaker(self, host: str) -> CircuitBreaker:
+        if host not in self.__breakers:
+            self.__breakers[host] = CircuitBreaker(
+                host,
+                window=self.__circuit_window,
+                min_requests=max(1, self.__circuit_window // 2),
+                failure_ratio=self.__circuit_failure_ratio,
+                open_for=self.__circuit_open_for,
+            )
+        return self.__breakers[host]
+
+
+    def __slow_down(self):
+        now = asyncio.get_running_loop().time()
+        # Requests already in flight fail together; count a burst only once.
+        if self.__last_slowdown is not None and now - self.__last_slowdown < self.__slowdown_cooldown:
+            return
+        self.__last_slowdown = now
+        self.__slowdowns += 1
+        self.__bucket.rate = max(self.__min_rate, self.__bucket.rate * self.__backoff_factor)
+        logger.warning("Sunbiz is pushing back. Request rate lowered to %.2f req/s", self.__bucket.rate)
+
+
+    def __speed_up(self):
+        if self.__bucket.rate < self.__max_rate:
+            self.__bucket.rate = min(self.__max_rate, self.__bucket.rate + self.__recovery_step)
+
+
+    @asynccontextmanager
+    async def request(self, url: str) -> AsyncIterator[CrawlRequest]:
+        """
+        Waits for a request slot on url's host, and first for its circuit to
+        close. Callers set `status` on the yielded request so 429/5xx
+        responses feed the rate control and the circuit breaker.
+        """
+        request = CrawlRequest(url)
+        host = urlsplit(url).netloc
+        breaker = self.__breaker(host)
+        probe = await breaker.admit()
+        ok: Optional[bool] = None
+        try:
+            async with self.__global, self.__hosts[host]:
+                await self.__bucket.acquire()
+                self.__in_flight += 1
+                self.__requests += 1
+                try:
+                    yield request
+                    ok = True
+                except self.__timeout_errors:
+                    ok = False
+                    self.__slow_down()
+                    raise
+                except Exception:
+                    ok = False
+                    raise
+                finally:
+                    self.__in_flight -= 1
+                    if request.status is not None:
+                        if request.status in self.SLOWDOWN_STATUSES or request.status >= 500:
+                            ok = False
+                            self.__slow_down()
+                        else:
+                            self.__speed_up()
+        finally:
+            breaker.record(ok, probe)
+
+
+    async def crawl(self, pages: AsyncIterator[List[T]], fetch: Callable[[T], Awaitable[R]]) -> AsyncIterator[R]:
+        """
+        Runs `fetch` over every item of every page and yields the results in
+        completion order. Up to `prefetch_pages` pages are fetched ahead of
+        the one being scheduled, and items of the next page start as soon as
+        the pending window has room, so detail fetches never wait for a whole
+        results page to drain.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        page_slots = asyncio.Semaphore(self.__prefetch_pages + 1)
+        backlog: Deque[Deque[T]] = deque()
+        tasks: Set[asyncio.Task] = set()
+        pending = 0
+        exhausted = False
+
+        async def produce():
+            iterator = pages.__aiter__()
+            try:
+                while True:
+                    await page_slots.acquire()
+                    try:
+                        items = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    events.put_nowait(("page", items))
+            except Exception as e:
+                events.put_nowait(("error", e))
+            else:
+                events.put_nowait(("done", None))
+
+        async def run(item: T):
+            try:
+                events.put_nowait(("result", await fetch(item)))
+            except Exception as e:
+                events.put_nowait(("error", e))
+
+        def spawn():
+            nonlocal pending
+            while backlog and pending < self.__max_pending:
+                items = backlog[0]
+                if items:
+                    task = asyncio.create_task(run(items.popleft()))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    pending += 1
+                if not items:
+                    backlog.popleft()
+                    page_slots.release()
+
+        producer = asyncio.create_task(produce())
+        try:
+            while not exhausted or pending or backlog:
+                kind, value = await events.get()
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    exhausted = True
+                elif kind == "page":
+                    backlog.append(deque(value))
+                elif kind == "result":
+                    pending -= 1
+                spawn()
+                if kind == "result":
+                    yield value
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,258 @@
+from app.db.entity_writer import EntityWriter
+from app.models.crawl_job import CrawlJob, CrawlJobDao, COMPLETED, FAILED, CANCELLED, REFRESH, RETRY
+from app.models.entity import EntityDao, RefreshCandidate, SearchResultRow, SearchResultsPage
+from app.services.crawl_progress import CrawlProgress
+from app.services.entity_refresh import RefreshPolicy, RefreshProgress
+from app.services.registry_sweep import SweepShard
+from app.services.sunbiz_crawler import SunbizCrawler
+from app.utils.logger import get_logger
+from app.utils.metrics import ACTIVE_CRAWLS, DEAD_LETTERS
+from typing import AsyncIterator, Awaitable, List, Optional, Union
+import asyncio
+import os
+import socket
+import uuid
+
+
+logger = get_logger(__name__)
+
+
+class CrawlWorker:
+    """
+    Drains the crawl_jobs queue one job at a time. While a job runs the
+    worker checkpoints it every `checkpoint_interval` seconds: buffered
+    entities are written first, then the resume cursor and the finished
+    document numbers are saved with a heartbeat. A cancelled job, or one
+    another worker reclaimed, stops at the next checkpoint. Refresh jobs
+    re-fetch stale stored entities instead and write only changed ones;
+    retry jobs re-fetch dead-lettered documents.
+    """
+
+    def __init__(
+        self,
+        crawler: SunbizCrawler,
+        crawl_job_dao: CrawlJobDao,
+        entity_dao: EntityDao,
+        entity_writer: EntityWriter,
+        poll_interval: float = 2.0,
+        checkpoint_interval: float = 5.0,
+        stale_after: float = 60.0,
+        max_attempts: int = 3,
+        refresh_policy: Optional[RefreshPolicy] = None,
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.__crawler = crawler
+        self.__crawl_job_dao = crawl_job_dao
+        self.__entity_dao = entity_dao
+        self.__entity_writer = entity_writer
+        self.__poll_interval = poll_interval
+        self.__checkpoint_interval = checkpoint_interval
+        self.__stale_after = stale_after
+        self.__max_attempts = max_attempts
+        self.__refresh_policy = refresh_policy or RefreshPolicy()
+        self.__stopping = asyncio.Event()
+        self.current_job: Optional[CrawlJob] = None
+
+
+    @classmethod
+    def from_env(cls, crawler: SunbizCrawler, crawl_job_dao: CrawlJobDao, entity_dao: EntityDao, entity_writer: EntityWriter) -> "CrawlWorker":
+        return cls(
+            crawler,
+            crawl_job_dao,
+            entity_dao,
+            entity_writer,
+            poll_interval=float(os.getenv("CRAWL_JOB_POLL_INTERVAL", "2")),
+            checkpoint_interval=float(os.getenv("CRAWL_JOB_CHECKPOINT_INTERVAL", "5")),
+            stale_after=float(os.getenv("CRAWL_JOB_STALE_AFTER", "60")),
+            max_attempts=int(os.getenv("CRAWL_JOB_MAX_ATTEMPTS", "3")),
+            refresh_policy=RefreshPolicy.from_env(),
+        )
+
+
+    async def run(self):
+        while not self.__stopping.is_set():
+            try:
+                job = await self.__crawl_job_dao.claim(self.worker_id, self.__stale_after, self.__max_attempts)
+            except Exception as e:
+                logger.error("Error claiming crawl job: %r", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.__stopping.wait(), self.__poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.current_job = job
+            ACTIVE_CRAWLS.labels(job.kind).inc()
+            try:
+                await self.process(job)
+            except Exception as e:
+                # Left running; it is reclaimed from its last checkpoint once stale.
+                logger.error("Error processing crawl job %s: %r", job.id, e)
+            finally:
+                ACTIVE_CRAWLS.labels(job.kind).dec()
+                self.current_job = None
+
+
+    def stop(self):
+        """Stops after checkpointing the current job and handing it back to the queue."""
+        self.__stopping.set()
+
+
+    async def process(self, job: CrawlJob):
+        if job.kind == REFRESH:
+            logger.info("Worker %s running refresh job %s (attempt %s)", self.worker_id, job.id, job.attempts)
+            progress = RefreshProgress(
+                start=job.cursor_url,
+                pages_crawled=job.pages_crawled,
+                documents_processed=job.documents_processed,
+                documents_failed=job.documents_failed,
+            )
+            await self.__run(job, self.__refresh(progress), progress)
+            return
+
+        progress = CrawlProgress(
+            start_url=job.cursor_url,
+            processed=await self.__crawl_job_dao.processed_documents(job.id),
+            pages_crawled=job.pages_crawled,
+            documents_failed=job.documents_failed,
+        )
+        if job.kind == RETRY:
+            logger.info("Worker %s running retry job %s (attempt %s)", self.worker_id, job.id, job.attempts)
+            await self.__run(job, self.__retry(job, progress), progress)
+            return
+
+        logger.info("Worker %s running crawl job %s for '%s' (attempt %s)", self.worker_id, job.id, job.search_term, job.attempts)
+
+        shard: Optional[SweepShard] = None
+        filter_documents = self.__entity_dao.filter_not_indexed
+        if job.sweep_id is not None:
+            shard = SweepShard(job.search_term, job.max_pages, job.pages_crawled)
+
+            async def filter_documents(document_numbers: List[str]) -> List[str]:
+                # Overlapping shards list the same rows; only the first claim opens the detail page.
+                not_indexed = await self.__entity_dao.filter_not_indexed(document_numbers)
+                return await self.__crawl_job_dao.claim_documents(job.sweep_id, job.id, not_indexed)
+
+        async def crawl():
+            async for entity in self.__crawler.search(job.search_term, filter_documents, progress, shard.pages if shard else None):
+                await self.__entity_writer.add(entity)
+                progress.document_done(entity.document_number)
+
+        await self.__run(job, crawl(), progress, shard)
+
+
+    async def __refresh(self, progress: RefreshProgress):
+        policy = self.__refresh_policy
+
+        async def batches() -> AsyncIterator[List[RefreshCandidate]]:
+            while True:
+                batch = await self.__entity_dao.refresh_candidates(progress.position, policy.active_after, policy.inactive_after, policy.batch_size)
+                if not batch:
+                    return
+                yield batch
+
+        async for entity in self.__crawler.refresh(batches(), progress):
+            await self.__entity_writer.add(entity)
+            progress.document_done(entity.document_number, changed=True)
+
+
+    async def __retry(self, job: CrawlJob, progress: CrawlProgress):
+        batch_size = self.__refresh_policy.batch_size
+
+        async def dead_letter_pages() -> AsyncIterator[SearchResultsPage]:
+            # Documents done before a restart are skipped through `progress`.
+            after = None
+            while True:
+                batch = await self.__crawl_job_dao.retry_batch(job.id, after, batch_size)
+                if not batch:
+                    return
+                after = batch[-1].document_number
+                rows = [SearchResultRow("", dead_letter.document_number, "", dead_letter.detail_url) for dead_letter in batch]
+                yield SearchResultsPage(url=f"dead-letters/{job.id}?after={after}", rows=rows)
+
+        async for entity in self.__crawler.fetch_documents(dead_letter_pages(), self.__entity_dao.filter_not_indexed, progress):
+            await self.__entity_writer.add(entity)
+            progress.document_done(entity.document_number)
+
+
+    async def __run(self, job: CrawlJob, crawl: Awaitable[None], progress: Union[CrawlProgress, RefreshProgress], shard: Optional[SweepShard] = None):
+        crawler = asyncio.create_task(crawl)
+        stopping = asyncio.create_task(self.__stopping.wait())
+        keep_running = True
+        try:
+            while keep_running:
+                done, _ = await asyncio.wait({crawler, stopping}, timeout=self.__checkpoint_interval, return_when=asyncio.FIRST_COMPLETED)
+                if crawler in done or stopping in done:
+                    break
+                try:
+                    keep_running = await self.__checkpoint(job, progress)
+                except Exception as e:
+                    logger.error("Error checkpointing crawl job %s: %r", job.id, e)
+        finally:
+            stopping.cancel()
+            if not crawler.done():
+                crawler.cancel()
+                try:
+                    await crawler
+                except asyncio.CancelledError:
+                    pass
+
+        try:
+            keep_running = await self.__checkpoint(job, progress)
+        except Exception as e:
+            # The job goes stale and is reclaimed from its last checkpoint.
+            logger.error("Error checkpointing crawl job %s: %r", job.id, e)
+            return
+        if not keep_running:
+            if (await self.__crawl_job_dao.get(job.id)).cancel_requested:
+                await self.__crawl_job_dao.finish(job.id, self.worker_id, CANCELLED)
+                logger.info("Crawl job %s cancelled", job.id)
+            return
+        if not crawler.cancelled() and crawler.exception() is not None:
+            logger.error("Crawl job %s failed: %r", job.id, crawler.exception())
+            await self.__crawl_job_dao.finish(job.id, self.worker_id, FAILED, repr(crawler.exception()))
+        elif crawler.cancelled():
+            await self.__crawl_job_dao.release(job.id, self.worker_id)
+            logger.info("Crawl job %s released at %s", job.id, progress.cursor)
+        elif shard is not None and shard.too_deep:
+            await self.__crawl_job_dao.split(job.id, self.worker_id, shard.children())
+            logger.info("Sweep shard '%s' deeper than %d pages, split into %d shards", shard.prefix, shard.max_pages, len(shard.children()))
+        elif job.kind == RETRY:
+            resolved = await self.__crawl_job_dao.resolve_dead_letters(job.id)
+            await self.__crawl_job_dao.finish(job.id, self.worker_id, COMPLETED)
+            logger.info("Retry job %s completed: %d dead letters resolved, %d failed again", job.id, resolved, progress.documents_failed)
+        elif isinstance(progress, RefreshProgress):
+            await self.__crawl_job_dao.finish(job.id, self.worker_id, COMPLETED)
+            logger.info("Refresh job %s completed: %d entities checked, %d changed", job.id, progress.documents_processed, progress.documents_changed)
+        else:
+            await self.__crawl_job_dao.finish(job.id, self.worker_id, COMPLETED)
+            logger.info("Crawl job %s completed: %d results pages", job.id, progress.pages_crawled)
+
+
+    async def __checkpoint(self, job: CrawlJob, progress: Union[CrawlProgress, RefreshProgress]) -> bool:
+        # Entities reported done must be durable before they are recorded as processed,
+        # and failed documents dead-lettered before they are.
+        await self.__entity_writer.drain()
+        dead_letters = progress.take_dead_letters()
+        if dead_letters:
+            try:
+                await self.__crawl_job_dao.record_dead_letters(job.id, dead_letters)
+            except BaseException:
+                progress.restore_dead_letters(dead_letters)
+                raise
+            DEAD_LETTERS.inc(len(dead_letters))
+        unsaved = progress.take_unsaved()
+        try:
+            return await self.__crawl_job_dao.checkpoint(
+                job.id,
+                self.worker_id,
+                progress.cursor,
+                progress.pages_crawled,
+                unsaved,
+                progress.documents_failed,
+                progress.documents_processed if isinstance(progress, RefreshProgress) else None,
+            )
+        except BaseException:
+            progress.restore_unsaved(unsaved)
+            raise
@@ -0,0 +1,100 @@
+from app.models.crawl_job import DeadLetter
+from app.models.entity import RefreshCandidate, RefreshPosition
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+import os
+
+
+@dataclass
+class RefreshPolicy:
+    """
+    Which entities a refresh job re-visits: active ones not updated for
+    `active_after`, all others not updated for `inactive_after`. Candidates
+    are read `batch_size` at a time.
+    """
+    active_after: timedelta = timedelta(days=7)
+    inactive_after: timedelta = timedelta(days=90)
+    batch_size: int = 200
+
+    @classmethod
+    def from_env(cls) -> "RefreshPolicy":
+        return cls(
+            active_after=timedelta(days=float(os.getenv("REFRESH_ACTIVE_AFTER_DAYS", "7"))),
+            inactive_after=timedelta(days=float(os.getenv("REFRESH_INACTIVE_AFTER_DAYS", "90"))),
+            batch_size=int(os.getenv("REFRESH_BATCH_SIZE", "200")),
+        )
+
+
+def format_position(position: RefreshPosition) -> str:
+    inactive, updated_at, entity_id = position
+    return f"{int(inactive)}|{updated_at.isoformat()}|{entity_id}"
+
+
+def parse_position(cursor: Optional[str]) -> Optional[RefreshPosition]:
+    if not cursor:
+        return None
+    inactive, updated_at, entity_id = cursor.split("|")
+    return (inactive == "1", datetime.fromisoformat(updated_at), int(entity_id))
+
+
+class RefreshProgress:
+    """
+    Progress of a refresh job, checkpointed like CrawlProgress. Candidates
+    of several batches are fetched at once, so the resume point (`cursor`)
+    is the start of the earliest batch with entities outstanding. Nothing
+    is recorded per entity: a resumed job re-checks the rest of that batch,
+    which costs fetches but no writes for the unchanged ones.
+    """
+
+    def __init__(self, start: Optional[str] = None, pages_crawled: int = 0, documents_processed: int = 0, documents_failed: int = 0):
+        self.pages_crawled = pages_crawled
+        self.documents_processed = documents_processed
+        self.documents_failed = documents_failed
+        self.documents_changed = 0
+        self.position = parse_position(start)
+        self.__outstanding: "OrderedDict[Optional[RefreshPosition], Set[str]]" = OrderedDict()
+
+
+    def batch_started(self, batch: List[RefreshCandidate]):
+        self.pages_crawled += 1
+        self.__outstanding[self.position] = {candidate.document_number for candidate in batch}
+        self.position = batch[-1].position
+
+
+    def document_done(self, document_number: str, failed: bool = False, changed: bool = False):
+        self.documents_processed += 1
+        if failed:
+            self.documents_failed += 1
+        if changed:
+            self.documents_changed += 1
+        for pending in self.__outstanding.values():
+            pending.discard(document_number)
+
+
+    @property
+    def cursor(self) -> Optional[str]:
+        while self.__outstanding:
+            start, pending = next(iter(self.__outstanding.items()))
+            if pending:
+                return format_position(start) if start else None
+            self.__outstanding.popitem(last=False)
+        return format_position(self.position) if self.position else None
+
+
+    def take_unsaved(self) -> List[str]:
+        return []
+
+
+    def restore_unsaved(self, document_numbers: List[str]):
+        pass
+
+
+    def take_dead_letters(self) -> List[DeadLetter]:
+        # A stored entity that failed is a candidate again on the next refresh.
+        return []
+
+
+    def restore_dead_letters(self, dead_letters: List[DeadLetter]):
+        pass
@@ -0,0 +1,66 @@
+from app.utils.logger import get_logger
+from app.utils.metrics import FETCH_RETRIES
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+import asyncio
+import os
+import random
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class FetchFailed(Exception):
+    """A fetch that failed for good; the last error is its __cause__."""
+
+    def __init__(self, error: BaseException, attempts: int):
+        super().__init__(f"{error!r} after {attempts} attempt(s)")
+        self.attempts = attempts
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How a detail fetch is retried: up to `attempts` tries, each cut off
+    after `attempt_timeout` seconds, with full-jitter exponential backoff
+    (a random delay up to base_delay * 2^n, capped at max_delay) between
+    them. The cap covers waiting for a request slot or an open circuit
+    too. Only transient errors are retried; a page that parsed wrong will
+    parse wrong again.
+    """
+    attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    attempt_timeout: Optional[float] = 120.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        attempt_timeout = float(os.getenv("CRAWL_FETCH_TIMEOUT", "120"))
+        return cls(
+            attempts=int(os.getenv("CRAWL_FETCH_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("CRAWL_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv("CRAWL_RETRY_MAX_DELAY", "30")),
+            attempt_timeout=attempt_timeout if attempt_timeout > 0 else None,
+        )
+
+
+    def backoff(self, attempt: int) -> float:
+        """Delay after the `attempt`-th failure, counting from 0."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+    async def call(self, fetch: Callable[[], Awaitable[T]], is_transient: Callable[[BaseException], bool]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(fetch(), self.attempt_timeout)
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.attempts or not is_transient(e):
+                    raise FetchFailed(e, attempt) from e
+                delay = self.backoff(attempt - 1)
+                logger.info("Fetch failed with %r, retrying in %.1fs (attempt %d of %d)", e, delay, attempt + 1, self.attempts)
+                FETCH_RETRIES.inc()
+                await asyncio.sleep(delay)
@@ -1,77 +1,446 @@
-from playwright.async_api import async_playwright, Playwright, Page, ElementHandle
+from playwright.async_api import async_playwright, Playwright, Page, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from app.utils.singleton import Singleton
-from typing import Optional, List, Callable, Awaitable, AsyncIterator
+from typing import Optional, List, Callable, Awaitable, AsyncIterator, Dict, Set
 import asyncio
-from app.models.entity import EntityDetail
+from app.models.entity import EntityDetail, SearchResultRow, SearchResultsPage
+from app.services.browser_fleet import BrowserFleet, BrowserPoolPolicy
+from app.services.browser_profile import BrowserProfile, BrowserTraffic
+from app.services.crawl_scheduler import CrawlScheduler
+from app.services.fetch_retry import RetryPolicy
+from app.services.snapshot_store import SnapshotStore, DETAIL, RESULTS
+from app.services.sunbiz_crawler import SunbizCrawler
+from app.services.sunbiz_scripts import EXTRACT_ENTITY_DETAIL_JS, EXTRACT_SEARCH_RESULTS_JS
+from app.utils.logger import get_logger
+from app.utils.metrics import EXTRACTION, GOTO, PAGE_POOL_IN_USE, PAGE_POOL_MAX_PAGES, PAGE_POOL_WAIT
 from collections import deque
-import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class PagePoolStats:
+    max_count: int
+    page_count: int
+    in_use: int
+    idle: int
+    waiters: int
+    checkouts: int
+    recycled: int
+    replaced: int
+    poisoned: int
+    total_wait: float
+    max_wait: float
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.checkouts if self.checkouts else 0.0
 
 
 class _PagePool:
-    def __init__(self, max_count: int, page_factory: Callable[[], Awaitable[Page]], on_close: Callable[[], Awaitable[None]]):
-        self.__pages: deque[Page] = deque([],  max_count)
+    """
+    Async pool of browser pages.
+
+    Checkouts are served strictly in FIFO order: a returned page (or a freed
+    slot) is handed straight to the oldest waiter instead of going back to the
+    idle queue. Closed or crashed pages are replaced on checkout and pages are
+    recycled after `max_uses` navigations. A page whose visit raised (a
+    timeout mid-navigation, a cancelled extraction) may be left in any state,
+    so `page()` closes it and frees its slot instead of handing it out again.
+    Pages of a browser that `is_retired` are treated like closed ones, so a
+    retiring browser drains as its pages come back. The pool can be resized
+    either way; above the new size, pages are closed as they are returned.
+    """
+
+    def __init__(
+            self, 
+            max_count: int, 
+            page_factory: Callable[[], Awaitable[Page]], 
+            on_close: Callable[[], Awaitable[None]],
+            max_uses: int = 100,
+            checkout_timeout: Optional[float] = 120.0,
+            is_retired: Optional[Callable[[Page], bool]] = None):
+        self.__idle: deque[Page] = deque()
+        self.__in_use: Set[Page] = set()
+        self.__uses: Dict[Page, int] = {}
+        self.__crashed: Set[Page] = set()
+        # Each waiter is resolved with a Page, or with None when it has been
+        # given a free slot and must create its own page.
+        self.__waiters: deque[asyncio.Future] = deque()
         self.__max_count = max_count
+        self.__max_uses = max_uses
+        self.__checkout_timeout = checkout_timeout
         self.__page_count = 0
         self.__page_factory = page_factory
+        self.__is_retired = is_retired
         self.is_closed = False
         self.__on_close = on_close
-        self.__mutex = asyncio.Lock()
-
+        self.__checkouts = 0
+        self.__recycled = 0
+        self.__replaced = 0
+        self.__poisoned = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+        PAGE_POOL_MAX_PAGES.set(max_count)
+
+
+    @property
+    def stats(self) -> PagePoolStats:
+        return PagePoolStats(
+            max_count=self.__max_count,
+            page_count=self.__page_count,
+            in_use=len(self.__in_use),
+            idle=len(self.__idle),
+            waiters=len(self.__waiters),
+            checkouts=self.__checkouts,
+            recycled=self.__recycled,
+            replaced=self.__replaced,
+            poisoned=self.__poisoned,
+            total_wait=self.__total_wait,
+            max_wait=self.__max_wait,
+        )
 
-    def __await_for_page(self) -> Page:
-        while(len(self.__pages) == 0):
-            time.sleep(0.1)
-        return self.__pages.pop()
-    
 
     def resize_pool(self, max_count: int):
-        if max_count < self.__max_count:
-            raise ValueError("Cannot resize pool to a smaller size")
+        if max_count < 1:
+            raise ValueError("Pool needs at least one page")
         self.__max_count = max_count
-    
-
-    async def get_page(self, start_url: str) -> Page:
-        await self.__mutex.acquire()
-        if self.__page_count < self.__max_count and len(self.__pages) == 0:
-            page = await self.__page_factory()
+        PAGE_POOL_MAX_PAGES.set(max_count)
+        # Idle pages go now; checked out ones when they come back.
+        while self.__page_count > self.__max_count and self.__idle:
+            self.__forget(self.__idle.popleft())
+            self.__page_count -= 1
+        while self.__page_count < self.__max_count and self.__hand_off(None):
             self.__page_count += 1
-            self.__pages.append(page)
-        self.__mutex.release()
-        page = await asyncio.to_thread(self.__await_for_page)
-        await page.goto(start_url, wait_until='domcontentloaded')
+
+
+    def evict_idle(self) -> int:
+        """Closes idle pages that are no longer healthy, e.g. of a retiring browser, and frees their slots."""
+        evicted = [page for page in self.__idle if not self.__is_healthy(page)]
+        for page in evicted:
+            self.__idle.remove(page)
+            self.__forget(page)
+            self.__recycled += 1
+            self.__release_slot()
+        return len(evicted)
+
+
+    def __hand_off(self, page: Optional[Page]) -> bool:
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(page)
+                return True
+        return False
+
+
+    def __release_slot(self):
+        if self.__page_count > self.__max_count or not self.__hand_off(None):
+            self.__page_count -= 1
+
+
+    def __release_page(self, page: Optional[Page]):
+        if page is None:
+            self.__release_slot()
+        elif self.__page_count > self.__max_count:
+            # Shrunk while the page was out.
+            self.__forget(page)
+            self.__page_count -= 1
+        elif not self.__hand_off(page):
+            self.__idle.append(page)
+
+
+    def __forget(self, page: Page):
+        self.__uses.pop(page, None)
+        self.__crashed.discard(page)
+        if not page.is_closed():
+            asyncio.create_task(page.close())
+
+
+    def __is_healthy(self, page: Page) -> bool:
+        if self.__is_retired is not None and self.__is_retired(page):
+            return False
+        return not page.is_closed() and page not in self.__crashed
+
+
+    async def __create_page(self) -> Page:
+        page = await self.__page_factory()
+        page.on("crash", lambda crashed: self.__crashed.add(crashed))
+        self.__uses[page] = 0
         return page
 
 
-    def return_page(self, page: Page):
-        self.__pages.append(page)
+    async def __checkout(self, timeout: Optional[float]) -> Optional[Page]:
+        if self.is_closed:
+            raise RuntimeError("Page pool is closed")
+        if not self.__waiters:
+            if self.__idle:
+                return self.__idle.popleft()
+            if self.__page_count < self.__max_count:
+                self.__page_count += 1
+                return None
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Got a page right as we timed out or were cancelled: pass it on.
+                self.__release_page(waiter.result())
+            elif waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+            raise
+
+
+    async def acquire(self, timeout: Optional[float] = None) -> Page:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        page = await self.__checkout(timeout if timeout is not None else self.__checkout_timeout)
+        if page is not None and not self.__is_healthy(page):
+            self.__forget(page)
+            self.__replaced += 1
+            page = None
+        if page is None:
+            try:
+                page = await self.__create_page()
+            except BaseException:
+                self.__release_slot()
+                raise
+        waited = loop.time() - started
+        self.__checkouts += 1
+        self.__total_wait += waited
+        self.__max_wait = max(self.__max_wait, waited)
+        PAGE_POOL_WAIT.observe(waited)
+        self.__uses[page] += 1
+        self.__in_use.add(page)
+        PAGE_POOL_IN_USE.inc()
+        return page
+
+
+    async def get_page(self, start_url: str, timeout: Optional[float] = None) -> Page:
+        page = await self.acquire(timeout)
+        try:
+            await page.goto(start_url, wait_until='domcontentloaded')
+        except BaseException:
+            self.return_page(page, poisoned=True)
+            raise
+        return page
+
+
+    def return_page(self, page: Page, poisoned: bool = False):
+        if page not in self.__in_use:
+            return
+        self.__in_use.remove(page)
+        PAGE_POOL_IN_USE.dec()
+        if self.is_closed:
+            self.__forget(page)
+            return
+        if poisoned:
+            self.__forget(page)
+            self.__poisoned += 1
+            self.__release_slot()
+            return
+        if not self.__is_healthy(page) or self.__uses[page] >= self.__max_uses:
+            self.__forget(page)
+            self.__recycled += 1
+            self.__release_slot()
+            return
+        self.__release_page(page)
+
+
+    @asynccontextmanager
+    async def page(self, start_url: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[Page]:
+        if start_url is None:
+            page = await self.acquire(timeout)
+        else:
+            page = await self.get_page(start_url, timeout)
+        try:
+            yield page
+        except BaseException:
+            self.return_page(page, poisoned=True)
+            raise
+        self.return_page(page)
 
 
     async def close(self):
-        for page in self.__pages:
-            await page.close()
-        await self.__on_close()
         self.is_closed = True
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("Page pool is closed"))
+        while self.__idle:
+            await self.__idle.popleft().close()
+        await self.__on_close()
 
 
 
-class FloridaBrowserService(metaclass=Singleton):
+class PagePoolAutoscaler:
+    """
+    Resizes the page pool every `policy.interval` seconds from what the pool
+    saw since the last look: checkouts queued or an average wait above
+    `target_wait` grow it by `step` pages, idle pages and short waits shrink
+    it. Memory over `rss_limit_mb` shrinks it whatever the demand and
+    recycles the oldest browser; above 80% of the limit it does not grow.
+    """
+
+    def __init__(self, pool: _PagePool, fleet: BrowserFleet, policy: BrowserPoolPolicy):
+        self.__pool = pool
+        self.__fleet = fleet
+        self.__policy = policy
+        self.__task: Optional[asyncio.Task] = None
+        self.__checkouts = 0
+        self.__total_wait = 0.0
+
+
+    def start(self):
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__run())
+
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.__policy.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Error autoscaling the page pool: %r", e)
+
+
+    def tick(self) -> int:
+        """Resizes the pool once and returns its new size."""
+        policy = self.__policy
+        stats = self.__pool.stats
+        checkouts = stats.checkouts - self.__checkouts
+        average_wait = (stats.total_wait - self.__total_wait) / checkouts if checkouts else 0.0
+        self.__checkouts = stats.checkouts
+        self.__total_wait = stats.total_wait
+
+        rss = self.__fleet.rss_bytes()
+        limit = policy.rss_limit_mb * 1024 * 1024 if policy.rss_limit_mb else None
+        size = stats.max_count
+        if limit is not None and rss is not None and rss > limit:
+            size = max(policy.min_pages, size - policy.step)
+            self.__fleet.recycle_oldest()
+        elif stats.waiters or average_wait > policy.target_wait:
+            if limit is None or rss is None or rss < limit * 0.8:
+                size = min(policy.max_pages, size + policy.step)
+        elif stats.idle >= policy.step and average_wait < policy.target_wait / 4:
+            size = max(policy.min_pages, size - policy.step)
+
+        if size != stats.max_count:
+            logger.info(
+                "Page pool resized from %d to %d pages (%d waiting, %.1f ms average wait, %s MB browser RSS)",
+                stats.max_count, size, stats.waiters, average_wait * 1000, f"{rss / 1024 / 1024:.0f}" if rss is not None else "?",
+            )
+            self.__pool.resize_pool(size)
+        return size
+
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            self.__task = None
+
+
+
+class FloridaBrowserService(SunbizCrawler, metaclass=Singleton):
+    """
+    Playwright crawler for sunbiz. Pages come from a pool of `pool_size`
+    pages to start with, spread over the browsers of a BrowserFleet; the
+    PagePoolAutoscaler resizes the pool within `pool_policy`, and browsers
+    are recycled after their page budget or under memory pressure.
+    """
     BASE_URL = "https://search.sunbiz.org"
     BASE_SEARCH_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/ByName"
-    is_ready: bool = False
+    DOCUMENT_NUMBER_SEARCH_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/ByDocumentNumber"
     __page_pool: Optional[_PagePool] = None
-    __loop: Optional[asyncio.AbstractEventLoop] = None
-
-    def __init__(self, pool_size: int = 10):
+    __playwright: Optional[Playwright] = None
+    __autoscaler: Optional[PagePoolAutoscaler] = None
+
+    def __init__(
+            self, 
+            pool_size: int = 10, 
+            max_page_uses: int = 100, 
+            checkout_timeout: Optional[float] = 120.0,
+            extraction_mode: str = "script",
+            scheduler: Optional[CrawlScheduler] = None,
+            profile: Optional[BrowserProfile] = None,
+            snapshots: Optional[SnapshotStore] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            pool_policy: Optional[BrowserPoolPolicy] = None):
+        if extraction_mode not in ("script", "legacy"):
+            raise ValueError(f"Unknown extraction mode: {extraction_mode}")
         self.__page_pool_size = pool_size
+        self.__extraction_mode = extraction_mode
+        self.__scheduler = scheduler or CrawlScheduler.from_env(timeout_errors=(PlaywrightTimeoutError,))
+        self.__max_page_uses = max_page_uses
+        self.__checkout_timeout = checkout_timeout
+        self.__traffic = BrowserTraffic(profile or BrowserProfile.from_env())
+        self.__snapshots = snapshots or SnapshotStore.from_env()
+        self.__retry_policy = retry_policy or RetryPolicy.from_env()
+        self.__pool_policy = pool_policy or BrowserPoolPolicy.from_env()
 
     async def ensure_ready(self):
         if not self.is_ready:
-            ctx_manager: Playwright = await async_playwright().start()
-            browser = await ctx_manager.chromium.launch(headless=True)
-            self.__page_pool = _PagePool(self.__page_pool_size, page_factory=browser.new_page, on_close=browser.close)
+            policy = self.__pool_policy
+            self.__playwright = await async_playwright().start()
+            fleet = BrowserFleet(
+                lambda: self.__playwright.chromium.launch(headless=True),
+                self.__traffic,
+                processes=policy.processes,
+                max_pages_per_process=policy.max_pages_per_process,
+                rss_limit_mb=policy.rss_limit_mb,
+            )
+            await fleet.start()
+            self.__page_pool = _PagePool(
+                min(max(self.__page_pool_size, policy.min_pages), policy.max_pages),
+                page_factory=fleet.new_page,
+                on_close=fleet.close,
+                max_uses=self.__max_page_uses,
+                checkout_timeout=self.__checkout_timeout,
+                is_retired=fleet.is_retired,
+            )
+            fleet.on_retire = self.__page_pool.evict_idle
+            if policy.interval > 0:
+                self.__autoscaler = PagePoolAutoscaler(self.__page_pool, fleet, policy)
+                self.__autoscaler.start()
             self.is_ready = True
 
 
+    @property
+    def scheduler(self) -> CrawlScheduler:
+        return self.__scheduler
+
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self.__retry_policy
+
+
+    def is_transient(self, error: BaseException) -> bool:
+        # Playwright raises Error for timeouts, crashed pages and network failures alike.
+        return isinstance(error, PlaywrightError) or super().is_transient(error)
+
+
+    @property
+    def pool_stats(self) -> Optional[PagePoolStats]:
+        if self.__page_pool is None:
+            return None
+        return self.__page_pool.stats
+
+
+    @property
+    def traffic(self) -> BrowserTraffic:
+        return self.__traffic
+
+
     async def __extract_address_block(page: Page, block_title: str) -> dict:
         result = {
             f"{block_title.lower().replace(' ', '_')}": None,
@@ -113,33 +482,30 @@ class FloridaBrowserService(metaclass=Singleton):
             if heading_span:
                 heading_text = (await heading_span.inner_text()).strip()
                 if "Registered Agent Name & Address" in heading_text:
-                    print("Found registered agent section")
+                    logger.debug("Found registered agent section")
                     spans = await section.query_selector_all("span")
-                    print("Got spans")
                     if len(spans) > 2:
                         agent_name = await spans[1].inner_text()
                         result["registered_agent_name"] = agent_name.strip()
-                        print("Got agent name", agent_name.strip())
+                        logger.debug("Got agent name %s", result["registered_agent_name"])
 
                         agent_addr_text = await spans[2].inner_text()
                         result["registered_agent_address"] = agent_addr_text.strip()
-                        print("Got agent address", agent_addr_text.strip())
+                        logger.debug("Got agent address %s", result["registered_agent_address"])
                 
                     name_changed_span = await section.query_selector('span:has-text("Name Changed:")')
                     if name_changed_span:
-                        print("Found name changed span")
                         changed_text = await name_changed_span.inner_text()
                         changed_date = changed_text.replace("Name Changed:", "").strip()
                         result["registered_agent_name_changed"] = changed_date
-                        print("Got agent name changed date", changed_date)
+                        logger.debug("Got agent name changed date %s", changed_date)
 
                     address_changed_span = await section.query_selector('span:has-text("Address Changed:")')
                     if address_changed_span:
-                        print("Found address changed span")
                         changed_text = await address_changed_span.inner_text()
                         changed_date = changed_text.replace("Address Changed:", "").strip()
                         result["registered_agent_address_changed"] = changed_date
-                        print("Got agent address changed date", changed_date)
+                        logger.debug("Got agent address changed date %s", changed_date)
 
                     break
         return result
@@ -174,22 +540,19 @@ class FloridaBrowserService(metaclass=Singleton):
             if heading_span:
                 heading_text = (await heading_span.inner_text()).strip()
                 if "Authorized Person(s) Detail" in heading_text or "Officer/Director Detail" in heading_text:
-                    print("Found authorized persons section")
+                    logger.debug("Found authorized persons section")
                     title_spans = await section.query_selector_all('span:has-text("Title")')
                     for span in title_spans:
                         title_text = await span.inner_text()
-                        print("Title text: ", title_text)
                         name_text = await span.evaluate('el => el.nextSibling.nextSibling.nextSibling ? el.nextSibling.nextSibling.nextSibling.nodeValue : ""')
-                        print("Name text: ", name_text)
                         address_span = await span.evaluate_handle('el => el.nextElementSibling.nextElementSibling.nextElementSibling && el.nextElementSibling.nextElementSibling.nextElementSibling.tagName === "SPAN" ? el.nextElementSibling.nextElementSibling.nextElementSibling : NONE')
                         if address_span != "NONE":
-                            print("Address span: ", address_span)
                             address_span_text = await address_span.inner_text()
-                            print("Address text: ", address_span_text)
                         else:
                             address_span_text = ""
 
                         title_str = title_text.replace("Title", "").strip()
+                        logger.debug("Got authorized person %s, %s: %s", title_str, name_text, address_span_text)
                         persons.append({
                             "title": title_str,
                             "name": name_text or "",
@@ -226,111 +589,157 @@ class FloridaBrowserService(metaclass=Singleton):
         return docs
 
 
-    async def search(self, name: str, should_index: Callable[[str], Awaitable[bool]]) -> AsyncIterator[EntityDetail]:
-        if not self.is_ready:
-            raise ValueError("Service is not ready. Await ensure_ready() first")
-        page: Page = await self.__page_pool.get_page(self.BASE_SEARCH_URL)
-        await page.wait_for_selector("input#SearchTerm")
-        await page.locator('input#SearchTerm').fill(name)
-        await page.click('input[type="submit"]')
-        has_next = True
-        while has_next:
-            await page.wait_for_selector("div#search-results table")
-            rows = await page.query_selector_all("div#search-results table tbody tr")
-            queue: asyncio.Queue = asyncio.Queue()
-
-        
-            async def get_details(row: ElementHandle):
-                cells = await row.query_selector_all("td")
-                corp_name_el = await cells[0].query_selector("a")
-                print(corp_name_el)
-                if corp_name_el:
-                    document_number = await cells[1].inner_text()
-                    if not await should_index(document_number):
-                        print("Document already indexed. Skipping...")
-                        await queue.put(None)
-                        return
-                    print("Document not indexed. Proceeding")
-                    status = await cells[2].inner_text()
-                    detail_href = await corp_name_el.get_attribute("href")
-                    detail_url = self.BASE_URL + detail_href
-                    new_page = await self.__page_pool.get_page(detail_url)
-                    await new_page.wait_for_selector("div.searchResultDetail")
-                    entity_type_selector = "div.detailSection.corporationName p:nth-of-type(1)"
-                    entity_name_selector = "div.detailSection.corporationName p:nth-of-type(2)"
-                    entity_type = await new_page.inner_text(entity_type_selector)
-                    entity_name = await new_page.inner_text(entity_name_selector)
-
-                    async def get_labeled_data(label: str) -> Optional[str]:
-                        label_selector = f'label:has-text("{label}")'
-                        label_el = await new_page.query_selector(label_selector)
-                        if not label_el:
-                            return None
-                        span_el = await label_el.evaluate_handle('el => el.nextElementSibling')
-                        if span_el:
-                            data = await span_el.inner_text()
-                            return data.strip()
-                        return None
-                    try:
-                        doc_number = await get_labeled_data("Document Number")
-                        fei_ein_number = await get_labeled_data("FEI/EIN Number")
-                        date_filed = await get_labeled_data("Date Filed")
-                        state = await get_labeled_data("State")
-                        status = await get_labeled_data("Status")
-                        last_event = await get_labeled_data("Last Event")
-                        effective_date = await get_labeled_data("Effective Date Filed")
-
-                        principal_address_data = await FloridaBrowserService.__extract_address_block(new_page, "Principal Address")
-                        mailing_address_data = await FloridaBrowserService.__extract_address_block(new_page, "Mailing Address")
-                        registered_agent_data = await FloridaBrowserService.__extract_registered_agent(new_page)
-                        authorized_persons = await FloridaBrowserService.__extract_authorized_persons(new_page)
-                        annual_reports = await FloridaBrowserService.__extract_annual_reports(new_page)
-                        document_images = await FloridaBrowserService.__extract_document_images(new_page)
-                    
-                        entity_detail = EntityDetail(
-                            entity_type=entity_type,
-                            entity_name=entity_name,
-                            document_number=doc_number,
-                            fe_ein_number=fei_ein_number,
-                            date_filed=date_filed,
-                            effective_date=effective_date,
-                            state=state,
-                            status=status,
-                            last_event=last_event,
-                            **principal_address_data,
-                            **mailing_address_data,
-                            **registered_agent_data,
-                            authorized_persons=authorized_persons,
-                            annual_reports=annual_reports,
-                            document_images=document_images
-                        )
-                    except Exception as e:
-                        print("Error creating entity detail: ", e.with_traceback())
-                        entity_detail = None
-                    await queue.put(entity_detail)
-                    self.__page_pool.return_page(new_page)
-
-            for row in rows:
-                asyncio.create_task(get_details(row))
-
-            for _ in range(len(rows)):
-                entity = await queue.get()
-                yield entity
-                queue.task_done()
-            next = await page.query_selector("a:has-text('Next List')")
-            if next:
-                await next.click()
+    async def extract_entity_detail(page: Page) -> EntityDetail:
+        payload = await page.evaluate(EXTRACT_ENTITY_DETAIL_JS)
+        return EntityDetail(**payload)
+
+
+    async def extract_entity_detail_legacy(page: Page) -> EntityDetail:
+        entity_type_selector = "div.detailSection.corporationName p:nth-of-type(1)"
+        entity_name_selector = "div.detailSection.corporationName p:nth-of-type(2)"
+        entity_type = await page.inner_text(entity_type_selector)
+        entity_name = await page.inner_text(entity_name_selector)
+
+        async def get_labeled_data(label: str) -> Optional[str]:
+            label_selector = f'label:has-text("{label}")'
+            label_el = await page.query_selector(label_selector)
+            if not label_el:
+                return None
+            span_el = await label_el.evaluate_handle('el => el.nextElementSibling')
+            if span_el:
+                data = await span_el.inner_text()
+                return data.strip()
+            return None
+
+        doc_number = await get_labeled_data("Document Number")
+        fei_ein_number = await get_labeled_data("FEI/EIN Number")
+        date_filed = await get_labeled_data("Date Filed")
+        state = await get_labeled_data("State")
+        status = await get_labeled_data("Status")
+        last_event = await get_labeled_data("Last Event")
+        effective_date = await get_labeled_data("Effective Date Filed")
+
+        principal_address_data = await FloridaBrowserService.__extract_address_block(page, "Principal Address")
+        mailing_address_data = await FloridaBrowserService.__extract_address_block(page, "Mailing Address")
+        registered_agent_data = await FloridaBrowserService.__extract_registered_agent(page)
+        authorized_persons = await FloridaBrowserService.__extract_authorized_persons(page)
+        annual_reports = await FloridaBrowserService.__extract_annual_reports(page)
+        document_images = await FloridaBrowserService.__extract_document_images(page)
+
+        return EntityDetail(
+            entity_type=entity_type,
+            entity_name=entity_name,
+            document_number=doc_number,
+            fe_ein_number=fei_ein_number,
+            date_filed=date_filed,
+            effective_date=effective_date,
+            state=state,
+            status=status,
+            last_event=last_event,
+            **principal_address_data,
+            **mailing_address_data,
+            **registered_agent_data,
+            authorized_persons=authorized_persons,
+            annual_reports=annual_reports,
+            document_images=document_images
+        )
+
+
+    async def __goto(self, page: Page, url: str):
+        async with self.__scheduler.request(url) as request:
+            started = asyncio.get_running_loop().time()
+            with GOTO.labels("browser").time():
+                response = await page.goto(url, wait_until='domcontentloaded')
+            self.__traffic.record_navigation(asyncio.get_running_loop().time() - started)
+            request.status = response.status if response else None
+
+
+    async def __snapshot(self, page: Page, kind: str, url: Optional[str] = None):
+        # The serialized DOM; with page scripts off it is the markup as served.
+        if self.__snapshots is not None:
+            await self.__snapshots.record(url or page.url, kind, (await page.content()).encode())
+
+
+    async def result_pages(self, name: str, start_url: Optional[str] = None) -> AsyncIterator[SearchResultsPage]:
+        async with self.__page_pool.page() as page:
+            if start_url:
+                await self.__goto(page, start_url)
+                await page.wait_for_selector("div#search-results table")
             else:
-                has_next = False
-        self.__page_pool.return_page(page)
-    
+                await self.__goto(page, self.BASE_SEARCH_URL)
+                await page.wait_for_selector("input#SearchTerm")
+                await page.locator('input#SearchTerm').fill(name)
+                async with self.__scheduler.request(self.BASE_SEARCH_URL):
+                    await page.click('input[type="submit"]')
+                    await page.wait_for_selector("div#search-results table")
+            first_page = not start_url
+            while True:
+                if first_page:
+                    # Submitted by POST; the term makes the snapshot URL unique.
+                    await self.__snapshot(page, RESULTS, f"{page.url}?{urlencode({'SearchTerm': name})}")
+                    first_page = False
+                else:
+                    await self.__snapshot(page, RESULTS)
+                with EXTRACTION.labels("browser", RESULTS).time():
+                    results = await asyncio.wait_for(page.evaluate(EXTRACT_SEARCH_RESULTS_JS, self.BASE_URL), self.__traffic.profile.extraction_timeout)
+                yield SearchResultsPage(url=page.url, rows=[SearchResultRow(**row) for row in results["rows"]], next_url=results["next_url"])
+                if not results["next_url"]:
+                    break
+                await self.__goto(page, results["next_url"])
+                await page.wait_for_selector("div#search-results table")
+
+
+    async def __extract_detail_page(self, page: Page) -> EntityDetail:
+        # evaluate has no timeout of its own; a hung script must not hold the page.
+        timeout = self.__traffic.profile.extraction_timeout
+        with EXTRACTION.labels("browser", DETAIL).time():
+            if self.__extraction_mode == "legacy":
+                return await asyncio.wait_for(FloridaBrowserService.extract_entity_detail_legacy(page), timeout)
+            return await asyncio.wait_for(FloridaBrowserService.extract_entity_detail(page), timeout)
+
+
+    async def fetch_entity_detail(self, url: str) -> EntityDetail:
+        async with self.__page_pool.page() as page:
+            await self.__goto(page, url)
+            await page.wait_for_selector("div.searchResultDetail")
+            await self.__snapshot(page, DETAIL, url)
+            entity = await self.__extract_detail_page(page)
+            entity.detail_url = url
+            return entity
+
+
+    async def fetch_entity_detail_by_document_number(self, document_number: str) -> EntityDetail:
+        # The lookup answers with the detail page itself or a one-row listing.
+        async with self.__page_pool.page() as page:
+            await self.__goto(page, self.DOCUMENT_NUMBER_SEARCH_URL)
+            await page.wait_for_selector("input#SearchTerm")
+            await page.locator('input#SearchTerm').fill(document_number)
+            async with self.__scheduler.request(self.DOCUMENT_NUMBER_SEARCH_URL):
+                await page.click('input[type="submit"]')
+                await page.wait_for_selector("div.searchResultDetail, div#search-results table")
+            if await page.query_selector("div.searchResultDetail"):
+                await self.__snapshot(page, DETAIL)
+                entity = await self.__extract_detail_page(page)
+                entity.detail_url = page.url
+                return entity
+            results = await asyncio.wait_for(page.evaluate(EXTRACT_SEARCH_RESULTS_JS, self.BASE_URL), self.__traffic.profile.extraction_timeout)
+        for row in results["rows"]:
+            if row["document_number"] == document_number:
+                return await self.fetch_entity_detail(row["detail_url"])
+        raise ValueError(f"Document number not found: {document_number}")
+
 
     async def close(self):
-        await self.__page_pool.close()
-        self.__loop.stop()
-        while self.__loop.is_running():
-            await asyncio.sleep(0.1)
-        self.__loop.close()
+        if self.__autoscaler is not None:
+            await self.__autoscaler.stop()
+            self.__autoscaler = None
+        if self.__page_pool is not None:
+            await self.__page_pool.close()
+            self.__page_pool = None
+        if self.__playwright is not None:
+            await self.__playwright.stop()
+            self.__playwright = None
+        self.is_ready = False
     
 
 
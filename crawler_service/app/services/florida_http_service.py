@@ -0,0 +1,155 @@
+from app.utils.singleton import Singleton
+from app.models.entity import EntityDetail, SearchResultsPage
+from app.services.crawl_scheduler import CrawlScheduler
+from app.services.fetch_retry import RetryPolicy
+from app.services.snapshot_store import SnapshotStore, DETAIL, RESULTS
+from app.services.sunbiz_crawler import SunbizCrawler
+from app.services.sunbiz_parser import parse_entity_detail, parse_search_form, parse_search_results
+from app.utils.metrics import EXTRACTION, GOTO
+from typing import Optional, AsyncIterator
+import httpx
+
+
+class FloridaHttpService(SunbizCrawler, metaclass=Singleton):
+    """
+    Browserless crawler for sunbiz. Pages are fetched over a pooled keep-alive
+    HTTP client and parsed with lxml; `search` has the same contract as
+    FloridaBrowserService.search. With a snapshot store (SNAPSHOT_DIR),
+    every results and detail page is kept as fetched.
+    """
+    BASE_URL = "https://search.sunbiz.org"
+    BASE_SEARCH_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/ByName"
+    DOCUMENT_NUMBER_SEARCH_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/ByDocumentNumber"
+    USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    __client: Optional[httpx.AsyncClient] = None
+
+    def __init__(
+            self,
+            pool_size: int = 10,
+            request_timeout: float = 30.0,
+            connect_timeout: float = 10.0,
+            scheduler: Optional[CrawlScheduler] = None,
+            snapshots: Optional[SnapshotStore] = None,
+            retry_policy: Optional[RetryPolicy] = None):
+        self.__pool_size = pool_size
+        self.__request_timeout = request_timeout
+        self.__connect_timeout = connect_timeout
+        self.__scheduler = scheduler or CrawlScheduler.from_env(timeout_errors=(httpx.TimeoutException,))
+        self.__retry_policy = retry_policy or RetryPolicy.from_env()
+        self.__snapshots = snapshots or SnapshotStore.from_env()
+
+    async def ensure_ready(self):
+        if not self.is_ready:
+            self.__client = httpx.AsyncClient(
+                headers={"User-Agent": self.USER_AGENT},
+                limits=httpx.Limits(max_connections=self.__pool_size, max_keepalive_connections=self.__pool_size),
+                # Waiting for a free pooled connection is expected under load
+                timeout=httpx.Timeout(self.__request_timeout, connect=self.__connect_timeout, pool=None),
+                follow_redirects=True,
+            )
+            self.is_ready = True
+
+
+    @property
+    def scheduler(self) -> CrawlScheduler:
+        return self.__scheduler
+
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self.__retry_policy
+
+
+    def is_transient(self, error: BaseException) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in CrawlScheduler.SLOWDOWN_STATUSES or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError) or super().is_transient(error)
+
+
+    async def __request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.__scheduler.request(url) as request:
+            with GOTO.labels("http").time():
+                response = await self.__client.request(method, url, **kwargs)
+            request.status = response.status_code
+        response.raise_for_status()
+        return response
+
+
+    async def __snapshot(self, url: str, kind: str, response: httpx.Response):
+        if self.__snapshots is not None:
+            await self.__snapshots.record(url, kind, response.content)
+
+
+    @staticmethod
+    def __parse_results(response: httpx.Response) -> SearchResultsPage:
+        with EXTRACTION.labels("http", RESULTS).time():
+            return parse_search_results(response.content, str(response.url))
+
+
+    @staticmethod
+    def __parse_detail(response: httpx.Response) -> EntityDetail:
+        with EXTRACTION.labels("http", DETAIL).time():
+            return parse_entity_detail(response.content, str(response.url))
+
+
+    async def __submit_search(self, search_url: str, term: str) -> httpx.Response:
+        form_response = await self.__request("GET", search_url)
+        action, fields = parse_search_form(form_response.content, str(form_response.url))
+        fields["SearchTerm"] = term
+        return await self.__request("POST", action, data=fields)
+
+
+    async def fetch_search_results(self, name: str) -> SearchResultsPage:
+        response = await self.__submit_search(self.BASE_SEARCH_URL, name)
+        # The first page answers a POST; the term makes its snapshot URL unique.
+        await self.__snapshot(str(response.url.copy_merge_params({"SearchTerm": name})), RESULTS, response)
+        return self.__parse_results(response)
+
+
+    async def fetch_results_page(self, url: str) -> SearchResultsPage:
+        response = await self.__request("GET", url)
+        await self.__snapshot(url, RESULTS, response)
+        return self.__parse_results(response)
+
+
+    async def fetch_entity_detail(self, url: str) -> EntityDetail:
+        response = await self.__request("GET", url)
+        await self.__snapshot(url, DETAIL, response)
+        entity = self.__parse_detail(response)
+        entity.detail_url = url
+        return entity
+
+
+    async def fetch_entity_detail_by_document_number(self, document_number: str) -> EntityDetail:
+        # The lookup answers with the detail page itself or a one-row listing.
+        response = await self.__submit_search(self.DOCUMENT_NUMBER_SEARCH_URL, document_number)
+        try:
+            results_page = self.__parse_results(response)
+        except ValueError:
+            await self.__snapshot(str(response.url), DETAIL, response)
+            entity = self.__parse_detail(response)
+            entity.detail_url = str(response.url)
+            return entity
+        for row in results_page.rows:
+            if row.document_number == document_number:
+                return await self.fetch_entity_detail(row.detail_url)
+        raise ValueError(f"Document number not found: {document_number}")
+
+
+    async def result_pages(self, name: str, start_url: Optional[str] = None) -> AsyncIterator[SearchResultsPage]:
+        # A results page URL is a plain GET, so a resumed search skips the form.
+        if start_url:
+            results_page = await self.fetch_results_page(start_url)
+        else:
+            results_page = await self.fetch_search_results(name)
+        yield results_page
+        while results_page.next_url:
+            results_page = await self.fetch_results_page(results_page.next_url)
+            yield results_page
+
+
+    async def close(self):
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
+        self.is_ready = False
@@ -0,0 +1,56 @@
+from app.models.entity import SearchResultsPage
+from typing import AsyncIterator, List
+
+
+# Sunbiz lists names alphabetically from the search term onwards, so a
+# prefix shard reads pages until the listing moves past the prefix.
+FIRST_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+NEXT_CHARACTERS = " &'-.," + FIRST_CHARACTERS
+
+
+def initial_prefixes() -> List[str]:
+    return list(FIRST_CHARACTERS)
+
+
+class SweepShard:
+    """
+    One prefix of a registry sweep. `pages` narrows a results listing to
+    the rows whose name starts with the prefix and stops once the listing
+    has moved past it. A shard deeper than `max_pages` results pages stops
+    early and reports `too_deep`; its `children` then cover the prefix with
+    one more character each, and rows it already claimed are skipped there.
+    """
+
+    def __init__(self, prefix: str, max_pages: int, pages_crawled: int = 0):
+        self.prefix = prefix.upper()
+        self.max_pages = max_pages
+        self.pages_crawled = pages_crawled
+        self.too_deep = False
+
+
+    def contains(self, entity_name: str) -> bool:
+        return entity_name.upper().startswith(self.prefix)
+
+
+    def is_past(self, entity_name: str) -> bool:
+        return entity_name.upper()[:len(self.prefix)] > self.prefix
+
+
+    def children(self) -> List[str]:
+        characters = NEXT_CHARACTERS
+        if self.prefix.endswith(" "):
+            # Registry names do not repeat spaces.
+            characters = characters.replace(" ", "")
+        return [self.prefix + character for character in characters]
+
+
+    async def pages(self, results_pages: AsyncIterator[SearchResultsPage]) -> AsyncIterator[SearchResultsPage]:
+        async for results_page in results_pages:
+            self.pages_crawled += 1
+            rows = [row for row in results_page.rows if self.contains(row.entity_name)]
+            yield SearchResultsPage(url=results_page.url, rows=rows, next_url=results_page.next_url)
+            if not results_page.rows or self.is_past(results_page.rows[-1].entity_name):
+                return
+            if self.pages_crawled >= self.max_pages and results_page.next_url:
+                self.too_deep = True
+                return
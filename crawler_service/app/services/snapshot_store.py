@@ -0,0 +1,159 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+RESULTS = "results"
+DETAIL = "detail"
+
+
+@dataclass
+class Snapshot:
+    url: str
+    kind: str
+    fetched_at: datetime
+    sha256: str
+    codec: str
+    size: int
+
+    @property
+    def blob_name(self) -> str:
+        return f"{self.sha256[:2]}/{self.sha256}.{self.codec}"
+
+
+class SnapshotStore:
+    """
+    Raw sunbiz pages as fetched, so extraction can be re-run without
+    re-crawling. Blobs are content-addressed (sha256 of the page, so a
+    page that did not change is stored once) and compressed with zstd
+    (zstandard is a requirement; without it blobs fall back to gzip, and
+    zstd blobs cannot be read). index.jsonl records
+    every fetch as URL + fetch time -> blob, one JSON line per fetch.
+
+    Layout under `root`:
+        index.jsonl
+        blobs/ab/ab12...ef.zst
+    """
+
+    def __init__(self, root: str, level: int = 3):
+        self.root = Path(root)
+        self.__blobs = self.root / "blobs"
+        self.__index = self.root / "index.jsonl"
+        self.__codec = "zst" if zstandard is not None else "gz"
+        self.__level = level
+        self.__index_lock = threading.Lock()
+        self.__blobs.mkdir(parents=True, exist_ok=True)
+
+
+    @classmethod
+    def from_env(cls) -> Optional["SnapshotStore"]:
+        # Snapshots are off unless a directory is configured.
+        root = os.getenv("SNAPSHOT_DIR")
+        if not root:
+            return None
+        return cls(root, level=int(os.getenv("SNAPSHOT_ZSTD_LEVEL", "3")))
+
+
+    def __compress(self, content: bytes) -> bytes:
+        if self.__codec == "zst":
+            return zstandard.ZstdCompressor(level=self.__level).compress(content)
+        return gzip.compress(content)
+
+
+    @staticmethod
+    def __decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zst":
+            if zstandard is None:
+                raise RuntimeError("Reading zstd snapshots needs the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+
+    def put(self, url: str, kind: str, content: bytes, fetched_at: Optional[datetime] = None) -> Snapshot:
+        sha256 = hashlib.sha256(content).hexdigest()
+        snapshot = Snapshot(
+            url=url,
+            kind=kind,
+            fetched_at=fetched_at or datetime.now(timezone.utc),
+            sha256=sha256,
+            codec=self.__codec,
+            size=len(content),
+        )
+        path = self.__blobs / snapshot.blob_name
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # Written aside and renamed, so a blob is never seen half written.
+            partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            partial.write_bytes(self.__compress(content))
+            os.replace(partial, path)
+        entry = {**asdict(snapshot), "fetched_at": snapshot.fetched_at.isoformat()}
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        # One append per line keeps lines whole across worker processes.
+        with self.__index_lock, open(self.__index, "a", encoding="utf-8") as index:
+            index.write(line)
+        return snapshot
+
+
+    async def record(self, url: str, kind: str, content: bytes) -> Snapshot:
+        """`put` off the event loop; the timestamp is taken at the call."""
+        fetched_at = datetime.now(timezone.utc)
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, url, kind, content, fetched_at)
+
+
+    def read(self, snapshot: Snapshot) -> bytes:
+        return self.__decompress(snapshot.codec, (self.__blobs / snapshot.blob_name).read_bytes())
+
+
+    def blob_path(self, snapshot: Snapshot) -> Path:
+        return self.__blobs / snapshot.blob_name
+
+
+    def entries(self, kind: Optional[str] = None, since: Optional[datetime] = None) -> Iterator[Snapshot]:
+        """Every recorded fetch in recording order."""
+        if not self.__index.exists():
+            return
+        with open(self.__index, encoding="utf-8") as index:
+            for line in index:
+                if not line.endswith("\n"):
+                    # A writer is still appending this line.
+                    break
+                entry = json.loads(line)
+                snapshot = Snapshot(**{**entry, "fetched_at": datetime.fromisoformat(entry["fetched_at"])})
+                if kind is not None and snapshot.kind != kind:
+                    continue
+                if since is not None and snapshot.fetched_at < since:
+                    continue
+                yield snapshot
+
+
+    def latest(self, kind: Optional[str] = None, since: Optional[datetime] = None) -> Dict[str, Snapshot]:
+        """The most recent fetch of every URL; a stable fixture set for tests and benchmarks."""
+        latest: Dict[str, Snapshot] = {}
+        for snapshot in self.entries(kind, since):
+            current = latest.get(snapshot.url)
+            if current is None or snapshot.fetched_at >= current.fetched_at:
+                latest[snapshot.url] = snapshot
+        return latest
+
+
+    def find(self, url: str, at: Optional[datetime] = None) -> Optional[Snapshot]:
+        """The fetch of `url` that was current at `at` (default: the latest one)."""
+        found = None
+        for snapshot in self.entries():
+            if snapshot.url != url or (at is not None and snapshot.fetched_at > at):
+                continue
+            if found is None or snapshot.fetched_at >= found.fetched_at:
+                found = snapshot
+        return found
@@ -0,0 +1,168 @@
+from app.models.entity import EntityDetail, RefreshCandidate, SearchResultRow, SearchResultsPage, content_hash
+from app.services.crawl_coordinator import CrawlCoordinator
+from app.services.crawl_progress import CrawlProgress
+from app.services.crawl_scheduler import CrawlScheduler
+from app.services.fetch_retry import FetchFailed, RetryPolicy
+from app.services.entity_refresh import RefreshProgress
+from app.utils.logger import get_logger
+from app.utils.metrics import DEDUP_CHECK, entity_span
+from typing import Optional, List, Callable, Awaitable, AsyncIterator
+from abc import ABC, abstractmethod
+import asyncio
+
+
+logger = get_logger(__name__)
+
+
+class SunbizCrawler(ABC):
+    """
+    Search flow shared by the crawler engines. Engines implement the
+    abstract members: the results pages and the detail fetch, and the
+    scheduler and retry policy they run under. Rows are deduplicated
+    against the index one results page at a time before any detail page
+    is opened, and a detail page that another crawl is already fetching
+    is shared through the CrawlCoordinator. Detail fetches are retried
+    under `retry_policy`; engines tell transient errors apart with
+    `is_transient`.
+    """
+    is_ready: bool = False
+
+    @property
+    @abstractmethod
+    def scheduler(self) -> CrawlScheduler:
+        pass
+
+
+    @property
+    def coordinator(self) -> CrawlCoordinator:
+        return CrawlCoordinator.from_env()
+
+
+    @property
+    @abstractmethod
+    def retry_policy(self) -> RetryPolicy:
+        pass
+
+
+    def is_transient(self, error: BaseException) -> bool:
+        return isinstance(error, asyncio.TimeoutError)
+
+
+    async def __fetch(self, document_number: str, fetch: Callable[[], Awaitable[EntityDetail]]) -> EntityDetail:
+        # Retried inside the shared fetch, so coalesced crawls share the retries too.
+        return await self.coordinator.fetch(document_number, lambda: self.retry_policy.call(fetch, self.is_transient))
+
+
+    @abstractmethod
+    def result_pages(self, name: str, start_url: Optional[str] = None) -> AsyncIterator[SearchResultsPage]:
+        pass
+
+
+    @abstractmethod
+    async def fetch_entity_detail(self, url: str) -> EntityDetail:
+        pass
+
+
+    @abstractmethod
+    async def fetch_entity_detail_by_document_number(self, document_number: str) -> EntityDetail:
+        """For entities stored without a detail URL; looks the document number up first."""
+        pass
+
+
+    async def search(
+        self,
+        name: str,
+        filter_not_indexed: Callable[[List[str]], Awaitable[List[str]]],
+        progress: Optional[CrawlProgress] = None,
+        scope: Optional[Callable[[AsyncIterator[SearchResultsPage]], AsyncIterator[SearchResultsPage]]] = None,
+    ) -> AsyncIterator[EntityDetail]:
+        """
+        Yields the entities of every not yet indexed document for `name`.
+        With `progress`, the search resumes from its cursor and skips its
+        processed documents; failed documents are marked done here, while
+        the caller marks a yielded entity done once it has stored it.
+        `scope` may narrow or cut short the results pages, e.g. to a sweep shard.
+        """
+        results_pages = self.result_pages(name, progress.cursor if progress else None)
+        if scope:
+            results_pages = scope(results_pages)
+        async for entity in self.fetch_documents(results_pages, filter_not_indexed, progress):
+            yield entity
+
+
+    async def fetch_documents(
+        self,
+        results_pages: AsyncIterator[SearchResultsPage],
+        filter_not_indexed: Callable[[List[str]], Awaitable[List[str]]],
+        progress: Optional[CrawlProgress] = None,
+    ) -> AsyncIterator[EntityDetail]:
+        """
+        The detail half of `search`, over any source of result rows, e.g.
+        the dead-lettered documents a retry job re-fetches. A document that
+        fails every attempt is dead-lettered through `progress`.
+        """
+        if not self.is_ready:
+            raise ValueError("Service is not ready. Await ensure_ready() first")
+
+        async def unindexed_rows() -> AsyncIterator[List[SearchResultRow]]:
+            async for results_page in results_pages:
+                by_document_number = {row.document_number: row for row in results_page.rows if not progress or row.document_number not in progress}
+                with DEDUP_CHECK.time():
+                    not_indexed = set(await filter_not_indexed(list(by_document_number)))
+                logger.debug("%d of %d documents on results page not indexed", len(not_indexed), len(by_document_number))
+                if progress:
+                    progress.page_started(results_page, not_indexed)
+                yield [row for document_number, row in by_document_number.items() if document_number in not_indexed]
+
+        async def get_details(row: SearchResultRow) -> Optional[EntityDetail]:
+            try:
+                with entity_span("crawl_entity", document_number=row.document_number, detail_url=row.detail_url):
+                    return await self.__fetch(row.document_number, lambda: self.fetch_entity_detail(row.detail_url))
+            except Exception as e:
+                logger.warning("Error creating entity detail for %s: %r", row.document_number, e)
+                if progress:
+                    if isinstance(e, FetchFailed):
+                        progress.document_failed(row.document_number, row.detail_url, repr(e.__cause__), e.attempts)
+                    else:
+                        progress.document_failed(row.document_number, row.detail_url, repr(e), 1)
+                return None
+
+        async for entity in self.scheduler.crawl(unindexed_rows(), get_details):
+            if entity:
+                yield entity
+
+
+    async def refresh(self, batches: AsyncIterator[List[RefreshCandidate]], progress: RefreshProgress) -> AsyncIterator[EntityDetail]:
+        """
+        Re-fetches stored entities and yields only those whose content hash
+        changed. Unchanged and failed candidates are marked done here; the
+        caller marks a yielded entity done once it has stored it.
+        """
+        if not self.is_ready:
+            raise ValueError("Service is not ready. Await ensure_ready() first")
+
+        async def started_batches() -> AsyncIterator[List[RefreshCandidate]]:
+            async for batch in batches:
+                progress.batch_started(batch)
+                yield batch
+
+        async def get_changed_details(candidate: RefreshCandidate) -> Optional[EntityDetail]:
+            try:
+                with entity_span("refresh_entity", document_number=candidate.document_number, detail_url=candidate.detail_url):
+                    if candidate.detail_url:
+                        fetch = lambda: self.fetch_entity_detail(candidate.detail_url)
+                    else:
+                        fetch = lambda: self.fetch_entity_detail_by_document_number(candidate.document_number)
+                    entity = await self.__fetch(candidate.document_number, fetch)
+            except Exception as e:
+                logger.warning("Error refreshing %s: %r", candidate.document_number, e)
+                progress.document_done(candidate.document_number, failed=True)
+                return None
+            if content_hash(entity) == candidate.content_hash:
+                progress.document_done(candidate.document_number)
+                return None
+            return entity
+
+        async for entity in self.scheduler.crawl(started_batches(), get_changed_details):
+            if entity:
+                yield entity
@@ -0,0 +1,296 @@
+"""
+lxml parsers for the server-rendered sunbiz pages.
+
+`parse_entity_detail` is the offline twin of EXTRACT_ENTITY_DETAIL_JS: same
+selectors, same heading/label matching and an innerText approximation, so the
+HTTP and browser engines build identical EntityDetail objects.
+"""
+from lxml import html as lxml_html
+from lxml.html import HtmlElement
+from app.models.entity import EntityDetail, SearchResultRow, SearchResultsPage
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+import re
+
+
+_BLOCK_TAGS = {
+    "address", "article", "blockquote", "center", "dd", "div", "dl", "dt", "fieldset", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav",
+    "ol", "p", "section", "table", "tbody", "thead", "tfoot", "tr", "ul",
+}
+_HIDDEN_TAGS = {"script", "style", "noscript", "template", "head"}
+_LINE_BREAK = "\n"
+_BLOCK_BREAK = "\x00"
+_COLLAPSIBLE = re.compile(r"[ \t\n\r\f]+")
+
+
+def _class_xpath(*classes: str) -> str:
+    return " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in classes)
+
+
+_DETAIL_SECTIONS = f"//div[{_class_xpath('detailSection')}]"
+_CORPORATION_NAME = f"//div[{_class_xpath('detailSection', 'corporationName')}]//p[count(preceding-sibling::p) = {{index}}]"
+
+
+def _is_element(node) -> bool:
+    return isinstance(node, HtmlElement) and isinstance(node.tag, str)
+
+
+def _inner_text(el: Optional[HtmlElement]) -> str:
+    """Approximates HTMLElement.innerText for unstyled server-rendered markup."""
+    if el is None:
+        return ""
+    parts: List[str] = []
+
+    def walk(node: HtmlElement):
+        tag = node.tag if isinstance(node.tag, str) else None
+        if tag is None or tag in _HIDDEN_TAGS:
+            return
+        if tag == "br":
+            parts.append(_LINE_BREAK)
+            return
+        is_block = tag in _BLOCK_TAGS
+        if is_block:
+            parts.append(_BLOCK_BREAK)
+        if node.text:
+            parts.append(_COLLAPSIBLE.sub(" ", node.text))
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(_COLLAPSIBLE.sub(" ", child.tail))
+        if is_block:
+            parts.append(_BLOCK_BREAK)
+
+    walk(el)
+    text = "".join(parts)
+    # Consecutive block boundaries collapse into a single line break, and
+    # collapsible spaces next to any line break disappear.
+    text = re.sub(f"{_BLOCK_BREAK}+", _BLOCK_BREAK, text)
+    text = re.sub(f" *([{_BLOCK_BREAK}{_LINE_BREAK}]) *", r"\1", text)
+    text = re.sub(f"(?<=\\n){_BLOCK_BREAK}|{_BLOCK_BREAK}(?=\\n)", "", text)
+    text = text.strip(_BLOCK_BREAK).replace(_BLOCK_BREAK, _LINE_BREAK)
+    return re.sub(r"^ +| +$", "", text)
+
+
+def _trimmed(el: Optional[HtmlElement]) -> str:
+    return _inner_text(el).strip()
+
+
+def _has_text(el: HtmlElement, needle: str) -> bool:
+    return needle.lower() in _COLLAPSIBLE.sub(" ", el.text_content()).lower()
+
+
+def _first_span_with(root: HtmlElement, needle: str) -> Optional[HtmlElement]:
+    return next((span for span in root.iter("span") if _has_text(span, needle)), None)
+
+
+def _next_element(el: HtmlElement) -> Optional[HtmlElement]:
+    sibling = el.getnext()
+    while sibling is not None and not _is_element(sibling):
+        sibling = sibling.getnext()
+    return sibling
+
+
+def _sibling_nodes(el: HtmlElement) -> List[Union[str, HtmlElement]]:
+    """The DOM childNodes of el's parent: elements interleaved with text nodes."""
+    parent = el.getparent()
+    nodes: List[Union[str, HtmlElement]] = [parent.text] if parent.text else []
+    for child in parent:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
+    return nodes
+
+
+def _node_value(node: Union[str, HtmlElement, None]) -> Optional[str]:
+    if isinstance(node, str):
+        return node
+    if node is not None and not _is_element(node):
+        return node.text
+    return None
+
+
+class _DetailPage:
+    def __init__(self, document: HtmlElement, url: str):
+        self.__document = document
+        self.__url = url
+        self.__sections: List[Tuple[HtmlElement, Optional[str]]] = []
+        for section in document.xpath(_DETAIL_SECTIONS):
+            heading = next(section.iter("span"), None)
+            self.__sections.append((section, _trimmed(heading) if heading is not None else None))
+        self.__labels = list(document.iter("label"))
+
+
+    def __find_section(self, matches) -> Optional[HtmlElement]:
+        for section, heading in self.__sections:
+            if heading is not None and matches(heading):
+                return section
+        return None
+
+
+    def __labeled(self, label: str) -> Optional[str]:
+        el = next((candidate for candidate in self.__labels if _has_text(candidate, label)), None)
+        if el is None:
+            return None
+        sibling = _next_element(el)
+        return _trimmed(sibling) if sibling is not None else None
+
+
+    @staticmethod
+    def __changed_date(section: HtmlElement, prefix: str) -> Optional[str]:
+        span = _first_span_with(section, prefix)
+        return _inner_text(span).replace(prefix, "").strip() if span is not None else None
+
+
+    def __address_block(self, title: str) -> Dict[str, Optional[str]]:
+        key = title.lower().replace(" ", "_")
+        result = {key: None, f"{key}_changed": None}
+        section = self.__find_section(lambda heading: heading == title)
+        if section is not None:
+            spans = list(section.iter("span"))
+            if len(spans) > 1:
+                result[key] = _trimmed(spans[1])
+            result[f"{key}_changed"] = self.__changed_date(section, "Changed:")
+        return result
+
+
+    def __registered_agent(self) -> Dict[str, Optional[str]]:
+        result = {
+            "registered_agent_name": None,
+            "registered_agent_address": None,
+            "registered_agent_address_changed": None,
+            "registered_agent_name_changed": None,
+        }
+        section = self.__find_section(lambda heading: "Registered Agent Name & Address" in heading)
+        if section is not None:
+            spans = list(section.iter("span"))
+            if len(spans) > 2:
+                result["registered_agent_name"] = _trimmed(spans[1])
+                result["registered_agent_address"] = _trimmed(spans[2])
+            result["registered_agent_name_changed"] = self.__changed_date(section, "Name Changed:")
+            result["registered_agent_address_changed"] = self.__changed_date(section, "Address Changed:")
+        return result
+
+
+    def __authorized_persons(self) -> List[Dict[str, str]]:
+        section = self.__find_section(
+            lambda heading: "Authorized Person(s) Detail" in heading or "Officer/Director Detail" in heading)
+        if section is None:
+            return []
+        persons = []
+        for span in section.iter("span"):
+            if not _has_text(span, "Title"):
+                continue
+            siblings = _sibling_nodes(span)
+            position = next(i for i, node in enumerate(siblings) if node is span)
+            name_node = siblings[position + 3] if position + 3 < len(siblings) else None
+            address_el = span
+            for _ in range(3):
+                address_el = _next_element(address_el) if address_el is not None else None
+            persons.append({
+                "title": _inner_text(span).replace("Title", "").strip(),
+                "name": _node_value(name_node) or "",
+                "address": _trimmed(address_el) if address_el is not None and address_el.tag == "span" else "",
+            })
+        return persons
+
+
+    def __table_rows(self, heading: str) -> List[HtmlElement]:
+        section = self.__find_section(lambda text: heading in text)
+        table = next(section.iter("table"), None) if section is not None else None
+        return list(table.iter("tr")) if table is not None else []
+
+
+    def __annual_reports(self) -> List[Dict[str, str]]:
+        reports = []
+        for row in self.__table_rows("Annual Reports")[1:]:
+            cols = list(row.iter("td"))
+            if len(cols) == 2:
+                reports.append({"year": _trimmed(cols[0]), "filed_date": _trimmed(cols[1])})
+        return reports
+
+
+    def __document_images(self) -> List[Dict[str, str]]:
+        base = self.__url.rsplit("/", 1)[0]
+        docs = []
+        for row in self.__table_rows("Document Images"):
+            td = next(row.iter("td"), None)
+            link = next(td.iter("a"), None) if td is not None else None
+            if link is not None:
+                docs.append({
+                    "title": _trimmed(link),
+                    "link": base + "/" + (link.get("href") or "").lstrip("/"),
+                })
+        return docs
+
+
+    def __corporation_name(self, index: int) -> Optional[str]:
+        matches = self.__document.xpath(_CORPORATION_NAME.format(index=index))
+        return _inner_text(matches[0]) if matches else None
+
+
+    def to_entity_detail(self) -> EntityDetail:
+        return EntityDetail(
+            entity_type=self.__corporation_name(0),
+            entity_name=self.__corporation_name(1),
+            document_number=self.__labeled("Document Number"),
+            fe_ein_number=self.__labeled("FEI/EIN Number"),
+            date_filed=self.__labeled("Date Filed"),
+            effective_date=self.__labeled("Effective Date Filed"),
+            state=self.__labeled("State"),
+            status=self.__labeled("Status"),
+            last_event=self.__labeled("Last Event"),
+            **self.__address_block("Principal Address"),
+            **self.__address_block("Mailing Address"),
+            **self.__registered_agent(),
+            authorized_persons=self.__authorized_persons(),
+            annual_reports=self.__annual_reports(),
+            document_images=self.__document_images(),
+        )
+
+
+def parse_entity_detail(content: Union[str, bytes], url: str) -> EntityDetail:
+    document = lxml_html.fromstring(content)
+    if not document.xpath(f"//div[{_class_xpath('searchResultDetail')}]"):
+        raise ValueError(f"Not an entity detail page: {url}")
+    return _DetailPage(document, url).to_entity_detail()
+
+
+def parse_search_form(content: Union[str, bytes], url: str) -> Tuple[str, Dict[str, str]]:
+    """Returns the action URL and default fields of the form holding input#SearchTerm."""
+    document = lxml_html.fromstring(content)
+    inputs = document.xpath("//input[@id='SearchTerm']")
+    if not inputs:
+        raise ValueError(f"Search form not found: {url}")
+    form = next(inputs[0].iterancestors("form"))
+    fields = {
+        field.get("name"): field.get("value") or ""
+        for field in form.iter("input")
+        if field.get("name") and field.get("type", "text").lower() not in ("submit", "button", "image")
+    }
+    return urljoin(url, form.get("action") or url), fields
+
+
+def parse_search_results(content: Union[str, bytes], url: str) -> SearchResultsPage:
+    document = lxml_html.fromstring(content)
+    tables = document.xpath("//div[@id='search-results']//table")
+    if not tables:
+        raise ValueError(f"Not a search results page: {url}")
+    page = SearchResultsPage(url=url)
+    for row in tables[0].iter("tr"):
+        if any(ancestor.tag == "thead" for ancestor in row.iterancestors()):
+            continue
+        cells = list(row.iter("td"))
+        link = next(cells[0].iter("a"), None) if cells else None
+        if link is None or len(cells) < 3:
+            continue
+        page.rows.append(SearchResultRow(
+            entity_name=_trimmed(link),
+            document_number=_inner_text(cells[1]),
+            status=_inner_text(cells[2]),
+            detail_url=urljoin(url, link.get("href")),
+        ))
+    next_link = next((link for link in document.iter("a") if _has_text(link, "Next List")), None)
+    if next_link is not None and next_link.get("href"):
+        page.next_url = urljoin(url, next_link.get("href"))
+    return page
@@ -0,0 +1,165 @@
+# Walks a sunbiz detail page once and returns the keyword arguments of
+# EntityDetail. It mirrors the per-field extractors in FloridaBrowserService
+# (same selectors, same innerText / strip rules) so that both paths produce
+# identical entities, but costs a single CDP round trip per page.
+EXTRACT_ENTITY_DETAIL_JS = r"""
+() => {
+    const text = (el) => (el ? el.innerText : "");
+    const trimmed = (el) => text(el).trim();
+    // Playwright's :has-text() - case-insensitive substring over normalized text.
+    const hasText = (el, needle) =>
+        (el.textContent || "").replace(/\s+/g, " ").toLowerCase().includes(needle.toLowerCase());
+    const firstSpanWith = (root, needle) =>
+        Array.from(root.querySelectorAll("span")).find((span) => hasText(span, needle)) || null;
+
+    const sections = Array.from(document.querySelectorAll("div.detailSection")).map((section) => {
+        const heading = section.querySelector("span");
+        return { section, heading: heading ? trimmed(heading) : null };
+    });
+    const findSection = (matches) => {
+        const found = sections.find(({ heading }) => heading !== null && matches(heading));
+        return found ? found.section : null;
+    };
+
+    const labels = Array.from(document.querySelectorAll("label"));
+    const labeled = (label) => {
+        const el = labels.find((candidate) => hasText(candidate, label));
+        if (!el || !el.nextElementSibling) {
+            return null;
+        }
+        return trimmed(el.nextElementSibling);
+    };
+
+    const changedDate = (section, prefix) => {
+        const span = firstSpanWith(section, prefix);
+        return span ? text(span).split(prefix).join("").trim() : null;
+    };
+
+    const addressBlock = (title) => {
+        const key = title.toLowerCase().split(" ").join("_");
+        const result = { [key]: null, [key + "_changed"]: null };
+        const section = findSection((heading) => heading === title);
+        if (section) {
+            const spans = section.querySelectorAll("span");
+            if (spans.length > 1) {
+                result[key] = trimmed(spans[1]);
+            }
+            result[key + "_changed"] = changedDate(section, "Changed:");
+        }
+        return result;
+    };
+
+    const registeredAgent = () => {
+        const result = {
+            registered_agent_name: null,
+            registered_agent_address: null,
+            registered_agent_address_changed: null,
+            registered_agent_name_changed: null,
+        };
+        const section = findSection((heading) => heading.includes("Registered Agent Name & Address"));
+        if (section) {
+            const spans = section.querySelectorAll("span");
+            if (spans.length > 2) {
+                result.registered_agent_name = trimmed(spans[1]);
+                result.registered_agent_address = trimmed(spans[2]);
+            }
+            result.registered_agent_name_changed = changedDate(section, "Name Changed:");
+            result.registered_agent_address_changed = changedDate(section, "Address Changed:");
+        }
+        return result;
+    };
+
+    const authorizedPersons = () => {
+        const section = findSection((heading) =>
+            heading.includes("Authorized Person(s) Detail") || heading.includes("Officer/Director Detail"));
+        if (!section) {
+            return [];
+        }
+        return Array.from(section.querySelectorAll("span"))
+            .filter((span) => hasText(span, "Title"))
+            .map((span) => {
+                const nameNode = span.nextSibling && span.nextSibling.nextSibling && span.nextSibling.nextSibling.nextSibling;
+                let addressEl = span.nextElementSibling;
+                for (let i = 0; i < 2 && addressEl; i++) {
+                    addressEl = addressEl.nextElementSibling;
+                }
+                return {
+                    title: text(span).split("Title").join("").trim(),
+                    name: (nameNode && nameNode.nodeValue) || "",
+                    address: addressEl && addressEl.tagName === "SPAN" ? trimmed(addressEl) : "",
+                };
+            });
+    };
+
+    const tableRows = (heading) => {
+        const section = findSection((text) => text.includes(heading));
+        const table = section ? section.querySelector("table") : null;
+        return table ? Array.from(table.querySelectorAll("tr")) : [];
+    };
+
+    const annualReports = () => tableRows("Annual Reports")
+        .slice(1)
+        .map((row) => row.querySelectorAll("td"))
+        .filter((cols) => cols.length === 2)
+        .map((cols) => ({ year: trimmed(cols[0]), filed_date: trimmed(cols[1]) }));
+
+    const documentImages = () => {
+        const base = window.location.href.slice(0, window.location.href.lastIndexOf("/"));
+        return tableRows("Document Images")
+            .map((row) => row.querySelector("td"))
+            .map((td) => (td ? td.querySelector("a") : null))
+            .filter((link) => link !== null)
+            .map((link) => ({
+                title: trimmed(link),
+                link: base + "/" + (link.getAttribute("href") || "").replace(/^\/+/, ""),
+            }));
+    };
+
+    const corporationName = (n) => {
+        const el = document.querySelector(`div.detailSection.corporationName p:nth-of-type(${n})`);
+        return el ? el.innerText : null;
+    };
+
+    return {
+        entity_type: corporationName(1),
+        entity_name: corporationName(2),
+        document_number: labeled("Document Number"),
+        fe_ein_number: labeled("FEI/EIN Number"),
+        date_filed: labeled("Date Filed"),
+        effective_date: labeled("Effective Date Filed"),
+        state: labeled("State"),
+        status: labeled("Status"),
+        last_event: labeled("Last Event"),
+        ...addressBlock("Principal Address"),
+        ...addressBlock("Mailing Address"),
+        ...registeredAgent(),
+        authorized_persons: authorizedPersons(),
+        annual_reports: annualReports(),
+        document_images: documentImages(),
+    };
+}
+"""
+
+
+
+# Reads the rows of a search results page together with the "Next List" URL,
+# so pagination can continue by URL while the rows are crawled elsewhere.
+EXTRACT_SEARCH_RESULTS_JS = r"""
+(baseUrl) => {
+    const rows = Array.from(document.querySelectorAll("div#search-results table tbody tr"))
+        .map((row) => row.querySelectorAll("td"))
+        .filter((cells) => cells.length >= 3 && cells[0].querySelector("a"))
+        .map((cells) => {
+            const link = cells[0].querySelector("a");
+            return {
+                entity_name: link.innerText.trim(),
+                document_number: cells[1].innerText,
+                status: cells[2].innerText,
+                detail_url: baseUrl + link.getAttribute("href"),
+            };
+        });
+    const next = Array.from(document.querySelectorAll("a"))
+        .find((link) => (link.textContent || "").replace(/\s+/g, " ").toLowerCase().includes("next list"));
+    return { rows, next_url: next && next.getAttribute("href") ? next.href : null };
+}
+"""
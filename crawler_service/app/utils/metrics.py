@@ -0,0 +1,72 @@
+"""
+Prometheus metrics of the crawl pipeline, served by GET /metrics.
+
+Crawl workers started by worker.py run in their own processes. Set
+PROMETHEUS_MULTIPROC_DIR (in the environment, before start) to a directory
+shared by the API and the workers, and /metrics reports all of them.
+"""
+from contextlib import nullcontext
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess, start_http_server
+from typing import Tuple
+import os
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+
+# Extraction and dedup checks take milliseconds, not seconds.
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PAGE_POOL_WAIT = Histogram("crawler_page_pool_wait_seconds", "Time to check a page out of the browser page pool")
+PAGE_POOL_IN_USE = Gauge("crawler_page_pool_in_use", "Browser pages checked out", multiprocess_mode="livesum")
+PAGE_POOL_MAX_PAGES = Gauge("crawler_page_pool_max_pages", "Browser pages the page pool may open", multiprocess_mode="livesum")
+BROWSER_PROCESSES = Gauge("crawler_browser_processes", "Chromium processes serving the page pool, retiring ones included", multiprocess_mode="livesum")
+BROWSER_RSS = Gauge("crawler_browser_rss_bytes", "Resident memory of the Chromium processes", multiprocess_mode="livesum")
+BROWSERS_RECYCLED = Counter("crawler_browsers_recycled", "Chromium processes retired after their page budget or for memory", ["reason"])
+GOTO = Histogram("crawler_goto_seconds", "Time to load a sunbiz page", ["engine"])
+EXTRACTION = Histogram("crawler_extraction_seconds", "Time to extract a loaded page", ["engine", "page"], buckets=FAST_BUCKETS)
+DEDUP_CHECK = Histogram("crawler_dedup_check_seconds", "Time to filter a results page down to unindexed documents", buckets=FAST_BUCKETS)
+INSERT = Histogram("crawler_insert_seconds", "Time to write entities to entity_details", ["operation"])
+ACTIVE_CRAWLS = Gauge("crawler_active_crawls", "Crawl jobs being processed", ["kind"], multiprocess_mode="livesum")
+COALESCED_FETCHES = Counter("crawler_coalesced_fetches", "Detail fetches served by another crawl's fetch of the same document")
+FETCH_RETRIES = Counter("crawler_fetch_retries", "Detail fetches retried after a transient error")
+DEAD_LETTERS = Counter("crawler_dead_letters", "Documents that failed every fetch attempt and were dead-lettered")
+CIRCUIT_OPENED = Counter("crawler_circuit_opened", "Times a host's circuit breaker opened and paused its requests", ["host"])
+
+_tracer = trace.get_tracer("app.crawler") if trace is not None else None
+
+
+def entity_span(name: str, **attributes):
+    """
+    An OpenTelemetry span around one entity's fetch, when opentelemetry-api
+    is installed; otherwise (and without a configured SDK) a no-op.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value is not None})
+
+
+def _registry() -> CollectorRegistry:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The exposition body and its content type, across processes in multiprocess mode."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def serve_metrics(port: int):
+    """Serves /metrics from a background thread, for processes without the API."""
+    start_http_server(port, registry=_registry())
+
+
+def process_exited(pid: int):
+    """Drops a finished worker process's live gauges in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
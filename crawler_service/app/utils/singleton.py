@@ -1,5 +1,8 @@
+from abc import ABCMeta
 
-class Singleton(type):
+
+# An ABCMeta, so singletons may implement abstract base classes.
+class Singleton(ABCMeta):
     _instances = {}
     def __call__(cls, *args, **kwargs):
         if cls not in cls._instances:
@@ -0,0 +1,371 @@
+"""
+Offline crawl benchmark suite. Runs against a local sunbiz stand-in and a
+disposable Postgres, so nothing reaches search.sunbiz.org.
+
+Usage (from crawler_service/):
+    python -m benchmarks.crawl_suite [--engine browser|http] [--output results.json] [--baseline previous.json]
+        [--database-url postgresql://postgres@localhost/postgres] [--snapshot-dir DIR]
+        [--latency 0.02] [--results-pages 5] [--rows-per-page 20] [--requests-per-second 1000]
+        [--outage-error-rate 0.2]
+
+Benchmarks:
+    page_pool     checkout latency of the Playwright page pool under contention
+    extraction    per-entity detail extraction time, lxml and Playwright
+    end_to_end    entities/s through engine.search with IEntityDao.insert per
+                  entity, and with the buffered EntityWriter the workers use;
+                  "outage" repeats the writer run while --outage-error-rate of
+                  detail requests fail, to show what retries keep
+    memory        peak RSS of this process and of its children (Chromium)
+
+Without --database-url a throwaway cluster is created with initdb (see
+benchmarks/local_postgres.py); with it, a scratch database is created on
+that server. Benchmarks that need Chromium are reported as skipped when it
+cannot be launched. Results are written as JSON; with --baseline, every
+number is also printed next to the baseline's with its change.
+"""
+from playwright.async_api import async_playwright
+from app.db import DB
+from app.services.crawl_scheduler import CrawlScheduler
+from app.services.fetch_retry import RetryPolicy
+from app.services.florida_browser_service import FloridaBrowserService, _PagePool
+from app.services.florida_http_service import FloridaHttpService
+from app.services.browser_profile import BrowserProfile, BrowserTraffic
+from app.services.snapshot_store import SnapshotStore, DETAIL
+from app.services.sunbiz_parser import parse_entity_detail
+from benchmarks.local_postgres import LocalPostgres
+from benchmarks.sunbiz_standin import SunbizStandIn, DETAIL_PATH, DOCUMENT_NUMBER_SEARCH_PATH, SEARCH_PATH, synthetic_rows
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class ChildRssSampler:
+    """Samples the summed RSS of all child processes; needs psutil."""
+
+    def __init__(self, interval: float = 0.1):
+        self.__interval = interval
+        self.__task: Optional[asyncio.Task] = None
+        self.peak = 0
+
+
+    def start(self):
+        if psutil is not None:
+            self.__task = asyncio.create_task(self.__sample())
+
+
+    async def __sample(self):
+        me = psutil.Process()
+        while True:
+            total = 0
+            for child in me.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total)
+            await asyncio.sleep(self.__interval)
+
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+
+def detail_fixtures(standin: SunbizStandIn, snapshots: Optional[SnapshotStore], count: int) -> List[Tuple[str, bytes]]:
+    """(url, content) of detail pages: recorded ones, or synthetic ones from the stand-in."""
+    if snapshots is not None:
+        latest = sorted(snapshots.latest(DETAIL).values(), key=lambda snapshot: snapshot.url)[:count]
+        return [(snapshot.url, snapshots.read(snapshot)) for snapshot in latest]
+    fixtures = []
+    with httpx.Client() as client:
+        for page in range(count // standin.rows_per_page + 1):
+            for name, document_number, _ in synthetic_rows("fixture", page, standin.rows_per_page):
+                if len(fixtures) == count:
+                    return fixtures
+                url = standin.url(f"{DETAIL_PATH}?{urlencode({'document_number': document_number, 'name': name})}")
+                fixtures.append((url, client.get(url).content))
+    return fixtures
+
+
+def bench_lxml_extraction(fixtures: List[Tuple[str, bytes]], repeat: int) -> Dict[str, float]:
+    per_page = []
+    for url, content in fixtures:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parse_entity_detail(content, url)
+            timings.append(time.perf_counter() - started)
+        per_page.append(statistics.median(timings))
+    return summarize(per_page)
+
+
+async def launch_browser():
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch(headless=True)
+    except BaseException:
+        await playwright.stop()
+        raise
+    return playwright, browser
+
+
+async def bench_browser_extraction(browser, fixtures: List[Tuple[str, bytes]], repeat: int) -> Dict[str, float]:
+    page = await browser.new_page()
+    per_page = []
+    for url, content in fixtures:
+        await page.set_content(content.decode("utf-8", errors="replace"))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await FloridaBrowserService.extract_entity_detail(page)
+            timings.append(time.perf_counter() - started)
+        per_page.append(statistics.median(timings))
+    await page.close()
+    return summarize(per_page)
+
+
+async def bench_page_pool(browser, pool_size: int, concurrency: int, checkouts: int, hold: float) -> Dict[str, float]:
+    """`concurrency` tasks share a pool of `pool_size` pages, each holding a page `hold` seconds per checkout."""
+    traffic = BrowserTraffic(BrowserProfile.from_env())
+    context = await traffic.open(browser)
+    pool = _PagePool(pool_size, page_factory=context.new_page, on_close=traffic.close, max_uses=checkouts + 1)
+    timings = []
+    remaining = checkouts
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            page = await pool.acquire()
+            timings.append(time.perf_counter() - started)
+            await asyncio.sleep(hold)
+            pool.return_page(page)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = pool.stats
+    await pool.close()
+    return {
+        **summarize(timings),
+        "pool_size": pool_size,
+        "concurrency": concurrency,
+        "hold_ms": hold * 1000,
+        "pages_created": stats.page_count,
+        "checkouts_per_second": len(timings) / elapsed,
+    }
+
+
+async def bench_end_to_end(engine, db: DB, standin: SunbizStandIn, term: str, use_writer: bool) -> Dict[str, float]:
+    entity_dao = db.entity_dao
+    writer = db.entity_writer
+    requests_before = standin.requests
+    errors_before = standin.errors
+    entities = 0
+    started = time.perf_counter()
+    async for entity in engine.search(term, entity_dao.filter_not_indexed):
+        if use_writer:
+            await writer.add(entity)
+        else:
+            await entity_dao.insert(entity)
+        entities += 1
+    if use_writer:
+        await writer.drain()
+    elapsed = time.perf_counter() - started
+    return {
+        "entities": entities,
+        "seconds": elapsed,
+        "entities_per_second": entities / elapsed if elapsed else 0.0,
+        "requests": standin.requests - requests_before,
+        "errors": standin.errors - errors_before,
+        "documents_listed": standin.results_pages * standin.rows_per_page,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, path: str = ""):
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            compare(value, baseline[key], name)
+        elif isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)) and not isinstance(value, bool):
+            change = (value - baseline[key]) / baseline[key] * 100 if baseline[key] else 0.0
+            print(f"{name:<55} {baseline[key]:>12.3f} {value:>12.3f} {change:>+8.1f}%")
+
+
+async def main(args) -> dict:
+    results = {
+        "run": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "database_url")},
+        },
+    }
+    snapshots = SnapshotStore(args.snapshot_dir) if args.snapshot_dir else None
+    standin = SunbizStandIn(
+        latency=args.latency,
+        results_pages=args.results_pages,
+        rows_per_page=args.rows_per_page,
+        snapshots=snapshots,
+    ).start()
+    sampler = ChildRssSampler()
+    sampler.start()
+    playwright = browser = None
+    browser_skipped = None
+    try:
+        try:
+            playwright, browser = await launch_browser()
+        except Exception as e:
+            reason = str(e).splitlines()[0]
+            print("Chromium unavailable, skipping browser benchmarks: ", reason)
+            browser_skipped = {"skipped": reason}
+
+        if browser is not None:
+            results["page_pool"] = await bench_page_pool(browser, args.pool_size, args.pool_size * 2, args.pool_checkouts, args.pool_hold)
+        else:
+            results["page_pool"] = browser_skipped
+
+        fixtures = detail_fixtures(standin, snapshots, args.extraction_pages)
+        results["extraction"] = {
+            "lxml": bench_lxml_extraction(fixtures, args.extraction_repeat),
+            "browser": await bench_browser_extraction(browser, fixtures, args.extraction_repeat) if browser is not None else browser_skipped,
+        }
+        if browser is not None:
+            await browser.close()
+            await playwright.stop()
+            browser = None
+
+        if args.engine == "browser" and results["page_pool"].get("skipped"):
+            results["end_to_end"] = browser_skipped
+        elif snapshots is not None:
+            # Recorded listings only cover the terms they were recorded for.
+            results["end_to_end"] = {"skipped": "end-to-end runs against synthetic pages only"}
+        else:
+            results["end_to_end"] = await run_end_to_end(args, standin)
+    finally:
+        if browser is not None:
+            await browser.close()
+            await playwright.stop()
+        await sampler.stop()
+        standin.stop()
+
+    results["memory"] = {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_children_rss_mb": sampler.peak / 1024 / 1024 if psutil is not None else None,
+    }
+    return results
+
+
+async def run_end_to_end(args, standin: SunbizStandIn) -> dict:
+    scheduler = CrawlScheduler(
+        max_concurrency=args.concurrency,
+        per_host_concurrency=args.concurrency,
+        requests_per_second=args.requests_per_second,
+        burst=args.concurrency,
+    )
+    engine_class = FloridaBrowserService if args.engine == "browser" else FloridaHttpService
+    engine_class.BASE_URL = standin.base_url
+    engine_class.BASE_SEARCH_URL = standin.url(SEARCH_PATH)
+    engine_class.DOCUMENT_NUMBER_SEARCH_URL = standin.url(DOCUMENT_NUMBER_SEARCH_PATH)
+    # Short backoff, so the outage run measures retries rather than sleeping.
+    retry_policy = RetryPolicy(attempts=args.fetch_attempts, base_delay=0.05, max_delay=0.5)
+    engine = engine_class(pool_size=args.pool_size, scheduler=scheduler, retry_policy=retry_policy)
+    results = {"engine": args.engine}
+    with LocalPostgres(args.database_url) as postgres:
+        db = DB()
+        await db.connect(postgres.url)
+        await engine.ensure_ready()
+        try:
+            # Distinct terms list distinct documents, so neither run finds the other's rows indexed.
+            results["insert"] = await bench_end_to_end(engine, db, standin, "bench insert", use_writer=False)
+            results["writer"] = await bench_end_to_end(engine, db, standin, "bench writer", use_writer=True)
+            if args.outage_error_rate:
+                standin.error_rate = args.outage_error_rate
+                try:
+                    results["outage"] = await bench_end_to_end(engine, db, standin, "bench outage", use_writer=True)
+                finally:
+                    standin.error_rate = 0.0
+                results["outage"]["error_rate"] = args.outage_error_rate
+                results["outage"]["circuit_opens"] = scheduler.stats.circuit_opens
+        finally:
+            await engine.close()
+            await db.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=("browser", "http"), default=os.getenv("CRAWLER_ENGINE", "http"))
+    parser.add_argument("--output", type=Path, default=Path("crawl_benchmark.json"))
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--database-url", help="server to create the scratch database on; default: a throwaway initdb cluster")
+    parser.add_argument("--snapshot-dir", help="serve recorded pages from this snapshot store")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--results-pages", type=int, default=5)
+    parser.add_argument("--rows-per-page", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests-per-second", type=float, default=1000.0)
+    parser.add_argument("--outage-error-rate", type=float, default=0.2, help="share of detail requests failing in the outage run; 0 skips it")
+    parser.add_argument("--fetch-attempts", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--pool-checkouts", type=int, default=2000)
+    parser.add_argument("--pool-hold", type=float, default=0.002)
+    parser.add_argument("--extraction-pages", type=int, default=50)
+    parser.add_argument("--extraction-repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    args.output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        print(f"\n{'metric':<55} {'baseline':>12} {'current':>12} {'change':>9}")
+        compare(results, json.loads(args.baseline.read_text()))
@@ -0,0 +1,78 @@
+"""
+Offline parity check between the HTTP (lxml) and browser (Playwright) engines.
+
+Usage (from crawler_service/):
+    python -m benchmarks.engine_parity FIXTURE_DIR
+
+FIXTURE_DIR holds saved sunbiz detail pages (`*.html`), or is a snapshot
+store (SNAPSHOT_DIR), whose latest detail page snapshots are used at their
+recorded URLs. Every fixture is served to Chromium through request
+interception at a sunbiz-looking URL, so both engines see the same markup
+and the same page URL (document image links are built from it). Exits
+non-zero when any field differs.
+"""
+from playwright.async_api import async_playwright, Route
+from app.services.florida_browser_service import FloridaBrowserService
+from app.services.snapshot_store import SnapshotStore, DETAIL
+from app.services.sunbiz_parser import parse_entity_detail
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Tuple
+import argparse
+import asyncio
+import sys
+
+
+FIXTURE_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/{name}"
+
+
+def load_fixtures(fixture_dir: Path) -> List[Tuple[str, bytes, str]]:
+    """(name, content, url) of every fixture."""
+    if (fixture_dir / "index.jsonl").exists():
+        store = SnapshotStore(str(fixture_dir))
+        snapshots = sorted(store.latest(DETAIL).values(), key=lambda snapshot: snapshot.url)
+        return [(snapshot.url, store.read(snapshot), snapshot.url) for snapshot in snapshots]
+    return [
+        (fixture.name, fixture.read_bytes(), FIXTURE_URL.format(name=fixture.stem))
+        for fixture in sorted(fixture_dir.glob("*.html"))
+    ]
+
+
+async def main(fixture_dir: Path) -> int:
+    fixtures = load_fixtures(fixture_dir)
+    if not fixtures:
+        print(f"No fixtures found in {fixture_dir}")
+        return 1
+    mismatches = 0
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        for name, content, url in fixtures:
+
+            async def fulfill(route: Route, body: bytes = content):
+                await route.fulfill(status=200, content_type="text/html; charset=utf-8", body=body)
+
+            # Matched exactly: snapshot URLs carry query strings, which globs would mangle.
+            def is_fixture(request_url: str, fixture_url: str = url) -> bool:
+                return request_url == fixture_url
+
+            await page.route(is_fixture, fulfill)
+            await page.goto(url, wait_until="domcontentloaded")
+            browser_detail = asdict(await FloridaBrowserService.extract_entity_detail(page))
+            http_detail = asdict(parse_entity_detail(content, url))
+            await page.unroute(is_fixture)
+            diff = {key: (value, http_detail[key]) for key, value in browser_detail.items() if http_detail[key] != value}
+            print(f"{'ok  ' if not diff else 'DIFF'} {name}")
+            for key, (browser_value, http_value) in diff.items():
+                print(f"    {key}: browser={browser_value!r} http={http_value!r}")
+            mismatches += bool(diff)
+        await browser.close()
+    print(f"{len(fixtures) - mismatches}/{len(fixtures)} fixtures identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixture_dir", type=Path)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.fixture_dir)))
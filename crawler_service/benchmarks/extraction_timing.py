@@ -0,0 +1,60 @@
+"""
+Per-page timing comparison of the single-evaluate detail extraction against
+the legacy per-field extractors.
+
+Usage (from crawler_service/):
+    python -m benchmarks.extraction_timing [--repeat N] DETAIL_URL [DETAIL_URL ...]
+
+Each detail page is loaded once, then both extraction paths run `--repeat`
+times against the same DOM. The script reports per-page medians and checks
+that both paths produced the same EntityDetail.
+"""
+from playwright.async_api import async_playwright
+from app.services.florida_browser_service import FloridaBrowserService
+from dataclasses import asdict
+import argparse
+import asyncio
+import statistics
+import time
+
+
+async def time_extraction(extract, page, repeat: int):
+    timings = []
+    detail = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        detail = await extract(page)
+        timings.append(time.perf_counter() - started)
+    return detail, statistics.median(timings)
+
+
+async def main(urls, repeat: int):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        legacy_total = 0.0
+        script_total = 0.0
+        print(f"{'legacy ms':>10} {'script ms':>10} {'speedup':>8}  match  url")
+        for url in urls:
+            await page.goto(url, wait_until="domcontentloaded")
+            await page.wait_for_selector("div.searchResultDetail")
+            legacy, legacy_time = await time_extraction(FloridaBrowserService.extract_entity_detail_legacy, page, repeat)
+            script, script_time = await time_extraction(FloridaBrowserService.extract_entity_detail, page, repeat)
+            legacy_total += legacy_time
+            script_total += script_time
+            match = asdict(legacy) == asdict(script)
+            print(f"{legacy_time * 1000:>10.1f} {script_time * 1000:>10.1f} {legacy_time / script_time:>7.1f}x  {'yes' if match else 'NO ':<5}  {url}")
+            if not match:
+                for key, value in asdict(legacy).items():
+                    if asdict(script)[key] != value:
+                        print(f"    {key}: legacy={value!r} script={asdict(script)[key]!r}")
+        print(f"{legacy_total * 1000:>10.1f} {script_total * 1000:>10.1f} {legacy_total / script_total:>7.1f}x  total")
+        await browser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.repeat))
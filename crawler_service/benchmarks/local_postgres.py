@@ -0,0 +1,109 @@
+"""
+Disposable Postgres for benchmarks, with the project schema applied.
+
+Without a server URL, a throwaway cluster is created with initdb in a
+temporary directory and reached over a unix socket there; the binaries come
+from PG_BIN, `pg_config --bindir` or PATH. With a server URL, a scratch
+database is created on that server instead. Either way everything is
+dropped again on exit.
+"""
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+import psycopg
+
+
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "schema.sql"
+
+
+def _pg_bin() -> Path:
+    if os.getenv("PG_BIN"):
+        return Path(os.environ["PG_BIN"])
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        return Path(subprocess.run([pg_config, "--bindir"], check=True, capture_output=True, text=True).stdout.strip())
+    initdb = shutil.which("initdb")
+    if initdb:
+        return Path(initdb).parent
+    raise RuntimeError("Postgres binaries not found; set PG_BIN or pass a server URL")
+
+
+def _with_database(url: str, database: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=f"/{database}"))
+
+
+class LocalPostgres:
+    def __init__(self, server_url: Optional[str] = None, schema_path: Path = SCHEMA_PATH):
+        self.__server_url = server_url
+        self.__schema_path = schema_path
+        self.__data_dir: Optional[str] = None
+        self.__database: Optional[str] = None
+        self.url: Optional[str] = None
+
+
+    def start(self) -> str:
+        if self.__server_url:
+            self.__database = f"crawl_bench_{uuid.uuid4().hex[:8]}"
+            with psycopg.connect(self.__server_url, autocommit=True) as conn:
+                conn.execute(f'CREATE DATABASE "{self.__database}"')
+            self.url = _with_database(self.__server_url, self.__database)
+        else:
+            if hasattr(os, "geteuid") and os.geteuid() == 0:
+                raise RuntimeError("initdb refuses to run as root; pass a server URL instead")
+            pg_bin = _pg_bin()
+            self.__data_dir = tempfile.mkdtemp(prefix="crawl_bench_pg_")
+            subprocess.run(
+                [str(pg_bin / "initdb"), "-D", self.__data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                check=True,
+                capture_output=True,
+            )
+            subprocess.run(
+                [
+                    str(pg_bin / "pg_ctl"), "-D", self.__data_dir, "-w",
+                    "-l", os.path.join(self.__data_dir, "server.log"),
+                    "-o", f"-k {self.__data_dir} -c listen_addresses=''",
+                    "start",
+                ],
+                check=True,
+                capture_output=True,
+            )
+            self.url = f"postgresql://postgres@/postgres?host={self.__data_dir}"
+        self.__apply_schema()
+        return self.url
+
+
+    def __apply_schema(self):
+        schema = self.__schema_path.read_text()
+        with psycopg.connect(self.url, autocommit=True) as conn:
+            available = conn.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").fetchone()
+            if not available:
+                # Only the search service's substring index needs it.
+                print("pg_trgm is not available; skipping the trigram index")
+                schema = "\n".join(line for line in schema.splitlines() if "trgm" not in line)
+            conn.execute(schema)
+
+
+    def stop(self):
+        if self.__database:
+            with psycopg.connect(self.__server_url, autocommit=True) as conn:
+                conn.execute(f'DROP DATABASE IF EXISTS "{self.__database}" WITH (FORCE)')
+            self.__database = None
+        if self.__data_dir:
+            subprocess.run([str(_pg_bin() / "pg_ctl"), "-D", self.__data_dir, "-m", "immediate", "stop"], capture_output=True)
+            shutil.rmtree(self.__data_dir, ignore_errors=True)
+            self.__data_dir = None
+
+
+    def __enter__(self) -> "LocalPostgres":
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,66 @@
+"""
+Per-page bytes transferred and time to DOMContentLoaded with the default
+browser context versus the crawler's BrowserProfile (resource blocking,
+scripts off, small viewport).
+
+Usage (from crawler_service/):
+    python -m benchmarks.resource_blocking [--settle 1.0] URL [URL ...]
+
+Each URL is loaded in a fresh page under both setups. Bytes are counted
+from finished requests after the page has had `--settle` seconds to pull
+in its subresources, which is what the crawler pays for when it keeps a
+page busy.
+"""
+from playwright.async_api import async_playwright
+from app.services.browser_profile import BrowserProfile, BrowserTraffic
+import argparse
+import asyncio
+import time
+
+
+async def load(context_traffic: BrowserTraffic, context, url: str, settle: float):
+    page = await context.new_page()
+    started = time.perf_counter()
+    await page.goto(url, wait_until="domcontentloaded")
+    domcontentloaded = time.perf_counter() - started
+    await asyncio.sleep(settle)
+    received = context_traffic.bytes_for(page)
+    await page.close()
+    return domcontentloaded, received
+
+
+async def main(urls, settle: float):
+    setups = (
+        ("default", BrowserProfile(block_resources=False, javascript_enabled=True, viewport=(1280, 720))),
+        ("profile", BrowserProfile.from_env()),
+    )
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        totals = {}
+        print(f"{'setup':>8} {'dcl ms':>8} {'kB':>9}  url")
+        for label, profile in setups:
+            traffic = BrowserTraffic(profile)
+            context = await traffic.open(browser)
+            total_time = 0.0
+            total_bytes = 0
+            for url in urls:
+                domcontentloaded, received = await load(traffic, context, url, settle)
+                total_time += domcontentloaded
+                total_bytes += received
+                print(f"{label:>8} {domcontentloaded * 1000:8.1f} {received / 1024:9.1f}  {url}")
+            stats = traffic.stats
+            totals[label] = (total_time, total_bytes, stats.blocked_requests)
+            await traffic.close()
+        await browser.close()
+
+    print()
+    for label, (total_time, total_bytes, blocked) in totals.items():
+        print(f"{label:>8}: {total_time / len(urls) * 1000:8.1f} ms DCL/page  {total_bytes / len(urls) / 1024:9.1f} kB/page  {blocked} requests blocked")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--settle", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.settle))
@@ -0,0 +1,323 @@
+"""
+Local stand-in for search.sunbiz.org, for crawling without the real site.
+
+Usage (from crawler_service/):
+    python -m benchmarks.sunbiz_standin [--port 8931] [--latency 0.05] [--results-pages 5] [--rows-per-page 20] [--error-rate 0.0] [--snapshot-dir DIR]
+
+Serves the name search form, results pages and detail pages at sunbiz's
+paths. Pages are synthetic by default: every search term gets its own
+`--results-pages` pages of rows and detail pages built from a fixed
+template, so runs are repeatable and different terms never share document
+numbers. With `--snapshot-dir` the latest recorded pages of a snapshot
+store are served instead, at their recorded paths. Every response waits
+`--latency` seconds (plus up to `--jitter`) first, and `--error-rate` of the
+detail page requests answer 503, as in a partial outage.
+
+Point a crawler engine at it by overriding its BASE_SEARCH_URL and
+DOCUMENT_NUMBER_SEARCH_URL with `url(...)` of the paths below.
+"""
+from app.services.snapshot_store import Snapshot, SnapshotStore
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from html import escape
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+import argparse
+import hashlib
+import random
+import threading
+import time
+
+
+SEARCH_PATH = "/Inquiry/CorporationSearch/ByName"
+DOCUMENT_NUMBER_SEARCH_PATH = "/Inquiry/CorporationSearch/ByDocumentNumber"
+RESULTS_PATH = "/Inquiry/CorporationSearch/SearchResults"
+DETAIL_PATH = "/Inquiry/CorporationSearch/SearchResultDetail"
+
+SEARCH_FORM = """<html><body>
+<form action="{action}" method="post">
+<input type="hidden" name="SearchType" value="EntityName"/>
+<input id="SearchTerm" name="SearchTerm" type="text" value=""/>
+<input type="submit" value="Search Now"/>
+</form>
+</body></html>"""
+
+RESULTS_PAGE = """<html><body>
+<div id="search-results">
+<table>
+<thead><tr><th>Corporate Name</th><th>Document Number</th><th>Status</th></tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</div>
+{next_link}
+</body></html>"""
+
+RESULTS_ROW = """<tr><td class="large-width"><a href="{href}">{name}</a></td><td class="small-width">{document_number}</td><td class="small-width">{status}</td></tr>"""
+
+DETAIL_PAGE = """<html><body><div class="searchResultDetail">
+<div class="detailSection corporationName">
+<p>Florida Limited Liability Company</p>
+<p>{name}</p>
+</div>
+<div class="detailSection filingInformation">
+<span>Filing Information</span>
+<div>
+<label for="Detail_DocumentId">Document Number</label>
+<span>{document_number}</span>
+<label for="Detail_FeiEinNumber">FEI/EIN Number</label>
+<span>{ein}</span>
+<label for="Detail_FileDate">Date Filed</label>
+<span>01/05/2012</span>
+<label for="Detail_EntityStateCountry">State</label>
+<span>FL</span>
+<label for="Detail_Status">Status</label>
+<span>{status}</span>
+<label for="Detail_LastEvent">Last Event</label>
+<span>REINSTATEMENT</span>
+</div>
+</div>
+<div class="detailSection">
+<span>Principal Address</span>
+<span><div>{number} MAIN ST<br/>
+MIAMI, FL 33101<br/></div></span>
+<span>Changed: 04/30/2015</span>
+</div>
+<div class="detailSection">
+<span>Mailing Address</span>
+<span><div>PO BOX {number}<br/>
+MIAMI, FL 33101<br/></div></span>
+<span>Changed: 04/30/2015</span>
+</div>
+<div class="detailSection">
+<span>Registered Agent Name &amp; Address</span>
+<span>DOE, JOHN</span>
+<span><div>9 AGENT RD<br/>TAMPA, FL 33602<br/></div></span>
+<span>Name Changed: 01/01/2019</span>
+<span>Address Changed: 02/02/2019</span>
+</div>
+<div class="detailSection">
+<span>Authorized Person(s) Detail</span>
+<span>Name &amp; Address</span><br/>
+<br/>
+<span>Title MGR</span><br/><br/>
+DOE, JOHN<br/>
+<span><div>{number} MAIN ST<br/>MIAMI, FL 33101<br/></div></span><br/>
+<span>Title AMBR</span><br/><br/>
+ROE, JANE<br/>
+<span><div>1 SIDE ST<br/>MIAMI, FL 33101<br/></div></span><br/>
+</div>
+<div class="detailSection">
+<span>Annual Reports</span>
+<table><tr><td class="bold">Report Year</td><td class="bold">Filed Date</td></tr>
+<tr><td>2022</td><td>01/15/2022</td></tr>
+<tr><td>2023</td><td>02/15/2023</td></tr>
+<tr><td>2024</td><td>03/15/2024</td></tr></table>
+</div>
+<div class="detailSection">
+<span>Document Images</span>
+<table>
+<tr><td><a href="/DocumentImages/{document_number}-2024.pdf" title="View">03/15/2024 -- ANNUAL REPORT</a></td><td><span>View image</span></td></tr>
+<tr><td><a href="/DocumentImages/{document_number}-2023.pdf" title="View">02/15/2023 -- ANNUAL REPORT</a></td><td><span>View image</span></td></tr>
+</table>
+</div>
+</div></body></html>"""
+
+
+def synthetic_rows(term: str, page: int, rows_per_page: int) -> List[Tuple[str, str, str]]:
+    """(entity name, document number, status) of one results page for `term`."""
+    prefix = "L" + hashlib.sha1(term.upper().encode()).hexdigest()[:6].upper()
+    return [
+        (f"{term.upper()} {page:04d}{row:02d} LLC", f"{prefix}{page:04d}{row:02d}", "Active" if row % 4 else "Inactive")
+        for row in range(rows_per_page)
+    ]
+
+
+class SunbizStandIn:
+    def __init__(
+            self,
+            port: int = 0,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            results_pages: int = 5,
+            rows_per_page: int = 20,
+            error_rate: float = 0.0,
+            snapshots: Optional[SnapshotStore] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.results_pages = results_pages
+        self.rows_per_page = rows_per_page
+        self.requests = 0
+        self.errors = 0
+        self.__requests_lock = threading.Lock()
+        self.__recorded: Dict[str, Tuple[SnapshotStore, Snapshot]] = {}
+        if snapshots is not None:
+            for url, snapshot in snapshots.latest().items():
+                self.__recorded[self.__path_of(url)] = (snapshots, snapshot)
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                standin._handle(self, "GET")
+
+            def do_POST(self):
+                standin._handle(self, "POST")
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+
+    @staticmethod
+    def __path_of(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+
+    def start(self) -> "SunbizStandIn":
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+    def __enter__(self) -> "SunbizStandIn":
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    def _handle(self, request: BaseHTTPRequestHandler, method: str):
+        with self.__requests_lock:
+            self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        form = {}
+        if method == "POST":
+            body = request.rfile.read(int(request.headers.get("Content-Length") or 0)).decode()
+            form = {key: values[0] for key, values in parse_qs(body).items()}
+        parts = urlsplit(request.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if parts.path == DETAIL_PATH and self.error_rate and random.random() < self.error_rate:
+            with self.__requests_lock:
+                self.errors += 1
+            status, body, location = 503, "<html><body>Service Unavailable</body></html>", None
+        elif self.__recorded:
+            status, body, location = self.__recorded_response(parts.path, request.path, method, form)
+        else:
+            status, body, location = self.__synthetic_response(parts.path, method, query, form)
+        encoded = body.encode()
+        request.send_response(status)
+        if location:
+            request.send_header("Location", location)
+        request.send_header("Content-Type", "text/html; charset=utf-8")
+        request.send_header("Content-Length", str(len(encoded)))
+        request.end_headers()
+        request.wfile.write(encoded)
+
+
+    def __recorded_response(self, path: str, full_path: str, method: str, form: Dict[str, str]) -> Tuple[int, str, Optional[str]]:
+        if method == "GET" and path in (SEARCH_PATH, DOCUMENT_NUMBER_SEARCH_PATH):
+            return 200, SEARCH_FORM.format(action=path), None
+        if method == "POST":
+            # First results pages are recorded under the term they answer.
+            full_path = f"{path}?{urlencode({'SearchTerm': form.get('SearchTerm', '')})}"
+        recorded = self.__recorded.get(full_path)
+        if recorded is None:
+            return 404, "<html><body>Not recorded</body></html>", None
+        store, snapshot = recorded
+        return 200, store.read(snapshot).decode("utf-8", errors="replace"), None
+
+
+    def __synthetic_response(self, path: str, method: str, query: Dict[str, str], form: Dict[str, str]) -> Tuple[int, str, Optional[str]]:
+        if path in (SEARCH_PATH, DOCUMENT_NUMBER_SEARCH_PATH) and method == "GET":
+            return 200, SEARCH_FORM.format(action=path), None
+        if path == SEARCH_PATH:
+            return 200, self.__results_page(form.get("SearchTerm", ""), 0), None
+        if path == DOCUMENT_NUMBER_SEARCH_PATH:
+            # Like sunbiz, a document number lookup lands on the detail page.
+            return 302, "", f"{DETAIL_PATH}?{urlencode({'document_number': form.get('SearchTerm', '')})}"
+        if path == RESULTS_PATH:
+            return 200, self.__results_page(query.get("term", ""), int(query.get("page", "0"))), None
+        if path == DETAIL_PATH:
+            return 200, self.__detail_page(query.get("document_number", ""), query.get("name")), None
+        return 404, "<html><body>Not found</body></html>", None
+
+
+    def __results_page(self, term: str, page: int) -> str:
+        rows = "\n".join(
+            RESULTS_ROW.format(
+                href=escape(f"{DETAIL_PATH}?{urlencode({'document_number': document_number, 'name': name})}"),
+                name=escape(name),
+                document_number=document_number,
+                status=status,
+            )
+            for name, document_number, status in synthetic_rows(term, page, self.rows_per_page)
+        )
+        next_link = ""
+        if page + 1 < self.results_pages:
+            href = escape(f"{RESULTS_PATH}?{urlencode({'term': term, 'page': page + 1})}")
+            next_link = f'<a href="{href}" title="Next On List">Next List</a>'
+        return RESULTS_PAGE.format(rows=rows, next_link=next_link)
+
+
+    def __detail_page(self, document_number: str, name: Optional[str]) -> str:
+        number = int(hashlib.sha1(document_number.encode()).hexdigest()[:4], 16)
+        return DETAIL_PAGE.format(
+            name=escape(name or f"ENTITY {document_number} LLC"),
+            document_number=escape(document_number),
+            ein=f"{number % 100:02d}-{number:07d}",
+            status="ACTIVE" if number % 4 else "INACTIVE",
+            number=number,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--results-pages", type=int, default=5)
+    parser.add_argument("--rows-per-page", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--snapshot-dir")
+    args = parser.parse_args()
+    standin = SunbizStandIn(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        results_pages=args.results_pages,
+        rows_per_page=args.rows_per_page,
+        error_rate=args.error_rate,
+        snapshots=SnapshotStore(args.snapshot_dir) if args.snapshot_dir else None,
+    )
+    print(f"Serving sunbiz stand-in at {standin.base_url}{SEARCH_PATH}")
+    try:
+        standin.start()
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
@@ -1,8 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.api.crawler import crawler
+from app.api.crawler import crawler, get_crawler_engine
 from app.db import DB
+from app.services.crawl_worker import CrawlWorker
+from app.utils.metrics import render_metrics
 import asyncio
 import uvicorn
 from dotenv import load_dotenv
@@ -14,7 +16,21 @@ load_dotenv()
 async def fastapi_lifespan(app: FastAPI):
     db = DB()
     await db.connect(os.getenv("DATABASE_URL"))
+    # Set to 0 when dedicated worker processes (worker.py) drain the queue.
+    workers = []
+    api_workers = int(os.getenv("CRAWL_API_WORKERS", "1"))
+    if api_workers > 0:
+        engine = get_crawler_engine()
+        await engine.ensure_ready()
+        workers = [CrawlWorker.from_env(engine, db.crawl_job_dao, db.entity_dao, db.entity_writer) for _ in range(api_workers)]
+    worker_tasks = [asyncio.create_task(worker.run()) for worker in workers]
     yield
+    for worker in workers:
+        worker.stop()
+    await asyncio.gather(*worker_tasks)
+    if api_workers > 0:
+        # Stops the browser fleet and its page pool, or the HTTP client.
+        await engine.close()
     await db.dispose()
 
 app = FastAPI(lifespan=fastapi_lifespan, openapi_url="/api/v1/crawler/openapi.json", docs_url="/api/v1/crawler/docs")
@@ -31,6 +47,11 @@ app.add_middleware(
 async def index():
     return {"message": "Crawler Service is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(crawler, prefix="/api/v1/crawler", tags=["crawler"])
 
 async def main():    
@@ -0,0 +1,53 @@
+"""
+Offline re-extraction from the snapshot store. Re-runs the current detail
+page extraction over the latest stored snapshot of every detail page and
+bulk-updates entity_details; nothing is fetched from sunbiz.
+
+Usage (from crawler_service/):
+    python replay.py [--snapshot-dir DIR] [--processes 4] [--batch-size 500] [--since 2024-01-01T00:00:00] [--dry-run]
+
+Only entities whose extracted content changed are rewritten; each rewrite
+is recorded in entity_changes.
+"""
+from app.db import DB
+from app.services.snapshot_replay import replay
+from app.services.snapshot_store import SnapshotStore
+from dataclasses import asdict
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import os
+
+load_dotenv()
+
+
+async def main(args):
+    store = SnapshotStore(args.snapshot_dir)
+    since = datetime.fromisoformat(args.since) if args.since else None
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    db = DB()
+    await db.connect(os.getenv("DATABASE_URL"))
+    try:
+        report = await replay(
+            store,
+            db.entity_dao,
+            processes=args.processes,
+            batch_size=args.batch_size,
+            since=since,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await db.dispose()
+    print({**asdict(report), "snapshots_per_second": round(report.snapshots_per_second, 1)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot-dir", default=os.getenv("SNAPSHOT_DIR"), required=not os.getenv("SNAPSHOT_DIR"))
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--since", help="only snapshots fetched at or after this ISO timestamp (UTC unless given)")
+    parser.add_argument("--dry-run", action="store_true", help="parse and count without writing")
+    asyncio.run(main(parser.parse_args()))
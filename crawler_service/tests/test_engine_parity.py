@@ -0,0 +1,53 @@
+"""
+The browser engine's in-page extraction and sunbiz_parser must build the
+same EntityDetail from every detail fixture. Skipped when Playwright or its
+Chromium build is not installed (`playwright install chromium`).
+"""
+from app.services.sunbiz_parser import parse_entity_detail
+from dataclasses import asdict
+from pathlib import Path
+import asyncio
+import os
+import pytest
+
+
+async_api = pytest.importorskip("playwright.async_api")
+
+FIXTURES = Path(__file__).parent / "fixtures"
+FIXTURE_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/{name}"
+
+
+async def browser_details(fixtures):
+    from app.services.florida_browser_service import FloridaBrowserService
+
+    async with async_api.async_playwright() as playwright:
+        if not os.path.exists(playwright.chromium.executable_path):
+            return None
+        browser = await playwright.chromium.launch(headless=True)
+        try:
+            page = await browser.new_page()
+            details = {}
+            for fixture in fixtures:
+                url = FIXTURE_URL.format(name=fixture.stem)
+
+                async def fulfill(route, body: bytes = fixture.read_bytes()):
+                    await route.fulfill(status=200, content_type="text/html; charset=utf-8", body=body)
+
+                await page.route(url, fulfill)
+                await page.goto(url, wait_until="domcontentloaded")
+                details[fixture.name] = asdict(await FloridaBrowserService.extract_entity_detail(page))
+                await page.unroute(url)
+            return details
+        finally:
+            await browser.close()
+
+
+def test_browser_and_http_engines_agree():
+    fixtures = sorted(FIXTURES.glob("detail_*.html"))
+    details = asyncio.run(browser_details(fixtures))
+    if details is None:
+        pytest.skip("Chromium is not installed")
+
+    for fixture in fixtures:
+        url = FIXTURE_URL.format(name=fixture.stem)
+        assert details[fixture.name] == asdict(parse_entity_detail(fixture.read_bytes(), url)), fixture.name
@@ -0,0 +1,167 @@
+"""
+sunbiz_parser against saved sunbiz pages (tests/fixtures). The expected
+values are what the browser engine extracts from the same markup; see
+test_engine_parity.py.
+"""
+from app.models.entity import EntityDetail, SearchResultRow
+from app.services.sunbiz_parser import parse_entity_detail, parse_search_form, parse_search_results
+from pathlib import Path
+import pytest
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+DETAIL_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResultDetail"
+RESULTS_URL = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/EntityName/BLUE%20HERON/Page2"
+
+
+def read_fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def test_limited_liability_company_detail():
+    detail = parse_entity_detail(read_fixture("detail_llc.html"), DETAIL_URL)
+
+    assert detail == EntityDetail(
+        entity_type="Florida Limited Liability Company",
+        entity_name="BLUE HERON PROPERTIES, LLC",
+        document_number="L12000004567",
+        fe_ein_number="45-4412873",
+        date_filed="01/09/2012",
+        state="FL",
+        status="ACTIVE",
+        last_event="LC AMENDMENT",
+        principal_address="1200 BRICKELL AVE\nSUITE 1950\nMIAMI, FL 33131",
+        principal_address_changed="04/30/2015",
+        mailing_address="PO BOX 14402\nMIAMI, FL 33101",
+        mailing_address_changed="04/30/2015",
+        registered_agent_name="GARCIA, MARIA L",
+        registered_agent_address="1200 BRICKELL AVE\nSUITE 1950\nMIAMI, FL 33131",
+        registered_agent_address_changed="04/30/2015",
+        registered_agent_name_changed="02/11/2019",
+        # Like the browser extraction: the name is the raw text node, and the
+        # address is read three elements past the title, a <br> on this layout.
+        authorized_persons=[
+            {"title": "MGR", "name": "\nGARCIA, MARIA L", "address": ""},
+            {"title": "AMBR", "name": "\nO'NEILL, PATRICK", "address": ""},
+        ],
+        annual_reports=[
+            {"year": "2022", "filed_date": "01/14/2022"},
+            {"year": "2023", "filed_date": "02/03/2023"},
+            {"year": "2024", "filed_date": "01/29/2024"},
+        ],
+        document_images=[
+            {
+                "title": "01/29/2024 -- ANNUAL REPORT",
+                "link": "https://search.sunbiz.org/Inquiry/CorporationSearch/DocumentImages/L12000004567-2024.pdf",
+            },
+            {
+                "title": "02/03/2023 -- ANNUAL REPORT",
+                "link": "https://search.sunbiz.org/Inquiry/CorporationSearch/DocumentImages/L12000004567-2023.pdf",
+            },
+            {
+                "title": "03/02/2016 -- LC Amendment",
+                "link": "https://search.sunbiz.org/Inquiry/CorporationSearch/DocumentImages/L12000004567-2016.pdf",
+            },
+        ],
+    )
+
+
+def test_inactive_corporation_detail():
+    detail = parse_entity_detail(read_fixture("detail_corporation.html"), DETAIL_URL)
+
+    assert detail == EntityDetail(
+        entity_type="Florida Profit Corporation",
+        entity_name="SUNCOAST MARINE SUPPLY, INC.",
+        document_number="P98000061234",
+        fe_ein_number="NONE",
+        date_filed="07/13/1998",
+        effective_date="07/10/1998",
+        state="FL",
+        status="INACTIVE",
+        last_event="ADMIN DISSOLUTION FOR ANNUAL REPORT",
+        principal_address="4410 GULF BLVD\nST. PETE BEACH, FL 33706",
+        mailing_address="4410 GULF BLVD\nST. PETE BEACH, FL 33706",
+        registered_agent_name="WHITFIELD, THOMAS R",
+        registered_agent_address="4410 GULF BLVD\nST. PETE BEACH, FL 33706",
+        authorized_persons=[{"title": "PD", "name": "\nWHITFIELD, THOMAS R", "address": ""}],
+        annual_reports=[
+            {"year": "2007", "filed_date": "04/18/2007"},
+            {"year": "2008", "filed_date": "05/01/2008"},
+        ],
+        document_images=[
+            {
+                "title": "05/01/2008 -- ANNUAL REPORT",
+                "link": "https://search.sunbiz.org/Inquiry/CorporationSearch/DocumentImages/P98000061234-2008.pdf",
+            },
+            {
+                "title": "07/13/1998 -- Domestic Profit",
+                "link": "https://search.sunbiz.org/Inquiry/CorporationSearch/DocumentImages/P98000061234-1998.pdf",
+            },
+        ],
+    )
+
+
+def test_search_results_page():
+    page = parse_search_results(read_fixture("search_results.html"), RESULTS_URL)
+
+    detail = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResultDetail?inquirytype=EntityName&directionType=Initial"
+    assert page.url == RESULTS_URL
+    assert page.rows == [
+        SearchResultRow(
+            entity_name="BLUE HERON MARINE, INC.",
+            document_number="P05000088123",
+            status="Active",
+            detail_url=detail + "&searchNameOrder=BLUEHERONMARINE%20P050000881230&aggregateId=domp-p05000088123-1a2b3c4d"
+                                "&searchTerm=BLUE%20HERON&listNameOrder=BLUEHERONMARINE%20P050000881230",
+        ),
+        SearchResultRow(
+            entity_name="BLUE HERON PROPERTIES, LLC",
+            document_number="L12000004567",
+            status="Active",
+            detail_url=detail + "&searchNameOrder=BLUEHERONPROPERTIESL120000045670&aggregateId=flal-l12000004567-5e6f7a8b"
+                                "&searchTerm=BLUE%20HERON&listNameOrder=BLUEHERONPROPERTIESL120000045670",
+        ),
+        SearchResultRow(
+            entity_name="BLUE HERON RESTAURANT",
+            document_number="N96000001234",
+            status="InAct/NR",
+            detail_url=detail + "&searchNameOrder=BLUEHERONRESTAURANT%20N960000012340&aggregateId=domnp-n96000001234-9c0d1e2f"
+                                "&searchTerm=BLUE%20HERON&listNameOrder=BLUEHERONRESTAURANT%20N960000012340",
+        ),
+    ]
+    assert page.next_url == (
+        "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/EntityName/BLUE%20HERON/Page3"
+        "?searchNameOrder=BLUEHERONPROPERTIESL120000045670"
+    )
+
+
+def test_last_search_results_page():
+    page = parse_search_results(read_fixture("search_results_last.html"), RESULTS_URL)
+
+    assert [(row.entity_name, row.document_number, row.status) for row in page.rows] == [
+        ("ZEPHYRINE HOLDINGS LLC", "L21000099887", "Active"),
+    ]
+    assert page.next_url is None
+
+
+def test_search_form():
+    content = b"""<html><body>
+<form action="/Inquiry/CorporationSearch/ByName" method="post">
+<input type="hidden" name="SearchType" value="EntityName"/>
+<input id="SearchTerm" name="SearchTerm" type="text"/>
+<input type="submit" value="Search Now"/>
+</form>
+</body></html>"""
+    action, fields = parse_search_form(content, "https://search.sunbiz.org/Inquiry/CorporationSearch/ByName")
+
+    assert action == "https://search.sunbiz.org/Inquiry/CorporationSearch/ByName"
+    assert fields == {"SearchType": "EntityName", "SearchTerm": ""}
+
+
+@pytest.mark.parametrize("parse, fixture", [
+    (parse_entity_detail, "search_results.html"),
+    (parse_search_results, "detail_llc.html"),
+])
+def test_rejects_other_pages(parse, fixture):
+    with pytest.raises(ValueError):
+        parse(read_fixture(fixture), DETAIL_URL)
@@ -0,0 +1,87 @@
+"""
+Crawl worker processes. Each process has its own event loop, crawler engine
+(and so its own browser with CRAWLER_ENGINE=browser) and database pool, and
+claims jobs from crawl_jobs until it is stopped.
+
+Usage (from crawler_service/):
+    python worker.py [--processes 4]
+
+Run the API with CRAWL_API_WORKERS=0 when the queue is drained here.
+METRICS_PORT serves the workers' metrics on that port; with more than one
+process, set PROMETHEUS_MULTIPROC_DIR so they are collected across processes.
+"""
+from app.api.crawler import get_crawler_engine
+from app.db import DB
+from app.services.crawl_worker import CrawlWorker
+from app.utils.logger import get_logger, stop_logging
+from app.utils.metrics import process_exited, serve_metrics
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+
+load_dotenv()
+
+logger = get_logger("app.worker")
+
+
+async def run_worker():
+    db = DB()
+    await db.connect(os.getenv("DATABASE_URL"))
+    engine = get_crawler_engine()
+    await engine.ensure_ready()
+    worker = CrawlWorker.from_env(engine, db.crawl_job_dao, db.entity_dao, db.entity_writer)
+    loop = asyncio.get_running_loop()
+    # The current job is checkpointed and handed back to the queue on shutdown.
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    logger.info("Crawl worker %s started", worker.worker_id)
+    try:
+        await worker.run()
+    finally:
+        await engine.close()
+        await db.dispose()
+    logger.info("Crawl worker %s stopped", worker.worker_id)
+
+
+def worker_process():
+    try:
+        asyncio.run(run_worker())
+    finally:
+        # multiprocessing children skip atexit; write out queued records first.
+        stop_logging()
+
+
+def main(processes: int):
+    if os.getenv("METRICS_PORT"):
+        serve_metrics(int(os.environ["METRICS_PORT"]))
+    if processes == 1:
+        worker_process()
+        return
+    children = [multiprocessing.Process(target=worker_process) for _ in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward_sigterm(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    # Ctrl+C reaches the whole process group; SIGTERM is forwarded.
+    signal.signal(signal.SIGTERM, forward_sigterm)
+    for child in children:
+        while child.is_alive():
+            try:
+                child.join()
+            except KeyboardInterrupt:
+                pass
+        process_exited(child.pid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=int(os.getenv("CRAWL_WORKER_PROCESSES", "1")))
+    args = parser.parse_args()
+    main(args.processes)
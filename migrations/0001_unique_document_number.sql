@@ -0,0 +1,12 @@
+-- Drops duplicate rows left by overlapping crawls (keeping the newest per
+-- document number) so the unique index required by the upsert can be built.
+BEGIN;
+
+DELETE FROM entity_details AS duplicate
+USING entity_details AS newer
+WHERE duplicate.document_number = newer.document_number
+  AND duplicate.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS entity_details_document_number_key ON entity_details (document_number);
+
+COMMIT;
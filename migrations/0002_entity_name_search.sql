@@ -0,0 +1,8 @@
+-- Indexed entity-name search. The trigram GIN index serves
+-- "entity_name ILIKE '%term%'" and similarity() ranking. It is built
+-- CONCURRENTLY, so this file must run outside a transaction block
+-- (psql -f, not -1).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS entity_details_entity_name_trgm_idx
+    ON entity_details USING GIN (entity_name gin_trgm_ops);
@@ -0,0 +1,39 @@
+-- Single-channel insert notifications. One static trigger publishes a
+-- compact payload for every new row on 'entity_details_inserted'; each
+-- search-service process LISTENs once and matches names against its
+-- websocket subscriptions itself.
+--
+-- Also drops the per-search-term notifier triggers and functions that the
+-- search service used to create at runtime.
+CREATE OR REPLACE FUNCTION notify_entity_inserted()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify(
+        'entity_details_inserted',
+        json_build_object('id', NEW.id, 'document_number', NEW.document_number, 'entity_name', NEW.entity_name)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_inserted_notifier
+AFTER INSERT ON entity_details FOR EACH ROW
+EXECUTE FUNCTION notify_entity_inserted();
+
+DO $$
+DECLARE
+    leftover RECORD;
+BEGIN
+    FOR leftover IN
+        SELECT tgname FROM pg_trigger
+        WHERE tgrelid = 'entity_details'::regclass AND NOT tgisinternal AND tgname LIKE '%\_search\_notifier'
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON entity_details', leftover.tgname);
+    END LOOP;
+    FOR leftover IN
+        SELECT oid::regprocedure AS signature FROM pg_proc WHERE proname LIKE 'notify\_%\_search'
+    LOOP
+        EXECUTE format('DROP FUNCTION IF EXISTS %s', leftover.signature);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,32 @@
+-- Durable crawl jobs. The crawler API enqueues a row per search; workers
+-- claim rows with FOR UPDATE SKIP LOCKED, heartbeat while they run and
+-- checkpoint the results page to resume from plus every document number
+-- they finished. A running job whose heartbeat goes stale is reclaimed.
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id SERIAL PRIMARY KEY,
+    search_term VARCHAR(255) NOT NULL,
+    -- queued, running, completed, failed or cancelled
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    cursor_url TEXT,
+    pages_crawled INT NOT NULL DEFAULT 0,
+    documents_processed INT NOT NULL DEFAULT 0,
+    documents_failed INT NOT NULL DEFAULT 0,
+    attempts INT NOT NULL DEFAULT 0,
+    worker_id VARCHAR(100),
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    error TEXT,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_claimable_idx ON crawl_jobs (id) WHERE status IN ('queued', 'running');
+
+CREATE TABLE IF NOT EXISTS crawl_job_documents (
+    job_id INT NOT NULL REFERENCES crawl_jobs (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    PRIMARY KEY (job_id, document_number)
+);
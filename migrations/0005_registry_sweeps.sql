@@ -0,0 +1,24 @@
+-- Full-registry sweeps. A sweep is a set of crawl_jobs shards, one per
+-- name prefix; a shard whose listing is deeper than max_pages results
+-- pages is split into longer prefixes. crawl_sweep_documents records which
+-- shard claimed each document, so overlapping shards open a detail page
+-- only once.
+CREATE TABLE IF NOT EXISTS crawl_sweeps (
+    id SERIAL PRIMARY KEY,
+    max_pages INT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE crawl_jobs
+    ADD COLUMN IF NOT EXISTS sweep_id INT REFERENCES crawl_sweeps (id) ON DELETE CASCADE,
+    ADD COLUMN IF NOT EXISTS parent_id INT REFERENCES crawl_jobs (id) ON DELETE CASCADE,
+    ADD COLUMN IF NOT EXISTS max_pages INT;
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_sweep_idx ON crawl_jobs (sweep_id) WHERE sweep_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS crawl_sweep_documents (
+    sweep_id INT NOT NULL REFERENCES crawl_sweeps (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    job_id INT NOT NULL,
+    PRIMARY KEY (sweep_id, document_number)
+);
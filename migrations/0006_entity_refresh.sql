@@ -0,0 +1,54 @@
+-- Incremental refresh. Crawls store the detail page URL and a hash of the
+-- extracted content, so a refresh re-fetches a known entity and writes only
+-- when the hash moved. Refresh jobs walk stale entities in
+-- (inactive, updated_at, id) order; entity_changes keeps the fields that
+-- changed on each rewrite, old and new value side by side.
+ALTER TABLE entity_details
+    ADD COLUMN IF NOT EXISTS detail_url TEXT,
+    ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+
+CREATE INDEX IF NOT EXISTS entity_details_refresh_idx ON entity_details ((status IS DISTINCT FROM 'ACTIVE'), updated_at, id);
+
+CREATE TABLE IF NOT EXISTS entity_changes (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    changes JSONB NOT NULL,
+    changed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS entity_changes_document_number_idx ON entity_changes (document_number, changed_at DESC);
+
+-- Runs only when the content hash moved. Rows crawled before hashing get
+-- their first hash without a history entry or a new updated_at unless a
+-- stored field actually differs.
+CREATE OR REPLACE FUNCTION record_entity_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    changes JSONB;
+BEGIN
+    SELECT jsonb_object_agg(new_field.key, jsonb_build_array(old_field.value, new_field.value))
+    INTO changes
+    FROM jsonb_each(to_jsonb(NEW) - ARRAY['id', 'created_at', 'updated_at', 'detail_url', 'content_hash']) AS new_field
+    JOIN jsonb_each(to_jsonb(OLD)) AS old_field ON old_field.key = new_field.key
+    WHERE new_field.value IS DISTINCT FROM old_field.value;
+
+    IF changes IS NULL THEN
+        NEW.updated_at := OLD.updated_at;
+    ELSE
+        INSERT INTO entity_changes (entity_id, document_number, changes)
+        VALUES (NEW.id, NEW.document_number, changes);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_change_recorder
+BEFORE UPDATE ON entity_details FOR EACH ROW
+WHEN (OLD.content_hash IS DISTINCT FROM NEW.content_hash)
+EXECUTE FUNCTION record_entity_change();
+
+ALTER TABLE crawl_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR(20) NOT NULL DEFAULT 'search';
+
+-- At most one refresh job is queued or running at a time.
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_refresh_idx ON crawl_jobs (kind) WHERE kind = 'refresh' AND status IN ('queued', 'running');
@@ -0,0 +1,11 @@
+-- At most one search job per term (case-insensitive) is queued or running at
+-- a time; initiate_crawl hands back the active one. Sweep shards are keyed
+-- by their sweep and are left out.
+UPDATE crawl_jobs AS duplicate SET status = 'cancelled', finished_at = NOW(), updated_at = NOW()
+FROM crawl_jobs AS original
+WHERE duplicate.kind = 'search' AND duplicate.sweep_id IS NULL AND duplicate.status IN ('queued', 'running')
+    AND original.kind = 'search' AND original.sweep_id IS NULL AND original.status IN ('queued', 'running')
+    AND lower(original.search_term) = lower(duplicate.search_term)
+    AND original.id < duplicate.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_search_idx ON crawl_jobs (lower(search_term)) WHERE kind = 'search' AND sweep_id IS NULL AND status IN ('queued', 'running');
@@ -0,0 +1,19 @@
+-- Documents whose detail fetch failed every attempt. A failure of the same
+-- document again updates its row; a retry job claims the open rows
+-- (retry_job_id) and deletes the ones it got through when it completes.
+CREATE TABLE IF NOT EXISTS crawl_dead_letters (
+    document_number VARCHAR(50) PRIMARY KEY,
+    detail_url TEXT,
+    error TEXT,
+    attempts INT NOT NULL DEFAULT 1,
+    failures INT NOT NULL DEFAULT 1,
+    job_id INT REFERENCES crawl_jobs (id) ON DELETE SET NULL,
+    retry_job_id INT REFERENCES crawl_jobs (id) ON DELETE SET NULL,
+    first_failed_at TIMESTAMPTZ DEFAULT NOW(),
+    last_failed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS crawl_dead_letters_retry_job_idx ON crawl_dead_letters (retry_job_id, document_number);
+
+-- At most one retry job is queued or running at a time.
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_retry_idx ON crawl_jobs (kind) WHERE kind = 'retry' AND status IN ('queued', 'running');
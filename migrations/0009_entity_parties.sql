@@ -0,0 +1,158 @@
+-- People, registered agents and addresses, indexed for lookup. Until now
+-- officers lived only in the authorized_persons JSONB and nothing indexed
+-- registered_agent_name or the addresses, so "which entities does this
+-- person appear on" scanned and unpacked every row.
+--
+-- persons and addresses hold each distinct normalized name or address once
+-- (trimmed, whitespace collapsed, upper case) under a trigram index;
+-- entity_persons and entity_addresses link them to entities. Statement
+-- triggers keep the links in step with entity_details, a whole upsert
+-- batch at a time: inserted rows are indexed, and updated rows are
+-- re-indexed when a name or address changed. Names and addresses no
+-- longer linked to any entity are left in place; lookups go through the
+-- links and never return them.
+--
+-- The backfill at the end indexes every existing row in one statement; on
+-- a large table run it in a maintenance window, or in id ranges with
+-- SELECT index_entity_parties(ARRAY(SELECT id FROM entity_details WHERE id BETWEEN ...)).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS persons (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE INDEX IF NOT EXISTS persons_name_trgm_idx ON persons USING GIN (name gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS entity_persons (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    person_id INT NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+    -- officer (authorized_persons) or agent (registered_agent_name)
+    role VARCHAR(20) NOT NULL,
+    title VARCHAR(100) NOT NULL DEFAULT '',
+    UNIQUE (entity_id, person_id, role, title)
+);
+
+CREATE INDEX IF NOT EXISTS entity_persons_person_idx ON entity_persons (person_id, role);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    id SERIAL PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE
+);
+
+CREATE INDEX IF NOT EXISTS addresses_address_trgm_idx ON addresses USING GIN (address gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS entity_addresses (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    address_id INT NOT NULL REFERENCES addresses (id) ON DELETE CASCADE,
+    -- principal, mailing, registered_agent or officer
+    kind VARCHAR(20) NOT NULL,
+    UNIQUE (entity_id, address_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS entity_addresses_address_idx ON entity_addresses (address_id, kind);
+
+CREATE OR REPLACE FUNCTION normalize_party(value TEXT)
+RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT nullif(upper(regexp_replace(btrim(value), '\s+', ' ', 'g')), '');
+$$;
+
+CREATE OR REPLACE FUNCTION entity_party_persons(entity entity_details)
+RETURNS TABLE (name TEXT, role TEXT, title TEXT) LANGUAGE sql STABLE AS $$
+    SELECT normalize_party(person->>'name'), 'officer', coalesce(normalize_party(person->>'title'), '')
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(entity.authorized_persons) = 'array' THEN entity.authorized_persons ELSE '[]' END) AS person
+    WHERE normalize_party(person->>'name') IS NOT NULL
+    UNION
+    SELECT normalize_party(entity.registered_agent_name), 'agent', ''
+    WHERE normalize_party(entity.registered_agent_name) IS NOT NULL;
+$$;
+
+CREATE OR REPLACE FUNCTION entity_party_addresses(entity entity_details)
+RETURNS TABLE (address TEXT, kind TEXT) LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT normalize_party(located.address), located.kind
+    FROM (
+        SELECT entity.principal_address, 'principal'
+        UNION ALL SELECT entity.mailing_address, 'mailing'
+        UNION ALL SELECT entity.registered_agent_address, 'registered_agent'
+        UNION ALL
+        SELECT person->>'address', 'officer'
+        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(entity.authorized_persons) = 'array' THEN entity.authorized_persons ELSE '[]' END) AS person
+    ) AS located (address, kind)
+    WHERE normalize_party(located.address) IS NOT NULL;
+$$;
+
+-- Rebuilds the links of the given entities. New names and addresses are
+-- inserted in sorted order, so concurrent batches lock them in the same order.
+CREATE OR REPLACE FUNCTION index_entity_parties(entity_ids INT[])
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    IF cardinality(entity_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM entity_persons WHERE entity_id = ANY(entity_ids);
+    DELETE FROM entity_addresses WHERE entity_id = ANY(entity_ids);
+
+    INSERT INTO persons (name)
+    SELECT DISTINCT party.name
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_persons(entity) AS party
+    WHERE entity.id = ANY(entity_ids)
+    ORDER BY party.name
+    ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO entity_persons (entity_id, person_id, role, title)
+    SELECT entity.id, persons.id, party.role, party.title
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_persons(entity) AS party
+    JOIN persons ON persons.name = party.name
+    WHERE entity.id = ANY(entity_ids)
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO addresses (address)
+    SELECT DISTINCT party.address
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_addresses(entity) AS party
+    WHERE entity.id = ANY(entity_ids)
+    ORDER BY party.address
+    ON CONFLICT (address) DO NOTHING;
+
+    INSERT INTO entity_addresses (entity_id, address_id, kind)
+    SELECT entity.id, addresses.id, party.kind
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_addresses(entity) AS party
+    JOIN addresses ON addresses.address = party.address
+    WHERE entity.id = ANY(entity_ids)
+    ON CONFLICT DO NOTHING;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION index_changed_entity_parties()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM index_entity_parties(ARRAY(SELECT id FROM new_rows));
+    ELSE
+        PERFORM index_entity_parties(ARRAY(
+            SELECT new_row.id
+            FROM new_rows AS new_row
+            JOIN old_rows AS old_row ON old_row.id = new_row.id
+            WHERE (new_row.authorized_persons, new_row.registered_agent_name, new_row.principal_address, new_row.mailing_address, new_row.registered_agent_address)
+                IS DISTINCT FROM (old_row.authorized_persons, old_row.registered_agent_name, old_row.principal_address, old_row.mailing_address, old_row.registered_agent_address)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_parties_inserted
+AFTER INSERT ON entity_details REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION index_changed_entity_parties();
+
+CREATE OR REPLACE TRIGGER entity_details_parties_updated
+AFTER UPDATE ON entity_details REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION index_changed_entity_parties();
+
+SELECT index_entity_parties(ARRAY(SELECT id FROM entity_details));
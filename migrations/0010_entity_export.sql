@@ -0,0 +1,6 @@
+-- Incremental exports (GET /export?updated_since=...) read rows updated
+-- since the last pull in (updated_at, id) order; this index serves the
+-- filter and the order without sorting. Built CONCURRENTLY, so this file
+-- must run outside a transaction block (psql -f, not -1).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS entity_details_updated_at_idx
+    ON entity_details (updated_at, id);
@@ -0,0 +1,34 @@
+-- Bounded entity-name search. Search ranked every row matching
+-- "entity_name ILIKE '%term%'" and sorted them all before cutting a page,
+-- on a computed rank no index could order, so a short term read a large
+-- share of the table on every page. A page now reads matches in index
+-- order and stops at its limit:
+--
+--   prefix matches, by normalize_party(entity_name) in byte order, from a
+--   "C" collation btree. As with text_pattern_ops, the names starting with
+--   a term are one contiguous range of it, and it also serves the
+--   ORDER BY and the (name, id) keyset;
+--   then fuzzy matches, nearest first by word-similarity distance
+--   (entity_name <->> term), from a trigram GiST index. "entity_name %> term"
+--   keeps those above pg_trgm.word_similarity_threshold, which the search
+--   service sets from SEARCH_WORD_SIMILARITY_THRESHOLD (0.6 by default).
+--
+-- Nothing reads the trigram GIN index or the entity_name_tsv column (and
+-- its GIN index) any more, so they are dropped: inserts and updates no
+-- longer maintain them. Dropping the column does not rewrite the table. The
+-- indexes are built CONCURRENTLY, so this file must run outside a
+-- transaction block (psql -f, not -1), after migrations/0009, which
+-- defines normalize_party().
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS entity_details_entity_name_prefix_idx
+    ON entity_details ((normalize_party(entity_name)) COLLATE "C", id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS entity_details_entity_name_trgm_gist_idx
+    ON entity_details USING GIST (entity_name gist_trgm_ops);
+
+DROP INDEX CONCURRENTLY IF EXISTS entity_details_entity_name_trgm_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS entity_details_entity_name_tsv_idx;
+
+ALTER TABLE entity_details DROP COLUMN IF EXISTS entity_name_tsv;
@@ -0,0 +1,5 @@
+-- Officer titles are free text from sunbiz. entity_persons.title was
+-- VARCHAR(100), so one longer title failed the statement trigger of
+-- migrations/0009 and rolled back the crawler's whole upsert batch.
+-- VARCHAR to TEXT is binary compatible: the table is not rewritten.
+ALTER TABLE entity_persons ALTER COLUMN title TYPE TEXT;
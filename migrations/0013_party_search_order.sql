@@ -0,0 +1,21 @@
+-- Bounded person, registered agent and address search, as migrations/0011
+-- did for entity names. Lookups ranked every link whose name or address
+-- matched ILIKE '%term%' and sorted them all before cutting a page, so a
+-- short term read a large share of the links on every page. A page now
+-- walks persons.name or addresses.address in index order and stops at its
+-- limit: texts starting with the term from a "C" collation btree, in byte
+-- order, then similar texts, nearest first by word-similarity distance,
+-- from a trigram GiST index. The trigram GIN indexes are no longer read
+-- and are dropped.
+--
+-- Built CONCURRENTLY, so this file must run outside a transaction block
+-- (psql -f, not -1).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS persons_name_prefix_idx ON persons (name COLLATE "C");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS persons_name_trgm_gist_idx ON persons USING GIST (name gist_trgm_ops);
+DROP INDEX CONCURRENTLY IF EXISTS persons_name_trgm_idx;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS addresses_address_prefix_idx ON addresses (address COLLATE "C");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS addresses_address_trgm_gist_idx ON addresses USING GIST (address gist_trgm_ops);
+DROP INDEX CONCURRENTLY IF EXISTS addresses_address_trgm_idx;
@@ -1,3 +1,6 @@
+-- Trigram indexes back the fuzzy entity-name, person and address searches.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TABLE IF NOT EXISTS entity_details (
     id SERIAL PRIMARY KEY,
     entity_type VARCHAR(100),
@@ -20,6 +23,291 @@ CREATE TABLE IF NOT EXISTS entity_details (
     annual_reports JSONB,
     document_images JSONB,
 
+    -- Set by crawls; a refresh re-fetches detail_url and compares content_hash.
+    detail_url TEXT,
+    content_hash VARCHAR(32),
+
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
+
+-- One row per sunbiz document; crawls upsert on it.
+CREATE UNIQUE INDEX IF NOT EXISTS entity_details_document_number_key ON entity_details (document_number);
+
+-- Fuzzy entity-name matches, nearest first; see migrations/0011.
+CREATE INDEX IF NOT EXISTS entity_details_entity_name_trgm_gist_idx ON entity_details USING GIST (entity_name gist_trgm_ops);
+CREATE INDEX IF NOT EXISTS entity_details_refresh_idx ON entity_details ((status IS DISTINCT FROM 'ACTIVE'), updated_at, id);
+-- Incremental exports; see migrations/0010.
+CREATE INDEX IF NOT EXISTS entity_details_updated_at_idx ON entity_details (updated_at, id);
+
+-- New rows are announced on one channel; the search service fans them out.
+CREATE OR REPLACE FUNCTION notify_entity_inserted()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify(
+        'entity_details_inserted',
+        json_build_object('id', NEW.id, 'document_number', NEW.document_number, 'entity_name', NEW.entity_name)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_inserted_notifier
+AFTER INSERT ON entity_details FOR EACH ROW
+EXECUTE FUNCTION notify_entity_inserted();
+
+-- Fields that changed on each content rewrite; see migrations/0006.
+CREATE TABLE IF NOT EXISTS entity_changes (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    changes JSONB NOT NULL,
+    changed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS entity_changes_document_number_idx ON entity_changes (document_number, changed_at DESC);
+
+CREATE OR REPLACE FUNCTION record_entity_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    changes JSONB;
+BEGIN
+    SELECT jsonb_object_agg(new_field.key, jsonb_build_array(old_field.value, new_field.value))
+    INTO changes
+    FROM jsonb_each(to_jsonb(NEW) - ARRAY['id', 'created_at', 'updated_at', 'detail_url', 'content_hash']) AS new_field
+    JOIN jsonb_each(to_jsonb(OLD)) AS old_field ON old_field.key = new_field.key
+    WHERE new_field.value IS DISTINCT FROM old_field.value;
+
+    IF changes IS NULL THEN
+        NEW.updated_at := OLD.updated_at;
+    ELSE
+        INSERT INTO entity_changes (entity_id, document_number, changes)
+        VALUES (NEW.id, NEW.document_number, changes);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_change_recorder
+BEFORE UPDATE ON entity_details FOR EACH ROW
+WHEN (OLD.content_hash IS DISTINCT FROM NEW.content_hash)
+EXECUTE FUNCTION record_entity_change();
+
+-- People, registered agents and addresses linked to entities; see migrations/0009.
+CREATE TABLE IF NOT EXISTS persons (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- Prefix, then fuzzy lookups in index order; see migrations/0013.
+CREATE INDEX IF NOT EXISTS persons_name_prefix_idx ON persons (name COLLATE "C");
+CREATE INDEX IF NOT EXISTS persons_name_trgm_gist_idx ON persons USING GIST (name gist_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS entity_persons (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    person_id INT NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+    -- officer (authorized_persons) or agent (registered_agent_name)
+    role VARCHAR(20) NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    UNIQUE (entity_id, person_id, role, title)
+);
+
+CREATE INDEX IF NOT EXISTS entity_persons_person_idx ON entity_persons (person_id, role);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    id SERIAL PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE
+);
+
+-- Prefix, then fuzzy lookups in index order; see migrations/0013.
+CREATE INDEX IF NOT EXISTS addresses_address_prefix_idx ON addresses (address COLLATE "C");
+CREATE INDEX IF NOT EXISTS addresses_address_trgm_gist_idx ON addresses USING GIST (address gist_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS entity_addresses (
+    id BIGSERIAL PRIMARY KEY,
+    entity_id INT NOT NULL REFERENCES entity_details (id) ON DELETE CASCADE,
+    address_id INT NOT NULL REFERENCES addresses (id) ON DELETE CASCADE,
+    -- principal, mailing, registered_agent or officer
+    kind VARCHAR(20) NOT NULL,
+    UNIQUE (entity_id, address_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS entity_addresses_address_idx ON entity_addresses (address_id, kind);
+
+CREATE OR REPLACE FUNCTION normalize_party(value TEXT)
+RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT nullif(upper(regexp_replace(btrim(value), '\s+', ' ', 'g')), '');
+$$;
+
+-- Prefix entity-name matches in name order; see migrations/0011.
+CREATE INDEX IF NOT EXISTS entity_details_entity_name_prefix_idx ON entity_details ((normalize_party(entity_name)) COLLATE "C", id);
+
+CREATE OR REPLACE FUNCTION entity_party_persons(entity entity_details)
+RETURNS TABLE (name TEXT, role TEXT, title TEXT) LANGUAGE sql STABLE AS $$
+    SELECT normalize_party(person->>'name'), 'officer', coalesce(normalize_party(person->>'title'), '')
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(entity.authorized_persons) = 'array' THEN entity.authorized_persons ELSE '[]' END) AS person
+    WHERE normalize_party(person->>'name') IS NOT NULL
+    UNION
+    SELECT normalize_party(entity.registered_agent_name), 'agent', ''
+    WHERE normalize_party(entity.registered_agent_name) IS NOT NULL;
+$$;
+
+CREATE OR REPLACE FUNCTION entity_party_addresses(entity entity_details)
+RETURNS TABLE (address TEXT, kind TEXT) LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT normalize_party(located.address), located.kind
+    FROM (
+        SELECT entity.principal_address, 'principal'
+        UNION ALL SELECT entity.mailing_address, 'mailing'
+        UNION ALL SELECT entity.registered_agent_address, 'registered_agent'
+        UNION ALL
+        SELECT person->>'address', 'officer'
+        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(entity.authorized_persons) = 'array' THEN entity.authorized_persons ELSE '[]' END) AS person
+    ) AS located (address, kind)
+    WHERE normalize_party(located.address) IS NOT NULL;
+$$;
+
+-- Rebuilds the links of the given entities. New names and addresses are
+-- inserted in sorted order, so concurrent batches lock them in the same order.
+CREATE OR REPLACE FUNCTION index_entity_parties(entity_ids INT[])
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    IF cardinality(entity_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM entity_persons WHERE entity_id = ANY(entity_ids);
+    DELETE FROM entity_addresses WHERE entity_id = ANY(entity_ids);
+
+    INSERT INTO persons (name)
+    SELECT DISTINCT party.name
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_persons(entity) AS party
+    WHERE entity.id = ANY(entity_ids)
+    ORDER BY party.name
+    ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO entity_persons (entity_id, person_id, role, title)
+    SELECT entity.id, persons.id, party.role, party.title
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_persons(entity) AS party
+    JOIN persons ON persons.name = party.name
+    WHERE entity.id = ANY(entity_ids)
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO addresses (address)
+    SELECT DISTINCT party.address
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_addresses(entity) AS party
+    WHERE entity.id = ANY(entity_ids)
+    ORDER BY party.address
+    ON CONFLICT (address) DO NOTHING;
+
+    INSERT INTO entity_addresses (entity_id, address_id, kind)
+    SELECT entity.id, addresses.id, party.kind
+    FROM entity_details AS entity
+    CROSS JOIN LATERAL entity_party_addresses(entity) AS party
+    JOIN addresses ON addresses.address = party.address
+    WHERE entity.id = ANY(entity_ids)
+    ON CONFLICT DO NOTHING;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION index_changed_entity_parties()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM index_entity_parties(ARRAY(SELECT id FROM new_rows));
+    ELSE
+        PERFORM index_entity_parties(ARRAY(
+            SELECT new_row.id
+            FROM new_rows AS new_row
+            JOIN old_rows AS old_row ON old_row.id = new_row.id
+            WHERE (new_row.authorized_persons, new_row.registered_agent_name, new_row.principal_address, new_row.mailing_address, new_row.registered_agent_address)
+                IS DISTINCT FROM (old_row.authorized_persons, old_row.registered_agent_name, old_row.principal_address, old_row.mailing_address, old_row.registered_agent_address)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER entity_details_parties_inserted
+AFTER INSERT ON entity_details REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION index_changed_entity_parties();
+
+CREATE OR REPLACE TRIGGER entity_details_parties_updated
+AFTER UPDATE ON entity_details REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION index_changed_entity_parties();
+
+-- Durable crawl job queue and registry sweeps; see migrations/0004 and 0005.
+CREATE TABLE IF NOT EXISTS crawl_sweeps (
+    id SERIAL PRIMARY KEY,
+    max_pages INT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id SERIAL PRIMARY KEY,
+    search_term VARCHAR(255) NOT NULL,
+    -- search (search terms and sweep shards) or refresh
+    kind VARCHAR(20) NOT NULL DEFAULT 'search',
+    -- queued, running, completed, split, failed or cancelled
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    -- Resume point: a results page URL, or a refresh job's entity position
+    cursor_url TEXT,
+    pages_crawled INT NOT NULL DEFAULT 0,
+    documents_processed INT NOT NULL DEFAULT 0,
+    documents_failed INT NOT NULL DEFAULT 0,
+    attempts INT NOT NULL DEFAULT 0,
+    worker_id VARCHAR(100),
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    error TEXT,
+
+    -- Sweep shards: search_term is the name prefix.
+    sweep_id INT REFERENCES crawl_sweeps (id) ON DELETE CASCADE,
+    parent_id INT REFERENCES crawl_jobs (id) ON DELETE CASCADE,
+    max_pages INT,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_claimable_idx ON crawl_jobs (id) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS crawl_jobs_sweep_idx ON crawl_jobs (sweep_id) WHERE sweep_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_refresh_idx ON crawl_jobs (kind) WHERE kind = 'refresh' AND status IN ('queued', 'running');
+-- One queued or running job per search term; sweep shards are keyed by their sweep.
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_search_idx ON crawl_jobs (lower(search_term)) WHERE kind = 'search' AND sweep_id IS NULL AND status IN ('queued', 'running');
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_jobs_active_retry_idx ON crawl_jobs (kind) WHERE kind = 'retry' AND status IN ('queued', 'running');
+
+CREATE TABLE IF NOT EXISTS crawl_job_documents (
+    job_id INT NOT NULL REFERENCES crawl_jobs (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    PRIMARY KEY (job_id, document_number)
+);
+
+CREATE TABLE IF NOT EXISTS crawl_sweep_documents (
+    sweep_id INT NOT NULL REFERENCES crawl_sweeps (id) ON DELETE CASCADE,
+    document_number VARCHAR(50) NOT NULL,
+    job_id INT NOT NULL,
+    PRIMARY KEY (sweep_id, document_number)
+);
+
+-- Documents whose detail fetch failed every attempt. A failure of the same
+-- document again updates its row; a retry job claims the open rows
+-- (retry_job_id) and deletes the ones it got through when it completes.
+CREATE TABLE IF NOT EXISTS crawl_dead_letters (
+    document_number VARCHAR(50) PRIMARY KEY,
+    detail_url TEXT,
+    error TEXT,
+    attempts INT NOT NULL DEFAULT 1,
+    failures INT NOT NULL DEFAULT 1,
+    job_id INT REFERENCES crawl_jobs (id) ON DELETE SET NULL,
+    retry_job_id INT REFERENCES crawl_jobs (id) ON DELETE SET NULL,
+    first_failed_at TIMESTAMPTZ DEFAULT NOW(),
+    last_failed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS crawl_dead_letters_retry_job_idx ON crawl_dead_letters (retry_job_id, document_number);
@@ -1,44 +1,302 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from app.db import DB
-from app.models.entity import EntityDao
+from app.models.entity import EntityDao, ExportFilter, PageCursor, SearchPage
+from app.models.party import AddressPage, PartyDao, PersonPage, normalize_party
+from app.services.autocomplete import AutocompleteIndex
+from app.services.entity_export import MEDIA_TYPES, PARQUET, EntityExporter, ExportUnavailable
+from app.services.notification_hub import NotificationHub, Subscriber
+from app.services.search_cache import SearchCache
+from app.utils.logger import get_logger
+from app.utils.metrics import WEBSOCKET_SEND
+from typing import Dict, List, Literal, Optional, Union
 import asyncio
 from dataclasses import asdict
+from datetime import date, datetime
 import json 
+import orjson
+import os
 
 
+logger = get_logger(__name__)
+
 search: APIRouter = APIRouter()
 
+MAX_PAGE_SIZE = 200
+MAX_STREAM_CHUNK_SIZE = 5000
+MAX_SUGGESTIONS = 50
+
+
+def serialize_page(page: SearchPage) -> str:
+    # orjson writes the dataclasses and dates itself, without asdict copies.
+    return orjson.dumps({
+        "entities": page.entities,
+        "next_cursor": page.next_cursor.encode() if page.next_cursor else None,
+    }).decode()
+
+
+def serialize_matches(page: Union[PersonPage, AddressPage]) -> bytes:
+    return orjson.dumps({
+        "matches": page.matches,
+        "next_cursor": page.next_cursor.encode() if page.next_cursor else None,
+    })
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[PageCursor]:
+    try:
+        return PageCursor.decode(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def require_party_term(q: str):
+    # Blank once normalized, a query would match every name or address.
+    if not normalize_party(q):
+        raise HTTPException(status_code=400, detail="q must contain more than whitespace")
+
+
+def stream_frame(search_term: str, chunk: int, rows: List[str]) -> str:
+    # Rows arrive as JSON text from Postgres and are only joined here.
+    return '{"search_term": ' + json.dumps(search_term) + ', "chunk": ' + str(chunk) + ', "entities": [' + ",".join(rows) + "]}"
+
+
+def stream_done_frame(search_term: str, count: int, truncated: bool) -> str:
+    return orjson.dumps({"search_term": search_term, "done": True, "count": count, "truncated": truncated}).decode()
+
+
+async def search_response(entity_dao: EntityDao, search_term: str, limit: int = 50, cursor: Optional[PageCursor] = None) -> str:
+    """Serialized results page, served from SearchCache when possible."""
+    async def load() -> str:
+        return serialize_page(await entity_dao.search(search_term, limit=limit, cursor=cursor))
+
+    body = await SearchCache().get(search_term, (limit, cursor.encode() if cursor else None), load)
+    # Cached bodies are shared across spellings of the term; prepend the one asked for.
+    return '{"search_term": ' + json.dumps(search_term) + ", " + body[1:]
+
+
+@search.get("/entities")
+async def search_entities(q: str = Query(..., min_length=1), limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    entity_dao: EntityDao = DB().entity_dao
+    return Response(content=await search_response(entity_dao, q, limit, decode_cursor(cursor)), media_type="application/json")
+
+
+@search.get("/cache/stats")
+async def cache_stats():
+    return asdict(SearchCache().stats)
+
+
+@search.get("/autocomplete")
+async def autocomplete(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    """Entity names starting with `q`, from memory; fetch a pick with GET /entities/{document_number}."""
+    index = AutocompleteIndex()
+    if not index.is_ready:
+        raise HTTPException(status_code=503, detail="The autocomplete index is loading")
+    return Response(content=orjson.dumps({"q": q, "suggestions": index.complete(q, limit)}), media_type="application/json")
+
+
+@search.get("/autocomplete/stats")
+async def autocomplete_stats():
+    return asdict(AutocompleteIndex().stats)
+
+
+@search.get("/entities/{document_number}")
+async def get_entity(document_number: str):
+    entity_dao: EntityDao = DB().entity_dao
+    entity = await entity_dao.get_by_document_number(document_number)
+    if entity is None:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    return Response(content=orjson.dumps(entity), media_type="application/json")
+
+
+@search.get("/persons")
+async def search_persons(
+        q: str = Query(..., min_length=1),
+        role: Optional[Literal["officer", "agent"]] = None,
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None):
+    """Entities a matching officer or registered agent appears on, one match per appearance."""
+    require_party_term(q)
+    party_dao: PartyDao = DB().party_dao
+    page = await party_dao.search_persons(q, role=role, limit=limit, cursor=decode_cursor(cursor))
+    return Response(content=serialize_matches(page), media_type="application/json")
+
+
+@search.get("/agents")
+async def search_agents(q: str = Query(..., min_length=1), limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    return await search_persons(q, role="agent", limit=limit, cursor=cursor)
+
+
+@search.get("/addresses")
+async def search_addresses(
+        q: str = Query(..., min_length=1),
+        kind: Optional[Literal["principal", "mailing", "registered_agent", "officer"]] = None,
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None):
+    """Entities using a matching principal, mailing, registered agent or officer address."""
+    require_party_term(q)
+    party_dao: PartyDao = DB().party_dao
+    page = await party_dao.search_addresses(q, kind=kind, limit=limit, cursor=decode_cursor(cursor))
+    return Response(content=serialize_matches(page), media_type="application/json")
+
+
+@search.get("/export")
+async def export_entities(
+        format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+        status: Optional[List[str]] = Query(None),
+        date_filed_from: Optional[date] = None,
+        date_filed_to: Optional[date] = None,
+        updated_since: Optional[datetime] = None,
+        gzip: bool = False):
+    """
+    Streams every matching entity with all columns. Repeat `status` to
+    allow several. With `updated_since` rows come in updated_at order, so
+    the last updated_at seen is where the next incremental pull starts.
+    """
+    if format == PARQUET and gzip:
+        raise HTTPException(status_code=400, detail="Parquet files are compressed internally; leave gzip off")
+    exporter = EntityExporter()
+    try:
+        exporter.check(format)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    filters = ExportFilter(status=status, date_filed_from=date_filed_from, date_filed_to=date_filed_to, updated_since=updated_since)
+    return StreamingResponse(
+        exporter.stream(DB().entity_dao, filters, format, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{exporter.filename(format, gzip)}"'},
+    )
+
+
 @search.websocket("/ws")
 async def ws(websocket: WebSocket): 
+    """
+    One connection watches any number of terms:
+        {"action": "subscribe", "search_term": ..., "stream": false, "chunk_size": 500}
+        {"action": "unsubscribe", "search_term": ...}
+        {"action": "more", "search_term": ..., "cursor": ...}
+    Every frame names its search_term. Results of each term are sent as they
+    load, so terms do not wait on each other. A new entity is sent once with
+    every term it matches, and "dropped" counts entities skipped because the
+    client fell behind. A message without "action" replaces all terms with
+    its search_term, as the single-term protocol did.
+    """
     entity_dao: EntityDao = DB().entity_dao
+    hub = NotificationHub()
     host = websocket.client.host
-    print("Websocket connected with: ", host)
-    current_search_term = ""
+    logger.info("Websocket connected with: %s", host)
+    subscriber = Subscriber(max_pending=int(os.getenv("WS_MAX_PENDING", "1000")))
+    max_terms = int(os.getenv("WS_MAX_TERMS", "100"))
+    loaders: Dict[str, asyncio.Task] = {}
+    send_mutex = asyncio.Lock()
+    sender: Optional[asyncio.Task] = None
     await websocket.accept()
+
+    async def send(message: str, text: str):
+        async with send_mutex:
+            with WEBSOCKET_SEND.labels(message).time():
+                await websocket.send_text(text)
+
     async def send_entities():
-        await entity_dao.register_notifier(current_search_term)
-        print("Registered notifier for ", current_search_term)
-        async for entity in entity_dao.listen(current_search_term):
-            await websocket.send_text(json.dumps({"search_term": current_search_term, "new_entity": asdict(entity)}, default=str))
+        # Compact payload; full details come from GET /entities/{document_number}.
+        while True:
+            delivery = await subscriber.get()
+            frame = {"search_term": delivery.search_terms[0], "search_terms": delivery.search_terms, "new_entity": delivery.notification}
+            if delivery.dropped:
+                frame["dropped"] = delivery.dropped
+            await send("new_entity", orjson.dumps(frame).decode())
+
+    async def stream_results(search_term: str, chunk_size: Optional[int]):
+        # Every match, a frame per chunk, then a done frame; no single
+        # message holds the whole result and the loop runs between frames.
+        chunk_size = max(1, min(int(chunk_size or os.getenv("WS_STREAM_CHUNK_SIZE", "500")), MAX_STREAM_CHUNK_SIZE))
+        max_rows = int(os.getenv("WS_STREAM_MAX_ROWS", "10000"))
+        count = 0
+        chunk = 0
+        truncated = False
+        # One row past the limit tells a truncated result from an exact fit.
+        chunks = entity_dao.stream_search(search_term, chunk_size, max_rows + 1)
+        try:
+            async for rows in chunks:
+                if count + len(rows) > max_rows:
+                    rows = rows[:max_rows - count]
+                    truncated = True
+                if rows:
+                    await send("stream", stream_frame(search_term, chunk, rows))
+                    count += len(rows)
+                    chunk += 1
+        finally:
+            # Unsubscribing cancels mid-stream; hand the connection back now.
+            await chunks.aclose()
+        await send("stream_done", stream_done_frame(search_term, count, truncated))
+
+    async def load_results(search_term: str, data: dict):
+        try:
+            if data.get("stream"):
+                await stream_results(search_term, data.get("chunk_size"))
+            elif data.get("cursor"):
+                # Next page; full details come from GET /entities/{document_number}.
+                await send("results", await search_response(entity_dao, search_term, cursor=PageCursor.decode(data["cursor"])))
+            else:
+                await send("results", await search_response(entity_dao, search_term))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Error loading results for %r: %r", search_term, e)
+            await send("error", orjson.dumps({"search_term": search_term, "error": str(e)}).decode())
+
+    def start_loading(search_term: str, data: dict):
+        key = hub.normalize(search_term)
+        previous = loaders.get(key)
+        if previous is not None:
+            previous.cancel()
+        loaders[key] = asyncio.create_task(load_results(search_term, data))
+        loaders[key].add_done_callback(lambda task: loaders.pop(key, None) if loaders.get(key) is task else None)
+
+    async def subscribe(search_term: str, data: dict):
+        if hub.normalize(search_term) not in subscriber.terms and len(subscriber.terms) >= max_terms:
+            await send("error", orjson.dumps({"search_term": search_term, "error": f"At most {max_terms} terms per connection"}).decode())
+            return
+        hub.add_term(subscriber, search_term)
+        start_loading(search_term, data)
+
+    def unsubscribe(search_term: str):
+        loader = loaders.pop(hub.normalize(search_term), None)
+        if loader is not None:
+            loader.cancel()
+        hub.remove_term(subscriber, search_term)
+
     try:
+        sender = asyncio.create_task(send_entities())
         while True:
             payload = await websocket.receive_json()
-            print("Received payload: ", payload)
-            data = json.loads(payload)
-            if current_search_term != data["search_term"]:
-                print("Changing search term from ", current_search_term, " to ", data["search_term"])
-                if current_search_term != "":
-                    await entity_dao.remove_notifier(current_search_term)
-                print("Removed notifier for ", current_search_term)
-                current_search_term = data["search_term"]
-                entities = await entity_dao.search(current_search_term)
-                print("Entities: ", entities)
-                await websocket.send_text(json.dumps({"search_term": current_search_term, "entities": [asdict(entity) for entity in entities]}, default=str))
-                asyncio.create_task(send_entities())
+            logger.debug("Received payload: %s", payload)
+            data = json.loads(payload) if isinstance(payload, str) else payload
+            search_term = data["search_term"]
+            action = data.get("action")
+            if action == "subscribe":
+                await subscribe(search_term, data)
+            elif action == "unsubscribe":
+                unsubscribe(search_term)
+                await send("unsubscribed", orjson.dumps({"search_term": search_term, "unsubscribed": True}).decode())
+            elif action == "more":
+                start_loading(search_term, data)
+            elif action is not None:
+                await send("error", orjson.dumps({"search_term": search_term, "error": f"Unknown action: {action}"}).decode())
+            elif hub.normalize(search_term) not in subscriber.terms or len(subscriber.terms) > 1:
+                logger.debug("Changing search terms from %r to %r", list(subscriber.terms.values()), search_term)
+                for term in list(subscriber.terms.values()):
+                    unsubscribe(term)
+                await subscribe(search_term, data)
+            elif data.get("cursor"):
+                start_loading(search_term, data)
     except WebSocketDisconnect as wsd:
-        print("Client disconnected: ", host)
+        logger.info("Client disconnected: %s", host)
     except Exception as e:
-        print("An error occurred", e)
+        logger.error("Websocket error with %s: %r", host, e)
     finally:
-        await entity_dao.remove_notifier(current_search_term)
-        await websocket.close()
\ No newline at end of file
+        if sender is not None:
+            sender.cancel()
+        for loader in list(loaders.values()):
+            loader.cancel()
+        hub.remove_subscriber(subscriber)
+        await websocket.close()
@@ -1,40 +1,76 @@
 import psycopg
 from psycopg.rows import dict_row, DictRow
+from psycopg_pool import AsyncConnectionPool
 from app.db.entity import IEntityDao
+from app.db.party import IPartyDao
 from app.models.entity import EntityDao
+from app.models.party import PartyDao
+from app.services.term_matcher import word_similarity_threshold
 from typing import Optional
-import asyncio
 import os
 from app.utils.singleton import Singleton
 
 
 class DB(metaclass=Singleton):
-    __conn: psycopg.AsyncConnection[DictRow] = None
-    __loop: Optional[asyncio.AbstractEventLoop] = None
+    __pool: Optional[AsyncConnectionPool] = None
+    # LISTEN is bound to a session, so notifications get their own
+    # long-lived connection instead of holding one out of the pool.
+    __listen_conn: Optional[psycopg.AsyncConnection[DictRow]] = None
+    __conn_str: Optional[str] = None
     is_connected: bool = False
 
     def __init__(self, conn_str: Optional[str] = None):
-        if self.__conn is None:
+        if self.__pool is None:
             if conn_str is None:
                 conn_str = os.getenv("DATABASE_URL")
             
     async def connect(self, conn_str: str):
         if not self.is_connected:
-            self.__conn = await psycopg.AsyncConnection.connect(conn_str, row_factory=dict_row)
+            self.__pool = AsyncConnectionPool(
+                conn_str,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                # The fuzzy searches and TermMatcher share this threshold.
+                kwargs={"row_factory": dict_row, "options": f"-c pg_trgm.word_similarity_threshold={word_similarity_threshold()}"},
+                # Connections are validated when leased, so dropped ones are replaced.
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await self.__pool.open(wait=True)
+            self.__conn_str = conn_str
+            self.__listen_conn = await self.__connect_listener()
             self.is_connected = True
 
+
+    async def __connect_listener(self) -> psycopg.AsyncConnection[DictRow]:
+        return await psycopg.AsyncConnection.connect(self.__conn_str, row_factory=dict_row, autocommit=True)
+
+
+    async def reconnect_listener(self):
+        """Replaces the LISTEN connection after it was dropped."""
+        if self.__listen_conn is not None and not self.__listen_conn.closed:
+            await self.__listen_conn.close()
+        self.__listen_conn = await self.__connect_listener()
+
     @property
     def entity_dao(self) -> EntityDao:
         if not self.is_connected:
             raise Exception("Database connection has not been established")
-        return IEntityDao(self.__conn)
+        return IEntityDao(self.__pool, self.__listen_conn)
+
+
+    @property
+    def party_dao(self) -> PartyDao:
+        if not self.is_connected:
+            raise Exception("Database connection has not been established")
+        return IPartyDao(self.__pool)
     
 
     async def dispose(self):
-        self.__conn.close()
-        self.__conn = None
-        Singleton.dispose()
-        self.__loop.stop()
-        while self.__loop.is_running():
-            await asyncio.sleep(0.1)
-        self.__loop.close()
\ No newline at end of file
+        await self.__listen_conn.close()
+        self.__listen_conn = None
+        await self.__pool.close()
+        self.__pool = None
+        self.is_connected = False
+        Singleton.dispose(DB)
@@ -1,101 +1,244 @@
 from psycopg import AsyncConnection
-from typing import List, Awaitable, AsyncIterator
-from app.models.entity import EntityDao, EntityDetail
-from psycopg.rows import DictRow
+from psycopg_pool import AsyncConnectionPool
+from typing import Any, AsyncGenerator, AsyncIterator, List, Optional
+from app.models.entity import EntityDao, EntityDetail, EntityNotification, EntitySummary, ExportFilter, PageCursor, SearchPage, EXPORT_COLUMNS, SUMMARY_COLUMNS
+from app.models.party import normalize_party
+from app.utils.logger import get_logger
+from app.utils.metrics import EXPORT_QUERY, SEARCH_QUERY
+from psycopg.rows import DictRow, tuple_row
+from dataclasses import fields
 import json
 
 
+logger = get_logger(__name__)
+
+NOTIFICATION_CHANNEL = "entity_details_inserted"
+NOTIFICATION_FIELDS = [field.name for field in fields(EntityNotification)]
+
+
+# A page reads matches in index order, never the whole match set: prefix
+# matches by normalized name from entity_details_entity_name_prefix_idx,
+# then names whose words are similar to the term, nearest first, from the
+# trigram GiST index (see migrations/0011). Names starting with the term
+# are those from the term up to its successor, bounds a prepared generic
+# plan can still scan between, unlike LIKE 'TERM%'. Each keyset starts
+# past the cursor, or at the term. Prefix matches rank 1, fuzzy matches
+# their word similarity.
+_PREFIX_MATCHES = """
+    SELECT
+        {columns},
+        1.0::float8 AS rank{keys}
+    FROM entity_details
+    WHERE (normalize_party(entity_name) COLLATE "C", id) > (%(after_text)s, %(after_id)s::int)
+        AND normalize_party(entity_name) COLLATE "C" < %(prefix_end)s
+    ORDER BY normalize_party(entity_name) COLLATE "C", id
+    LIMIT %(limit)s
+"""
+
+_FUZZY_MATCHES = """
+    SELECT
+        {columns},
+        (1 - (entity_name <->> %(term)s))::float8 AS rank{keys}
+    FROM entity_details
+    WHERE entity_name %%> %(term)s
+        AND NOT starts_with(normalize_party(entity_name), %(term)s)
+        AND (entity_name <->> %(term)s, id) > (%(after_distance)s::real, %(after_id)s::int)
+    ORDER BY entity_name <->> %(term)s, id
+    LIMIT %(limit)s
+"""
+
+# The sort keys a PageCursor is made of, selected for search pages only.
+_PREFIX_KEYS = """,
+        normalize_party(entity_name) AS sort_text,
+        NULL::real AS sort_distance"""
+
+_FUZZY_KEYS = """,
+        NULL::text AS sort_text,
+        entity_name <->> %(term)s AS sort_distance"""
+
+_SUMMARY_COLUMNS = ",\n        ".join(SUMMARY_COLUMNS)
+
+
+def _prefix_params(term: str) -> dict:
+    # Code point order is the byte order of UTF-8, so every text starting
+    # with `term` sorts before its last character's successor.
+    return {"term": term, "prefix_end": term[:-1] + chr(ord(term[-1]) + 1)}
+
+
+async def _fetch_matches(conn: AsyncConnection, prefix_sql: str, fuzzy_sql: str, term: str, limit: int, cursor: Optional[PageCursor], params: Optional[dict] = None) -> List[DictRow]:
+    """
+    Up to `limit` matches after `cursor`: prefix matches, then fuzzy ones
+    once those run out. Each query stops after the rows it returns, so a
+    page costs about the same however many rows match the term.
+    """
+    params = {**(params or {}), **_prefix_params(term)}
+    rows = []
+    async with conn.cursor() as cur:
+        if cursor is None or cursor.text is not None:
+            after = {"after_text": cursor.text if cursor else term, "after_id": cursor.id if cursor else 0}
+            await cur.execute(prefix_sql, {**params, **after, "limit": limit})
+            rows = await cur.fetchall()
+        if len(rows) < limit:
+            fuzzy = cursor is not None and cursor.distance is not None
+            after = {"after_distance": cursor.distance if fuzzy else -1.0, "after_id": cursor.id if fuzzy else 0}
+            await cur.execute(fuzzy_sql, {**params, **after, "limit": limit - len(rows)})
+            rows += await cur.fetchall()
+    return rows
+
+
+def _page_cursor(rows: List[DictRow], limit: int) -> Optional[PageCursor]:
+    """Takes the sort keys off `rows`; the cursor after the first `limit`, if more follow."""
+    cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        cursor = PageCursor(id=last["id"], text=last["sort_text"], distance=last["sort_distance"])
+    for row in rows:
+        del row["sort_text"], row["sort_distance"]
+    return cursor
+
+
+_JSON_COLUMNS = ("authorized_persons", "annual_reports", "document_images")
+
+
+def _export_query(filters: ExportFilter, as_json: bool) -> str:
+    # Only the filters in use reach the query, so the planner sees no
+    # "IS NULL OR" branches. Incremental pulls walk (updated_at, id), served
+    # by entity_details_updated_at_idx; full exports walk the primary key.
+    conditions = []
+    if filters.status:
+        conditions.append("status = ANY(%(status)s::text[])")
+    if filters.date_filed_from is not None:
+        conditions.append("date_filed >= %(date_filed_from)s::date")
+    if filters.date_filed_to is not None:
+        conditions.append("date_filed <= %(date_filed_to)s::date")
+    if filters.updated_since is not None:
+        conditions.append("updated_at >= %(updated_since)s::timestamptz")
+    if as_json:
+        select = "row_to_json(entity_details)::text"
+    else:
+        select = ", ".join(f"{column}::text" if column in _JSON_COLUMNS else column for column in EXPORT_COLUMNS)
+    return """
+SELECT {select}
+FROM (SELECT {columns} FROM entity_details) AS entity_details
+{where}
+ORDER BY {order};
+""".format(
+        select=select,
+        columns=", ".join(EXPORT_COLUMNS),
+        where="WHERE " + "\n    AND ".join(conditions) if conditions else "",
+        order="updated_at, id" if filters.updated_since is not None else "id",
+    )
+
+
 class IEntityDao(EntityDao):
-    def __init__(self, conn: AsyncConnection[DictRow]):
-        self.__conn = conn
-        self.__registered_search_terms = []
+    def __init__(self, pool: AsyncConnectionPool, listen_conn: AsyncConnection[DictRow]):
+        self.__pool = pool
+        self.__listen_conn = listen_conn
+
+
+    async def search(self, name: str, limit: int = 50, cursor: Optional[PageCursor] = None) -> SearchPage:
+        term = normalize_party(name)
+        if not term:
+            return SearchPage()
+        prefix_sql = _PREFIX_MATCHES.format(columns=_SUMMARY_COLUMNS, keys=_PREFIX_KEYS)
+        fuzzy_sql = _FUZZY_MATCHES.format(columns=_SUMMARY_COLUMNS, keys=_FUZZY_KEYS)
+        with SEARCH_QUERY.time():
+            async with self.__pool.connection() as conn:
+                # One row past the page tells whether another follows.
+                rows = await _fetch_matches(conn, prefix_sql, fuzzy_sql, term, limit + 1, cursor)
+        next_cursor = _page_cursor(rows, limit)
+        return SearchPage(entities=[EntitySummary(**row) for row in rows[:limit]], next_cursor=next_cursor)
+
+
+    async def stream_search(self, name: str, chunk_size: int = 500, max_rows: Optional[int] = None) -> AsyncGenerator[List[str], None]:
+        # Postgres renders each row as JSON text, so rows reach the socket
+        # without becoming Python objects, and the named cursor holds only
+        # one chunk at a time in this process. Prefix matches stream first,
+        # then fuzzy ones up to what is left of max_rows.
+        term = normalize_party(name)
+        if not term:
+            return
+        params = {**_prefix_params(term), "after_text": term, "after_distance": -1.0, "after_id": 0}
+        remaining = max_rows
+        async with self.__pool.connection() as conn:
+            for matches in (_PREFIX_MATCHES, _FUZZY_MATCHES):
+                sql = "SELECT row_to_json(matches)::text FROM ({matches}) AS matches;".format(
+                    matches=matches.format(columns=_SUMMARY_COLUMNS, keys=""),
+                )
+                async with conn.cursor(name="stream_search", row_factory=tuple_row) as cur:
+                    with SEARCH_QUERY.time():
+                        await cur.execute(sql, {**params, "limit": remaining})
+                        rows = await cur.fetchmany(chunk_size)
+                    while rows:
+                        yield [row[0] for row in rows]
+                        if remaining is not None:
+                            remaining -= len(rows)
+                        rows = await cur.fetchmany(chunk_size)
+                if remaining == 0:
+                    return
+
 
+    async def export(self, filters: ExportFilter, batch_size: int = 5000, as_json: bool = False) -> AsyncGenerator[List[Any], None]:
+        # A named cursor keeps the result on the server; this process holds
+        # one batch at a time however many rows match.
+        params = {
+            "status": filters.status,
+            "date_filed_from": filters.date_filed_from,
+            "date_filed_to": filters.date_filed_to,
+            "updated_since": filters.updated_since,
+        }
+        async with self.__pool.connection() as conn, conn.cursor(name="export", row_factory=tuple_row) as cur:
+            with EXPORT_QUERY.time():
+                await cur.execute(_export_query(filters, as_json), params)
+                rows = await cur.fetchmany(batch_size)
+            while rows:
+                yield [row[0] for row in rows] if as_json else rows
+                rows = await cur.fetchmany(batch_size)
 
-    async def search(self, name: str) -> List[EntityDetail]:
+
+    async def autocomplete_names(self, batch_size: int = 50000) -> AsyncGenerator[List[tuple], None]:
+        # Sorted by Postgres in byte order ("C"), the order AutocompleteIndex
+        # searches, so the index is built without sorting in this process.
+        sql = """
+SELECT id, document_number, name
+FROM (SELECT id, document_number, normalize_party(entity_name) AS name FROM entity_details) AS names
+WHERE name IS NOT NULL AND document_number IS NOT NULL
+ORDER BY name COLLATE "C", document_number COLLATE "C";
+"""
+        async with self.__pool.connection() as conn, conn.cursor(name="autocomplete_names", row_factory=tuple_row) as cur:
+            await cur.execute(sql)
+            rows = await cur.fetchmany(batch_size)
+            while rows:
+                yield rows
+                rows = await cur.fetchmany(batch_size)
+
+
+    async def get_by_document_number(self, document_number: str) -> Optional[EntityDetail]:
         sql = """
 SELECT
-    id,
-    entity_type,
-    entity_name,
-    document_number,
-    fe_ein_number,
-    date_filed,
-    effective_date,
-    state,
-    status,
-    principal_address,
-    principal_address_changed,
-    mailing_address,
-    mailing_address_changed,
-    registered_agent_name,
-    registered_agent_address,
-    registered_agent_address_changed,
+    {columns},
     authorized_persons,
     annual_reports,
-    document_images,
-    created_at,
-    updated_at
+    document_images
 FROM entity_details
-WHERE entity_name ILIKE %s
-ORDER BY created_at DESC;
-"""
+WHERE document_number = %s;
+""".format(columns=",\n    ".join(SUMMARY_COLUMNS))
 
-        wildcard = f"%{name}%"
-        async with self.__conn.cursor() as cur:
-            await cur.execute(sql, (wildcard,))
-            rows = await cur.fetchall()
-            return [EntityDetail(**row) for row in rows]
-        
-
-    async def register_notifier(self, search_term: str) -> None:
-        term = '_'.join(search_term.lower().split(' '))
-        create_notifier_function = f"""
-CREATE OR REPLACE FUNCTION notify_{term}_search() 
-RETURNS TRIGGER LANGUAGE plpgsql AS $$
-BEGIN
-    PERFORM pg_notify('entity_{term}_changes', row_to_json(NEW)::text);
-    RETURN NEW;
-END;
-$$"""
-        
-        create_trigger = f"""
-CREATE OR REPLACE TRIGGER {term}_search_notifier
-AFTER INSERT ON entity_details FOR EACH ROW
-WHEN (NEW.entity_name ILIKE '%{search_term}%')
-EXECUTE FUNCTION notify_{term}_search();"""
-        
-        async with self.__conn.cursor() as cur:
-            await cur.execute(create_notifier_function)
-            await cur.execute(create_trigger)
-            self.__registered_search_terms.append(search_term)
-        await self.__conn.commit()
-        
-
-    async def remove_notifier(self, search_term: str) -> None:
-        term = '_'.join(search_term.lower().split(' '))
-        drop_trigger = f"DROP TRIGGER IF EXISTS {term}_search_notifier ON entity_details;"
-        drop_function = f"DROP FUNCTION IF EXISTS notify_{term}_search();"
-        async with self.__conn.cursor() as cur:
-            await cur.execute(drop_trigger)
-            await cur.execute(drop_function)
-            self.__registered_search_terms.remove(search_term)
-        await self.__conn.commit()
-
-    
-    async def listen(self, search_term: str) -> AsyncIterator[EntityDetail]:
-        term = '_'.join(search_term.lower().split(' '))
-        async with self.__conn.cursor() as cur:
-            await cur.execute(f"LISTEN entity_{term}_changes;")
-        await self.__conn.commit()
-        print("Created listener for: ", search_term)
-        generator = self.__conn.notifies()
-        async for msg in generator:
-            print("Received message: ", msg)
-            if search_term in self.__registered_search_terms:
-                yield EntityDetail(**json.loads(msg.payload))
-            else:
-                await generator.aclose()
-        async with self.__conn.cursor() as cur:
-            await cur.execute(f"UNLISTEN entity_{term}_changes;")
-        await self.__conn.commit()
-        print("Listener removed for: ", search_term)
\ No newline at end of file
+        async with self.__pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, (document_number,))
+            row = await cur.fetchone()
+            return EntityDetail(**row) if row else None
+
+
+    async def listen(self) -> AsyncIterator[EntityNotification]:
+        async with self.__listen_conn.cursor() as cur:
+            await cur.execute(f"LISTEN {NOTIFICATION_CHANNEL};")
+        logger.info("Listening on %s", NOTIFICATION_CHANNEL)
+        try:
+            async for msg in self.__listen_conn.notifies():
+                row = json.loads(msg.payload)
+                yield EntityNotification(**{name: row.get(name) for name in NOTIFICATION_FIELDS})
+        finally:
+            if not self.__listen_conn.closed:
+                async with self.__listen_conn.cursor() as cur:
+                    await cur.execute(f"UNLISTEN {NOTIFICATION_CHANNEL};")
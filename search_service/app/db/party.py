@@ -0,0 +1,133 @@
+from psycopg_pool import AsyncConnectionPool
+from typing import Optional
+from app.db.entity import _fetch_matches, _page_cursor
+from app.models.entity import PageCursor
+from app.models.party import AddressMatch, AddressPage, PartyDao, PersonMatch, PersonPage, normalize_party
+from app.utils.metrics import PARTY_QUERY
+
+
+# Matches are read like entity names, a page at a time in index order:
+# links of names starting with the term, by name, then links of similar
+# names, nearest first (see migrations/0013). persons and addresses hold
+# each text once, so the index walks distinct texts and each brings its
+# few links; link ids break ties. The explicit lower bound lets the
+# btree start at the cursor, which the row comparison over two tables
+# cannot.
+_PERSON_COLUMNS = """
+        links.id,
+        persons.name,
+        links.role,
+        links.title,
+        entity.id AS entity_id,
+        entity.document_number,
+        entity.entity_name,
+        entity.status"""
+
+_PERSON_LINKS = """
+    FROM persons
+    JOIN entity_persons AS links ON links.person_id = persons.id
+    JOIN entity_details AS entity ON entity.id = links.entity_id"""
+
+_PERSON_PREFIX_MATCHES = """
+    SELECT
+        {columns},
+        1.0::float8 AS rank,
+        persons.name AS sort_text,
+        NULL::real AS sort_distance
+    {links}
+    WHERE persons.name COLLATE "C" >= %(after_text)s
+        AND (persons.name COLLATE "C", links.id) > (%(after_text)s, %(after_id)s::bigint)
+        AND persons.name COLLATE "C" < %(prefix_end)s
+        AND (%(role)s::text IS NULL OR links.role = %(role)s::text)
+    ORDER BY persons.name COLLATE "C", links.id
+    LIMIT %(limit)s
+""".format(columns=_PERSON_COLUMNS, links=_PERSON_LINKS)
+
+_PERSON_FUZZY_MATCHES = """
+    SELECT
+        {columns},
+        (1 - (persons.name <->> %(term)s))::float8 AS rank,
+        NULL::text AS sort_text,
+        persons.name <->> %(term)s AS sort_distance
+    {links}
+    WHERE persons.name %%> %(term)s
+        AND NOT starts_with(persons.name, %(term)s)
+        AND (persons.name <->> %(term)s, links.id) > (%(after_distance)s::real, %(after_id)s::bigint)
+        AND (%(role)s::text IS NULL OR links.role = %(role)s::text)
+    ORDER BY persons.name <->> %(term)s, links.id
+    LIMIT %(limit)s
+""".format(columns=_PERSON_COLUMNS, links=_PERSON_LINKS)
+
+_ADDRESS_COLUMNS = """
+        links.id,
+        addresses.address,
+        links.kind,
+        entity.id AS entity_id,
+        entity.document_number,
+        entity.entity_name,
+        entity.status"""
+
+_ADDRESS_LINKS = """
+    FROM addresses
+    JOIN entity_addresses AS links ON links.address_id = addresses.id
+    JOIN entity_details AS entity ON entity.id = links.entity_id"""
+
+_ADDRESS_PREFIX_MATCHES = """
+    SELECT
+        {columns},
+        1.0::float8 AS rank,
+        addresses.address AS sort_text,
+        NULL::real AS sort_distance
+    {links}
+    WHERE addresses.address COLLATE "C" >= %(after_text)s
+        AND (addresses.address COLLATE "C", links.id) > (%(after_text)s, %(after_id)s::bigint)
+        AND addresses.address COLLATE "C" < %(prefix_end)s
+        AND (%(kind)s::text IS NULL OR links.kind = %(kind)s::text)
+    ORDER BY addresses.address COLLATE "C", links.id
+    LIMIT %(limit)s
+""".format(columns=_ADDRESS_COLUMNS, links=_ADDRESS_LINKS)
+
+_ADDRESS_FUZZY_MATCHES = """
+    SELECT
+        {columns},
+        (1 - (addresses.address <->> %(term)s))::float8 AS rank,
+        NULL::text AS sort_text,
+        addresses.address <->> %(term)s AS sort_distance
+    {links}
+    WHERE addresses.address %%> %(term)s
+        AND NOT starts_with(addresses.address, %(term)s)
+        AND (addresses.address <->> %(term)s, links.id) > (%(after_distance)s::real, %(after_id)s::bigint)
+        AND (%(kind)s::text IS NULL OR links.kind = %(kind)s::text)
+    ORDER BY addresses.address <->> %(term)s, links.id
+    LIMIT %(limit)s
+""".format(columns=_ADDRESS_COLUMNS, links=_ADDRESS_LINKS)
+
+
+class IPartyDao(PartyDao):
+    def __init__(self, pool: AsyncConnectionPool):
+        self.__pool = pool
+
+
+    async def __fetch_page(self, table: str, prefix_sql: str, fuzzy_sql: str, term: str, limit: int, cursor: Optional[PageCursor], params: dict) -> list:
+        with PARTY_QUERY.labels(table).time():
+            async with self.__pool.connection() as conn:
+                # One row past the page tells whether another follows.
+                return await _fetch_matches(conn, prefix_sql, fuzzy_sql, term, limit + 1, cursor, params)
+
+
+    async def search_persons(self, name: str, role: Optional[str] = None, limit: int = 50, cursor: Optional[PageCursor] = None) -> PersonPage:
+        term = normalize_party(name)
+        if not term:
+            return PersonPage()
+        rows = await self.__fetch_page("persons", _PERSON_PREFIX_MATCHES, _PERSON_FUZZY_MATCHES, term, limit, cursor, {"role": role})
+        next_cursor = _page_cursor(rows, limit)
+        return PersonPage(matches=[PersonMatch(**row) for row in rows[:limit]], next_cursor=next_cursor)
+
+
+    async def search_addresses(self, address: str, kind: Optional[str] = None, limit: int = 50, cursor: Optional[PageCursor] = None) -> AddressPage:
+        term = normalize_party(address)
+        if not term:
+            return AddressPage()
+        rows = await self.__fetch_page("addresses", _ADDRESS_PREFIX_MATCHES, _ADDRESS_FUZZY_MATCHES, term, limit, cursor, {"kind": kind})
+        next_cursor = _page_cursor(rows, limit)
+        return AddressPage(matches=[AddressMatch(**row) for row in rows[:limit]], next_cursor=next_cursor)
@@ -1,7 +1,9 @@
 from dataclasses import dataclass, field
-from datetime import date
-from typing import List, Optional, Any, AsyncIterator
+from datetime import date, datetime
+from typing import List, Optional, Any, AsyncGenerator, AsyncIterator
 from abc import ABC, abstractmethod
+import base64
+import json
 
 
 @dataclass
@@ -38,19 +40,137 @@ class EntityDetail:
     updated_at: Optional[str] = None
 
 
+# Every scalar column; the JSONB lists are only loaded for a single entity.
+SUMMARY_COLUMNS = (
+    "id",
+    "entity_type",
+    "entity_name",
+    "document_number",
+    "fe_ein_number",
+    "date_filed",
+    "effective_date",
+    "state",
+    "status",
+    "principal_address",
+    "principal_address_changed",
+    "mailing_address",
+    "mailing_address_changed",
+    "registered_agent_name",
+    "registered_agent_address",
+    "registered_agent_address_changed",
+    "created_at",
+    "updated_at",
+)
+
+
+# Every column an export writes, in order; the JSONB lists come last.
+EXPORT_COLUMNS = SUMMARY_COLUMNS + ("authorized_persons", "annual_reports", "document_images")
+
+
+@dataclass
+class ExportFilter:
+    """Restricts an export; unset fields do not filter. updated_since also orders the export by updated_at."""
+    status: Optional[List[str]] = None
+    date_filed_from: Optional[date] = None
+    date_filed_to: Optional[date] = None
+    updated_since: Optional[datetime] = None
+
+
+@dataclass
+class EntitySummary:
+    id: Optional[int] = None
+    entity_type: Optional[str] = None
+    entity_name: Optional[str] = None
+    document_number: Optional[str] = None
+    fe_ein_number: Optional[str] = None
+
+    date_filed: Optional[date] = None
+    effective_date: Optional[date] = None
+    state: Optional[str] = None
+    status: Optional[str] = None
+
+    principal_address: Optional[str] = None
+    principal_address_changed: Optional[date] = None
+    mailing_address: Optional[str] = None
+    mailing_address_changed: Optional[date] = None
+
+    registered_agent_name: Optional[str] = None
+    registered_agent_address: Optional[str] = None
+    registered_agent_address_changed: Optional[date] = None
+
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    rank: Optional[float] = None
+
+
+@dataclass
+class PageCursor:
+    """
+    Where a page of matches ended. Prefix matches come first, in byte order
+    of the normalized text, then fuzzy matches by trigram distance; the last
+    row's `text` or `distance` is set accordingly, and `id` breaks ties.
+    """
+    id: int
+    text: Optional[str] = None
+    distance: Optional[float] = None
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(json.dumps([self.id, self.text, self.distance]).encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "PageCursor":
+        try:
+            id, text, distance = json.loads(base64.urlsafe_b64decode(token.encode()))
+            if (text is None) == (distance is None):
+                raise ValueError("exactly one of text and distance is set")
+            return cls(id=int(id), text=None if text is None else str(text), distance=None if distance is None else float(distance))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid search cursor: {token}") from e
+
+
+@dataclass
+class EntityNotification:
+    """Compact payload published on the entity_details_inserted channel."""
+    id: Optional[int] = None
+    document_number: Optional[str] = None
+    entity_name: Optional[str] = None
+
+
+@dataclass
+class SearchPage:
+    entities: List[EntitySummary] = field(default_factory=list)
+    next_cursor: Optional[PageCursor] = None
+
+
 class EntityDao(ABC):
     @abstractmethod
-    async def search(self, search_term: str) -> List[EntityDetail]:
+    async def search(self, search_term: str, limit: int = 50, cursor: Optional[PageCursor] = None) -> SearchPage:
+        """Names starting with the normalized term, then names similar to it; see migrations/0011."""
+        pass
+
+    @abstractmethod
+    def stream_search(self, search_term: str, chunk_size: int = 500, max_rows: Optional[int] = None) -> AsyncGenerator[List[str], None]:
+        """Every match in search order, as chunks of JSON-encoded EntitySummary rows."""
+        pass
+
+    @abstractmethod
+    def export(self, filters: ExportFilter, batch_size: int = 5000, as_json: bool = False) -> AsyncGenerator[List[Any], None]:
+        """
+        Every matching entity with all EXPORT_COLUMNS, in batches of
+        `batch_size` rows: JSON text per row with `as_json`, else tuples
+        with the JSONB lists as JSON text.
+        """
         pass
 
     @abstractmethod
-    async def register_notifier(self, search_term: str) -> None:
+    def autocomplete_names(self, batch_size: int = 50000) -> AsyncGenerator[List[tuple], None]:
+        """(id, document_number, normalized name) of every named entity in AutocompleteIndex order, in batches."""
         pass
 
     @abstractmethod
-    async def remove_notifier(self, search_term: str) -> None:
+    async def get_by_document_number(self, document_number: str) -> Optional[EntityDetail]:
         pass
 
     @abstractmethod
-    async def listen(self, search_term: str) -> AsyncIterator[EntityDetail]:
+    async def listen(self) -> AsyncIterator[EntityNotification]:
         pass
\ No newline at end of file
@@ -0,0 +1,58 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+from abc import ABC, abstractmethod
+from app.models.entity import PageCursor
+
+
+@dataclass
+class PersonMatch:
+    """One appearance of a matching person or registered agent on an entity."""
+    id: int
+    name: str
+    role: str
+    title: str
+    entity_id: int
+    document_number: Optional[str] = None
+    entity_name: Optional[str] = None
+    status: Optional[str] = None
+    rank: Optional[float] = None
+
+
+@dataclass
+class AddressMatch:
+    """One use of a matching address by an entity."""
+    id: int
+    address: str
+    kind: str
+    entity_id: int
+    document_number: Optional[str] = None
+    entity_name: Optional[str] = None
+    status: Optional[str] = None
+    rank: Optional[float] = None
+
+
+@dataclass
+class PersonPage:
+    matches: List[PersonMatch] = field(default_factory=list)
+    next_cursor: Optional[PageCursor] = None
+
+
+@dataclass
+class AddressPage:
+    matches: List[AddressMatch] = field(default_factory=list)
+    next_cursor: Optional[PageCursor] = None
+
+
+def normalize_party(value: str) -> str:
+    """The spelling persons and addresses are stored in; see normalize_party() in migrations/0009."""
+    return " ".join(value.split()).upper()
+
+
+class PartyDao(ABC):
+    @abstractmethod
+    async def search_persons(self, name: str, role: Optional[str] = None, limit: int = 50, cursor: Optional[PageCursor] = None) -> PersonPage:
+        pass
+
+    @abstractmethod
+    async def search_addresses(self, address: str, kind: Optional[str] = None, limit: int = 50, cursor: Optional[PageCursor] = None) -> AddressPage:
+        pass
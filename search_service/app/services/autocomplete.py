@@ -0,0 +1,296 @@
+from app.models.entity import EntityNotification
+from app.models.party import normalize_party
+from app.utils.logger import get_logger
+from app.utils.singleton import Singleton
+from array import array
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+import asyncio
+import bisect
+import os
+import sys
+import time
+
+
+logger = get_logger(__name__)
+
+# A record is NAME \0 DOCUMENT_NUMBER \n. Both bytes sort below every
+# character of a normalized name, so records order by name, then number.
+_SEPARATOR = b"\0"
+_TERMINATOR = b"\n"
+# Every FENCE_EVERY-th record is also kept as a bytes object, so a lookup
+# narrows to one block with C bisect before comparing packed records.
+FENCE_EVERY = 64
+
+
+@dataclass
+class Suggestion:
+    name: str
+    document_number: str
+    id: int
+
+
+@dataclass
+class AutocompleteStats:
+    ready: bool
+    entries: int
+    pending: int
+    bytes: int
+    build_seconds: Optional[float]
+    built_at: Optional[float]
+    loads: int
+
+
+def _record(name: str, document_number: str) -> bytes:
+    return name.encode() + _SEPARATOR + document_number.encode()
+
+
+class _Names:
+    """
+    Sorted records packed into one buffer, with their end offsets and
+    entity ids in typed arrays: about the UTF-8 size of the names and
+    numbers plus 8 bytes per entity, instead of a few Python objects each.
+    """
+
+    def __init__(self, blob: bytearray, offsets: array, ids: array):
+        self.__blob = blob
+        self.__offsets = offsets
+        self.ids = ids
+        self.__fences = [self.record(i) for i in range(0, len(ids), FENCE_EVERY)]
+
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+    @property
+    def nbytes(self) -> int:
+        fences = sys.getsizeof(self.__fences) + sum(sys.getsizeof(fence) for fence in self.__fences)
+        return sys.getsizeof(self.__blob) + sys.getsizeof(self.__offsets) + sys.getsizeof(self.ids) + fences
+
+
+    def record(self, i: int) -> bytes:
+        return bytes(self.__blob[self.__offsets[i]:self.__offsets[i + 1]])
+
+
+    def lower_bound(self, key: bytes) -> int:
+        """Position of the first record not below `key`."""
+        blob, offsets = self.__blob, self.__offsets
+        fence = bisect.bisect_left(self.__fences, key)
+        low = (fence - 1) * FENCE_EVERY + 1 if fence else 0
+        high = min(fence * FENCE_EVERY, len(self.ids))
+        while low < high:
+            middle = (low + high) // 2
+            if blob[offsets[middle]:offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+    def scan(self, key: bytes, limit: int) -> List[Tuple[str, int]]:
+        """Up to `limit` (record, id) starting with `key`; the records are read and decoded in one piece."""
+        start = self.lower_bound(key)
+        end = min(start + limit, len(self.ids))
+        records = self.__blob[self.__offsets[start]:self.__offsets[end]].decode().split("\n")
+        prefix = key.decode()
+        found = []
+        for position in range(start, end):
+            record = records[position - start]
+            if not record.startswith(prefix):
+                break
+            found.append((record, self.ids[position]))
+        return found
+
+
+class _NamesBuilder:
+    """Packs records as they stream in; sorts once at the end only if they arrived out of order."""
+
+    def __init__(self):
+        self.__blob = bytearray()
+        self.__offsets = array("I", [0])
+        self.__ids = array("i")
+        self.__last = b""
+        self.__sorted = True
+
+
+    def add(self, name: str, document_number: str, id: int):
+        record = _record(name, document_number)
+        if record < self.__last:
+            self.__sorted = False
+        self.__last = record
+        self.__blob += record
+        self.__blob += _TERMINATOR
+        self.__offsets.append(len(self.__blob))
+        self.__ids.append(id)
+
+
+    def build(self) -> _Names:
+        if self.__sorted:
+            return _Names(self.__blob, self.__offsets, self.__ids)
+        # The database sorts in its own collation; fall back to byte order here.
+        logger.warning("Autocomplete names arrived unsorted; sorting %d in memory", len(self.__ids))
+        records = bytes(self.__blob).split(_TERMINATOR)[:-1]
+        builder = _NamesBuilder()
+        for i in sorted(range(len(records)), key=records.__getitem__):
+            name, document_number = records[i].split(_SEPARATOR, 1)
+            builder.add(name.decode(), document_number.decode(), self.__ids[i])
+        return builder.build()
+
+
+class AutocompleteIndex(metaclass=Singleton):
+    """
+    In-memory prefix index of entity names for autocomplete. It is loaded
+    from entity_details at startup in streamed batches, already in index
+    order, so a build holds nothing but the index itself. Names inserted
+    since then are announced on the notification channel and kept in a
+    small sorted pending list, searched alongside. Every
+    `rebuild_interval` seconds, or once `max_pending` names are pending,
+    the index is rebuilt in the background and swapped in; that also picks
+    up renamed and deleted entities, which are not announced. A query
+    binary-searches the packed records and reads at most `limit` after
+    the match, so it takes microseconds at any corpus size. Names match
+    in normalize_party() form: trimmed, single-spaced, upper case.
+    """
+
+    def __init__(self, batch_size: int = 50000, rebuild_interval: float = 86400.0, max_pending: int = 100000, retry_delay: float = 30.0):
+        self.__batch_size = batch_size
+        self.__rebuild_interval = rebuild_interval
+        self.__retry_delay = retry_delay
+        self.__max_pending = max_pending
+        self.__names = _NamesBuilder().build()
+        # (record, id) of names announced since the index was loaded, sorted.
+        self.__pending: List[Tuple[bytes, int]] = []
+        # Names announced while a rebuild runs; they become the new pending list.
+        self.__arrivals: Optional[List[Tuple[bytes, int]]] = None
+        self.__load: Optional[Callable[[int], AsyncIterator[List[tuple]]]] = None
+        self.__loader: Optional[asyncio.Task] = None
+        self.__rebuild_requested = asyncio.Event()
+        self.is_ready = False
+        self.build_seconds: Optional[float] = None
+        self.built_at: Optional[float] = None
+        self.loads = 0
+
+
+    @classmethod
+    def from_env(cls) -> "AutocompleteIndex":
+        return cls(
+            batch_size=int(os.getenv("AUTOCOMPLETE_BATCH_SIZE", "50000")),
+            rebuild_interval=float(os.getenv("AUTOCOMPLETE_REBUILD_INTERVAL", "86400")),
+            max_pending=int(os.getenv("AUTOCOMPLETE_MAX_PENDING", "100000")),
+        )
+
+
+    def __len__(self) -> int:
+        return len(self.__names) + len(self.__pending)
+
+
+    @property
+    def stats(self) -> AutocompleteStats:
+        return AutocompleteStats(
+            ready=self.is_ready,
+            entries=len(self.__names),
+            pending=len(self.__pending),
+            bytes=self.__names.nbytes,
+            build_seconds=self.build_seconds,
+            built_at=self.built_at,
+            loads=self.loads,
+        )
+
+
+    async def build(self, batches: AsyncIterator[List[tuple]]):
+        """Loads the index from (id, document_number, normalized name) batches and swaps it in."""
+        self.__arrivals = []
+        start = time.perf_counter()
+        builder = _NamesBuilder()
+        try:
+            async for rows in batches:
+                for id, document_number, name in rows:
+                    builder.add(name, document_number, id)
+            names = builder.build()
+        except BaseException:
+            self.__arrivals = None
+            raise
+        # Names announced before the load began are in it; later ones may not be.
+        self.__names, self.__pending, self.__arrivals = names, sorted(self.__arrivals), None
+        self.build_seconds = time.perf_counter() - start
+        self.built_at = time.time()
+        self.is_ready = True
+        logger.info("Autocomplete index loaded %d names (%.1f MB) in %.1fs", len(names), names.nbytes / 1e6, self.build_seconds)
+
+
+    def on_entity_inserted(self, notification: EntityNotification):
+        """NotificationHub observer."""
+        name = normalize_party(notification.entity_name or "")
+        if not name or not notification.document_number:
+            return
+        entry = (_record(name, notification.document_number), notification.id or 0)
+        bisect.insort(self.__pending, entry)
+        if self.__arrivals is not None:
+            self.__arrivals.append(entry)
+        if len(self.__pending) >= self.__max_pending:
+            self.__rebuild_requested.set()
+
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """The first `limit` names starting with `prefix`, in name order."""
+        key = normalize_party(prefix).encode()
+        if not key:
+            return []
+        pending = self.__pending
+        i = bisect.bisect_left(pending, (key,))
+        added = []
+        while i < len(pending) and len(added) < limit and pending[i][0].startswith(key):
+            added.append((pending[i][0].decode(), pending[i][1]))
+            i += 1
+        # A pending name may also be indexed already; read past the duplicates.
+        found = self.__names.scan(key, limit + len(added))
+        if added:
+            # Code point order is the records' byte order.
+            found = sorted(dict(found + added).items())[:limit]
+        suggestions = []
+        for record, id in found:
+            name, document_number = record.split("\0", 1)
+            suggestions.append(Suggestion(name=name, document_number=document_number, id=id))
+        return suggestions
+
+
+    def start(self, load: Callable[[int], AsyncIterator[List[tuple]]]):
+        """Loads the index in the background and rebuilds it as configured; `load(batch_size)` streams the names."""
+        self.__load = load
+        if self.__loader is None:
+            self.__loader = asyncio.create_task(self.__maintain())
+
+
+    async def __maintain(self):
+        while True:
+            failed = False
+            try:
+                await self.build(self.__load(self.__batch_size))
+                self.loads += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error loading the autocomplete index: %r", e)
+                failed = True
+            self.__rebuild_requested.clear()
+            if failed:
+                # Keeps serving the previous index, if any, until a load succeeds.
+                timeout = self.__retry_delay
+            else:
+                timeout = self.__rebuild_interval if self.__rebuild_interval > 0 else None
+            try:
+                await asyncio.wait_for(self.__rebuild_requested.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def stop(self):
+        if self.__loader is not None:
+            self.__loader.cancel()
+            try:
+                await self.__loader
+            except asyncio.CancelledError:
+                pass
+            self.__loader = None
+        Singleton.dispose(AutocompleteIndex)
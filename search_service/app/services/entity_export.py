@@ -0,0 +1,192 @@
+from app.models.entity import EXPORT_COLUMNS, EntityDao, ExportFilter
+from app.utils.metrics import EXPORTED_ROWS
+from app.utils.singleton import Singleton
+from typing import Any, AsyncIterator, List
+import csv
+import io
+import os
+import zlib
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+NDJSON = "ndjson"
+CSV = "csv"
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def _parquet_schema() -> "pyarrow.Schema":
+    types = {
+        "id": pyarrow.int32(),
+        "created_at": pyarrow.timestamp("us", tz="UTC"),
+        "updated_at": pyarrow.timestamp("us", tz="UTC"),
+    }
+    for column in EXPORT_COLUMNS:
+        if column == "date_filed" or column == "effective_date" or column.endswith("_changed"):
+            types[column] = pyarrow.date32()
+    # The JSONB lists are written as JSON text, as in the CSV export.
+    return pyarrow.schema([(column, types.get(column, pyarrow.string())) for column in EXPORT_COLUMNS])
+
+
+class _ParquetSink:
+    """
+    A write-only file for ParquetWriter that hands out what was written so
+    far. The writer only appends and asks for its position, so each row
+    group can be sent on as soon as it is complete.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+        self.__position = 0
+        self.closed = False
+
+
+    def write(self, data) -> int:
+        self.__buffer += data
+        self.__position += len(data)
+        return len(data)
+
+
+    def tell(self) -> int:
+        return self.__position
+
+
+    def writable(self) -> bool:
+        return True
+
+
+    def seekable(self) -> bool:
+        return False
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        self.closed = True
+
+
+    def take(self) -> bytes:
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        return data
+
+
+async def _ndjson(batches: AsyncIterator[List[str]]) -> AsyncIterator[bytes]:
+    # Postgres already rendered each row as JSON text.
+    async for rows in batches:
+        EXPORTED_ROWS.labels(NDJSON).inc(len(rows))
+        yield ("\n".join(rows) + "\n").encode()
+
+
+async def _csv(batches: AsyncIterator[List[Any]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in batches:
+        writer.writerows(rows)
+        EXPORTED_ROWS.labels(CSV).inc(len(rows))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _parquet(batches: AsyncIterator[List[Any]]) -> AsyncIterator[bytes]:
+    # One row group per batch; only the footer waits for the end.
+    schema = _parquet_schema()
+    sink = _ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            EXPORTED_ROWS.labels(PARQUET).inc(len(rows))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+async def _gzipped(chunks: AsyncIterator[bytes], level: int) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class EntityExporter(metaclass=Singleton):
+    """
+    Streams entity_details as NDJSON, CSV or Parquet, optionally gzipped.
+    Rows come from a server-side cursor `batch_size` at a time and each
+    batch is encoded and sent before the next is fetched, so memory stays
+    flat from a thousand rows to millions, and a slow client slows the
+    cursor down instead of buffering. An export holds a pooled connection
+    until it ends, so at most `max_running` run at once.
+    """
+
+    def __init__(self, batch_size: int = 5000, max_running: int = 2, gzip_level: int = 6):
+        self.batch_size = batch_size
+        self.max_running = max_running
+        self.__gzip_level = gzip_level
+        self.running = 0
+
+
+    @classmethod
+    def from_env(cls) -> "EntityExporter":
+        return cls(
+            batch_size=int(os.getenv("EXPORT_BATCH_SIZE", "5000")),
+            max_running=int(os.getenv("EXPORT_MAX_RUNNING", "2")),
+            gzip_level=int(os.getenv("EXPORT_GZIP_LEVEL", "6")),
+        )
+
+
+    def check(self, format: str):
+        """Raises ExportUnavailable when the export cannot start now."""
+        if format == PARQUET and pyarrow is None:
+            raise ExportUnavailable("Parquet export needs the pyarrow package")
+        if self.running >= self.max_running:
+            raise ExportUnavailable(f"{self.running} exports are running; try again later")
+
+
+    @staticmethod
+    def filename(format: str, gzip: bool) -> str:
+        return f"entities.{format}" + (".gz" if gzip else "")
+
+
+    async def stream(self, entity_dao: EntityDao, filters: ExportFilter, format: str, gzip: bool = False) -> AsyncIterator[bytes]:
+        self.running += 1
+        batches = entity_dao.export(filters, self.batch_size, as_json=format == NDJSON)
+        encode = {NDJSON: _ndjson, CSV: _csv, PARQUET: _parquet}[format]
+        chunks = encode(batches)
+        if gzip:
+            chunks = _gzipped(chunks, self.__gzip_level)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # A client that went away cancels here; release the cursor now.
+            self.running -= 1
+            await chunks.aclose()
+            await batches.aclose()
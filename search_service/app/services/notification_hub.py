@@ -0,0 +1,223 @@
+from app.models.entity import EntityNotification
+from app.models.party import normalize_party
+from app.services.term_matcher import TermMatcher, word_similarity_threshold
+from app.utils.logger import get_logger
+from app.utils.metrics import WEBSOCKET_SUBSCRIBERS
+from app.utils.singleton import Singleton
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Delivery:
+    notification: EntityNotification
+    search_terms: List[str] = field(default_factory=list)
+    # Entities dropped for this subscriber since the previous delivery.
+    dropped: int = 0
+
+
+class Subscriber:
+    """
+    One websocket's interest in any number of search terms. An entity that
+    matches several of them is queued once, with every matched term, and one
+    announced again while still queued is coalesced into its entry. When
+    `max_pending` entities are waiting the oldest is dropped and counted, so
+    a slow client holds bounded memory however many terms it watches.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        # Normalized key -> the term as the client spelled it.
+        self.terms: Dict[str, str] = {}
+        self.dropped = 0
+        self.__max_pending = max_pending
+        # Entry key -> [latest notification, matched terms], oldest first.
+        self.__pending: "OrderedDict[int, list]" = OrderedDict()
+        self.__ready = asyncio.Event()
+        self.__dropped_since_get = 0
+
+
+    def deliver(self, notification: EntityNotification, key: str) -> bool:
+        """Queues the entity for a matched term; False when it was already queued and only gained the term."""
+        pending = self.__pending
+        entry_key = notification.id if notification.id is not None else id(notification)
+        search_term = self.terms[key]
+        queued = pending.get(entry_key)
+        if queued is not None:
+            queued[0] = notification
+            if search_term not in queued[1]:
+                queued[1].append(search_term)
+            return False
+        if len(pending) >= self.__max_pending:
+            pending.popitem(last=False)
+            self.dropped += 1
+            self.__dropped_since_get += 1
+        pending[entry_key] = [notification, [search_term]]
+        self.__ready.set()
+        return True
+
+
+    def discard_term(self, key: str):
+        """Forgets a term, including its share of the queued entities."""
+        search_term = self.terms.pop(key, None)
+        if search_term is None:
+            return
+        for entry_key, (_, search_terms) in list(self.__pending.items()):
+            if search_term in search_terms:
+                search_terms.remove(search_term)
+                if not search_terms:
+                    del self.__pending[entry_key]
+
+
+    def clear(self):
+        self.terms.clear()
+        self.__pending.clear()
+
+
+    async def get(self) -> Delivery:
+        while not self.__pending:
+            self.__ready.clear()
+            await self.__ready.wait()
+        _, (notification, search_terms) = self.__pending.popitem(last=False)
+        dropped, self.__dropped_since_get = self.__dropped_since_get, 0
+        return Delivery(notification, search_terms, dropped)
+
+
+    def qsize(self) -> int:
+        return len(self.__pending)
+
+
+class NotificationHub(metaclass=Singleton):
+    """
+    In-process registry of websocket subscriptions fed by the single
+    entity_details_inserted channel. Terms are kept in normalize_party()
+    form, and every new entity name is matched against all of them by the
+    rule IEntityDao.search applies (see TermMatcher), so a pushed entity is
+    one a fresh search for the term returns. A Subscriber watches any
+    number of terms and gets each matching entity once.
+    """
+
+    def __init__(self, retry_delay: float = 1.0, threshold: Optional[float] = None):
+        self.__retry_delay = retry_delay
+        self.__threshold = word_similarity_threshold() if threshold is None else threshold
+        self.__subscribers: Dict[str, Set[Subscriber]] = {}
+        self.__matcher: Optional[TermMatcher] = None
+        self.__observers: List[Callable[[EntityNotification], None]] = []
+        self.__listener: Optional[asyncio.Task] = None
+        self.dispatched = 0
+
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self.__subscribers.values())
+
+
+    @staticmethod
+    def normalize(search_term: str) -> str:
+        return normalize_party(search_term)
+
+
+    def __watch(self, key: str, subscriber: Subscriber):
+        if key not in self.__subscribers:
+            self.__subscribers[key] = set()
+            self.__matcher = None
+        self.__subscribers[key].add(subscriber)
+        WEBSOCKET_SUBSCRIBERS.inc()
+
+
+    def __unwatch(self, key: str, subscriber: Subscriber):
+        subscribers = self.__subscribers.get(key)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.remove(subscriber)
+        WEBSOCKET_SUBSCRIBERS.dec()
+        if not subscribers:
+            del self.__subscribers[key]
+            self.__matcher = None
+
+
+    def add_term(self, subscriber: Subscriber, search_term: str) -> bool:
+        """Adds a term to a subscriber; False when it already watches it."""
+        key = self.normalize(search_term)
+        if key in subscriber.terms:
+            return False
+        subscriber.terms[key] = search_term
+        self.__watch(key, subscriber)
+        return True
+
+
+    def remove_term(self, subscriber: Subscriber, search_term: str) -> bool:
+        key = self.normalize(search_term)
+        if key not in subscriber.terms:
+            return False
+        subscriber.discard_term(key)
+        self.__unwatch(key, subscriber)
+        return True
+
+
+    def remove_subscriber(self, subscriber: Subscriber):
+        for key in subscriber.terms:
+            self.__unwatch(key, subscriber)
+        subscriber.clear()
+
+
+    def observe(self, observer: Callable[[EntityNotification], None]):
+        """Registers a callback that sees every notification, e.g. to invalidate caches."""
+        self.__observers.append(observer)
+
+
+    def dispatch(self, notification: EntityNotification) -> int:
+        """Queues the notification once on every matching subscriber and returns how many."""
+        for observer in self.__observers:
+            observer(notification)
+        if not self.__subscribers or not notification.entity_name:
+            return 0
+        if self.__matcher is None:
+            # Rebuilt lazily, so a burst of subscribes costs one build.
+            self.__matcher = TermMatcher(self.__subscribers, self.__threshold)
+        delivered = 0
+        for key in self.__matcher.search(notification.entity_name):
+            for subscriber in self.__subscribers[key]:
+                # Queued once per subscriber; further matched terms join the entry.
+                delivered += subscriber.deliver(notification, key)
+        self.dispatched += delivered
+        return delivered
+
+
+    def start(self, listen: Callable[[], AsyncIterator[EntityNotification]], reconnect: Callable[[], Awaitable[None]]):
+        if self.__listener is None:
+            self.__listener = asyncio.create_task(self.__listen(listen, reconnect))
+
+
+    async def __listen(self, listen: Callable[[], AsyncIterator[EntityNotification]], reconnect: Callable[[], Awaitable[None]]):
+        while True:
+            try:
+                async for notification in listen():
+                    self.dispatch(notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Notification listener failed, reconnecting: %r", e)
+            await asyncio.sleep(self.__retry_delay)
+            try:
+                await reconnect()
+            except Exception as e:
+                logger.error("Error reconnecting notification listener: %r", e)
+
+
+    async def stop(self):
+        if self.__listener is not None:
+            self.__listener.cancel()
+            try:
+                await self.__listener
+            except asyncio.CancelledError:
+                pass
+            self.__listener = None
+        WEBSOCKET_SUBSCRIBERS.dec(len(self))
+        self.__subscribers.clear()
+        self.__observers.clear()
+        self.__matcher = None
+        Singleton.dispose(NotificationHub)
@@ -0,0 +1,193 @@
+from app.models.entity import EntityNotification
+from app.models.party import normalize_party
+from app.services.term_matcher import TermMatcher, matches, word_similarity_threshold
+from app.utils.singleton import Singleton
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+import asyncio
+import os
+import time
+
+
+@dataclass
+class SearchCacheStats:
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
+@dataclass
+class _Entry:
+    body: str
+    expires_at: float
+
+
+class SearchCache(metaclass=Singleton):
+    """
+    LRU + TTL cache of serialized search responses, keyed by the term in
+    normalize_party() form plus the page it holds, as the search looks it
+    up, so "Acme  inc" and "ACME INC" share entries. Entries are bounded by
+    count and by total size; concurrent misses for the same key share one
+    load.
+
+    A new entity invalidates every cached page of each term whose search
+    returns it, prefix or fuzzy match alike (see TermMatcher). Updated rows
+    are not announced, so the TTL bounds their staleness.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0, threshold: Optional[float] = None):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__ttl = ttl
+        self.__entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self.__keys_by_term: Dict[str, Set[Tuple[str, Hashable]]] = {}
+        self.__in_flight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        # Loads that raced a new entity; their result is returned but not stored.
+        self.__stale_loads: Set[Tuple[str, Hashable]] = set()
+        self.__threshold = word_similarity_threshold() if threshold is None else threshold
+        self.__matcher: Optional[TermMatcher] = None
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__coalesced = 0
+        self.__evictions = 0
+        self.__expirations = 0
+        self.__invalidations = 0
+
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        return cls(
+            max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "60")),
+        )
+
+
+    @staticmethod
+    def normalize(search_term: str) -> str:
+        return normalize_party(search_term)
+
+
+    @property
+    def stats(self) -> SearchCacheStats:
+        return SearchCacheStats(
+            entries=len(self.__entries),
+            bytes=self.__bytes,
+            hits=self.__hits,
+            misses=self.__misses,
+            coalesced=self.__coalesced,
+            evictions=self.__evictions,
+            expirations=self.__expirations,
+            invalidations=self.__invalidations,
+        )
+
+
+    async def get(self, search_term: str, page: Hashable, load: Callable[[], Awaitable[str]]) -> str:
+        key = (self.normalize(search_term), page)
+        entry = self.__entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry.body
+            self.__remove(key)
+            self.__expirations += 1
+
+        in_flight = self.__in_flight.get(key)
+        if in_flight is not None:
+            self.__coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # The caller that was loading went away; load again.
+                return await self.get(search_term, page, load)
+
+        self.__misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.__in_flight[key] = future
+        try:
+            body = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; retrieve it so an unawaited future does not warn.
+            future.exception()
+            raise
+        finally:
+            del self.__in_flight[key]
+            # A failed or cancelled load must not mark the next one stale.
+            stale = key in self.__stale_loads
+            self.__stale_loads.discard(key)
+        future.set_result(body)
+        if not stale:
+            self.__store(key, body)
+        return body
+
+
+    def __store(self, key: Tuple[str, Hashable], body: str):
+        size = len(body)
+        if size > self.__max_bytes:
+            return
+        if key in self.__entries:
+            self.__remove(key)
+        self.__entries[key] = _Entry(body=body, expires_at=time.monotonic() + self.__ttl)
+        self.__bytes += size
+        if key[0] not in self.__keys_by_term:
+            self.__keys_by_term[key[0]] = set()
+            self.__matcher = None
+        self.__keys_by_term[key[0]].add(key)
+        while len(self.__entries) > self.__max_entries or self.__bytes > self.__max_bytes:
+            self.__remove(next(iter(self.__entries)))
+            self.__evictions += 1
+
+
+    def __remove(self, key: Tuple[str, Hashable]):
+        entry = self.__entries.pop(key)
+        self.__bytes -= len(entry.body)
+        keys = self.__keys_by_term[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.__keys_by_term[key[0]]
+            self.__matcher = None
+
+
+    def invalidate(self, search_term: str):
+        term = self.normalize(search_term)
+        self.__stale_loads.update(key for key in self.__in_flight if key[0] == term)
+        for key in list(self.__keys_by_term.get(term, ())):
+            self.__remove(key)
+            self.__invalidations += 1
+
+
+    def on_entity_inserted(self, notification: EntityNotification):
+        """NotificationHub observer: drops the pages of every term the new name matches."""
+        name = notification.entity_name
+        if not name:
+            return
+        # Loads in progress may already have missed this row.
+        self.__stale_loads.update(key for key in self.__in_flight if matches(key[0], name, self.__threshold))
+        if not self.__keys_by_term:
+            return
+        if self.__matcher is None:
+            self.__matcher = TermMatcher(self.__keys_by_term, self.__threshold)
+        for term in self.__matcher.search(name):
+            self.invalidate(term)
+
+
+    def clear(self):
+        self.__entries.clear()
+        self.__keys_by_term.clear()
+        self.__stale_loads.clear()
+        self.__matcher = None
+        self.__bytes = 0
@@ -0,0 +1,54 @@
+from app.models.party import normalize_party
+from app.utils.trigram import trigrams, word_similarity_of
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+import os
+
+
+def word_similarity_threshold() -> float:
+    """pg_trgm.word_similarity_threshold; DB sets it on its connections, so the queries and TermMatcher agree."""
+    return float(os.getenv("SEARCH_WORD_SIMILARITY_THRESHOLD", "0.6"))
+
+
+def matches(term: str, name: str, threshold: float) -> bool:
+    """Whether a search for the normalized `term` returns an entity named `name`."""
+    if not term:
+        return False
+    if normalize_party(name).startswith(term):
+        return True
+    return word_similarity_of(set(trigrams(term)), trigrams(name), threshold) >= threshold
+
+
+class TermMatcher:
+    """
+    Finds the normalized terms whose search returns a given entity name,
+    by the rule IEntityDao.search applies: the normalized name starts with
+    the term, or `name %> term`, the term's word similarity to the name
+    reaching the threshold. Prefixes are dictionary lookups. A term is
+    similar only when at least `threshold` of its distinct trigrams are in
+    the name, so only terms sharing that many are scored.
+    """
+
+    def __init__(self, terms: Iterable[str], threshold: float):
+        self.__threshold = threshold
+        self.__terms: Dict[str, Set[str]] = {term: set(trigrams(term)) for term in terms if term}
+        self.__terms_by_trigram: Dict[str, List[str]] = {}
+        for term, term_trigrams in self.__terms.items():
+            for trigram in term_trigrams:
+                self.__terms_by_trigram.setdefault(trigram, []).append(term)
+
+
+    def search(self, name: str) -> Set[str]:
+        normalized = normalize_party(name)
+        found = {normalized[:end] for end in range(1, len(normalized) + 1) if normalized[:end] in self.__terms}
+        name_trigrams = trigrams(name)
+        shared = Counter()
+        for trigram in set(name_trigrams):
+            shared.update(self.__terms_by_trigram.get(trigram, ()))
+        for term, count in shared.items():
+            term_trigrams = self.__terms[term]
+            if term in found or count / len(term_trigrams) < self.__threshold - 1e-6:
+                continue
+            if word_similarity_of(term_trigrams, name_trigrams, self.__threshold) >= self.__threshold:
+                found.add(term)
+        return found
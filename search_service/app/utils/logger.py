@@ -0,0 +1,60 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import logging
+import os
+import queue
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def _start_listener(level: str):
+    global _listener
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(records, stream)
+    _listener.start()
+    root = logging.getLogger("app")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    root.propagate = False
+
+
+def _restart_in_child():
+    # A forked process inherits the queue but not the thread draining it.
+    if _listener is not None:
+        _start_listener(logging.getLevelName(logging.getLogger("app").level))
+
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Routes the `app.*` loggers through a queue drained by a background
+    thread: a disabled level costs one check, an enabled one an enqueue,
+    and formatting and writing happen off the event loop. The level comes
+    from LOG_LEVEL (INFO by default).
+    """
+    if _listener is not None:
+        return
+    _start_listener((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    atexit.register(stop_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def stop_logging():
+    """Writes out queued records; for processes that exit without atexit, e.g. multiprocessing children."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
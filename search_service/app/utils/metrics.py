@@ -0,0 +1,32 @@
+"""
+Prometheus metrics of the search service, served by GET /metrics. With
+several server processes, set PROMETHEUS_MULTIPROC_DIR (in the environment,
+before start) to a shared directory so /metrics reports all of them.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from typing import Tuple
+import os
+
+
+# Websocket sends and cached searches take milliseconds, not seconds.
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+SEARCH_QUERY = Histogram("search_query_seconds", "Time to run a name search against entity_details", buckets=FAST_BUCKETS)
+PARTY_QUERY = Histogram("search_party_query_seconds", "Time to run a person or address lookup", ["table"], buckets=FAST_BUCKETS)
+EXPORT_QUERY = Histogram("search_export_query_seconds", "Time until an export's first batch is fetched")
+EXPORTED_ROWS = Counter("search_exported_rows", "Rows written by exports", ["format"])
+WEBSOCKET_SEND = Histogram("search_websocket_send_seconds", "Time to send one websocket message", ["message"], buckets=FAST_BUCKETS)
+WEBSOCKET_SUBSCRIBERS = Gauge("search_websocket_subscribers", "Search terms watched by websockets, one per term and connection", multiprocess_mode="livesum")
+
+
+def _registry() -> CollectorRegistry:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The exposition body and its content type, across processes in multiprocess mode."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,75 @@
+"""
+pg_trgm's word similarity, computed the way the extension does, so code
+outside the database can tell which names a `name %> term` query returns.
+"""
+from typing import List, Optional, Set
+import re
+import struct
+
+
+# pg_trgm splits text on anything but letters and digits.
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> List[str]:
+    """Trigrams of each lowercased word padded with two spaces before and one after, in text order."""
+    found = []
+    for word in _WORD.findall(text.lower()):
+        padded = "  " + word + " "
+        found.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return found
+
+
+def _float4(value: float) -> float:
+    # pg_trgm compares a float4 similarity with the threshold.
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def word_similarity_of(term_trigrams: Set[str], text_trigrams: List[str], threshold: Optional[float] = None) -> float:
+    """
+    word_similarity() from the term's distinct trigrams and the text's
+    trigrams in order: the greatest similarity between the term and an
+    extent of the text, as iterate_word_similarity() finds it. With a
+    threshold it returns once that is reached, like the `%>` operator.
+    """
+    term_count = len(term_trigrams)
+    found = [trigram in term_trigrams for trigram in text_trigrams]
+    # A near miss is checked again in float4.
+    enough = 2.0 if threshold is None else threshold - 1e-6
+    last_position = {}
+    extent_count = shared = 0
+    lower = -1
+    best = 0.0
+    for upper, trigram in enumerate(text_trigrams):
+        if lower >= 0 or found[upper]:
+            if trigram not in last_position:
+                extent_count += 1
+                shared += found[upper]
+            last_position[trigram] = upper
+        if not found[upper]:
+            continue
+        if lower == -1:
+            lower = upper
+            extent_count = 1
+        current = shared / (term_count + extent_count - shared)
+        # Moving the extent's start right may drop unshared trigrams.
+        tmp_shared, tmp_count, previous_lower = shared, extent_count, lower
+        for tmp_lower in range(lower, upper + 1):
+            similarity = tmp_shared / (term_count + tmp_count - tmp_shared)
+            if similarity > current:
+                current, extent_count, lower, shared = similarity, tmp_count, tmp_lower, tmp_shared
+            if current >= enough and _float4(current) >= threshold:
+                return _float4(current)
+            if last_position[text_trigrams[tmp_lower]] == tmp_lower:
+                tmp_count -= 1
+                tmp_shared -= found[tmp_lower]
+        best = max(best, current)
+        for tmp_lower in range(previous_lower, lower):
+            dropped = text_trigrams[tmp_lower]
+            if last_position.get(dropped) == tmp_lower:
+                del last_position[dropped]
+    return _float4(best)
+
+
+def word_similarity(term: str, text: str) -> float:
+    return word_similarity_of(set(trigrams(term)), trigrams(text))
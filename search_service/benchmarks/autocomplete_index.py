@@ -0,0 +1,114 @@
+"""
+Build time, memory and query latency of the autocomplete index.
+
+Usage (from search_service/):
+    python -m benchmarks.autocomplete_index [--names 3000000] [--queries 100000] [--limit 10]
+    python -m benchmarks.autocomplete_index --database-url DATABASE_URL [--names 1000000]
+
+Synthetic entity names (a few words from a business vocabulary, a number
+and a suffix) are fed to AutocompleteIndex.build in 50k batches, sorted
+the way IEntityDao.autocomplete_names returns them. Reported: build time,
+index size and bytes per name, and per-query latency of complete() for
+prefixes of 1 to 8 characters cut from random names. With --database-url
+(a disposable database with schema.sql applied) the names are inserted
+first and the build streams them through IEntityDao instead, query and
+sort included.
+"""
+from app.db.entity import IEntityDao
+from app.models.party import normalize_party
+from app.services.autocomplete import AutocompleteIndex
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from typing import AsyncIterator, List
+import argparse
+import asyncio
+import psycopg
+import random
+import statistics
+import time
+
+
+WORDS = (
+    "ACME", "ATLANTIC", "BAY", "BEACH", "BLUE", "CAPITAL", "CITRUS", "COASTAL", "CORAL", "CYPRESS",
+    "DOLPHIN", "EAGLE", "EMERALD", "EVERGLADES", "FIRST", "GATOR", "GOLDEN", "GULF", "HARBOR", "HERITAGE",
+    "ISLAND", "KEY", "LAKE", "LIBERTY", "MANATEE", "MIAMI", "NORTH", "OCEAN", "ORANGE", "PALM",
+    "PELICAN", "PINE", "SAND", "SEMINOLE", "SOUTH", "SUN", "SUNSHINE", "TAMPA", "TROPICAL", "UNITED",
+)
+KINDS = ("HOLDINGS", "PROPERTIES", "SERVICES", "GROUP", "VENTURES", "PARTNERS", "CONSTRUCTION", "MEDICAL", "REALTY", "TRADING")
+SUFFIXES = ("LLC", "INC", "CORP", "LP", "P.A.")
+
+
+def synthetic_names(count: int, seed: int = 7) -> List[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        name = f"{words} {rng.choice(KINDS)} {i % 997} {rng.choice(SUFFIXES)}"
+        rows.append((i + 1, f"B{i:011d}", name))
+    return rows
+
+
+async def batched(rows: List[tuple], batch_size: int = 50000) -> AsyncIterator[List[tuple]]:
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+        await asyncio.sleep(0)
+
+
+def insert_names(database_url: str, rows: List[tuple]):
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        with cur.copy("COPY entity_details (document_number, entity_name) FROM STDIN") as copy:
+            for _, document_number, name in rows:
+                copy.write_row((document_number, name))
+
+
+def report_queries(index: AutocompleteIndex, rows: List[tuple], queries: int, limit: int):
+    rng = random.Random(11)
+    prefixes = []
+    for _ in range(queries):
+        name = rng.choice(rows)[2]
+        prefixes.append(name[:rng.randint(1, 8)])
+    latencies = []
+    returned = 0
+    for prefix in prefixes:
+        start = time.perf_counter_ns()
+        returned += len(index.complete(prefix, limit))
+        latencies.append(time.perf_counter_ns() - start)
+    latencies.sort()
+    print(f"queries:    {queries} prefixes of 1-8 characters, limit {limit}, {returned / queries:.1f} suggestions each")
+    print(
+        f"latency:    mean {statistics.mean(latencies) / 1000:.1f} us, p50 {latencies[len(latencies) // 2] / 1000:.1f} us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] / 1000:.1f} us, max {latencies[-1] / 1000:.1f} us"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=3000000)
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    rows = synthetic_names(args.names)
+    index = AutocompleteIndex()
+    if args.database_url:
+        insert_names(args.database_url, rows)
+        pool = AsyncConnectionPool(args.database_url, kwargs={"row_factory": dict_row}, open=False)
+        await pool.open(wait=True)
+        try:
+            await index.build(IEntityDao(pool, None).autocomplete_names())
+        finally:
+            await pool.close()
+    else:
+        ordered = sorted(((id, document_number, normalize_party(name)) for id, document_number, name in rows), key=lambda row: (row[2].encode(), row[1].encode()))
+        await index.build(batched(ordered))
+        del ordered
+    stats = index.stats
+    print(f"names:      {stats.entries}")
+    print(f"build:      {stats.build_seconds:.2f}s" + (" (query, sort and transfer included)" if args.database_url else ""))
+    print(f"memory:     {stats.bytes / 1e6:.1f} MB, {stats.bytes / max(stats.entries, 1):.1f} bytes per name")
+    report_queries(index, rows, args.queries, args.limit)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Concurrent search() benchmark: one shared connection vs the connection pool.
+
+Usage (from search_service/):
+    python -m benchmarks.concurrent_search DATABASE_URL [--seed ROWS] [--clients 50] [--queries 20]
+
+`--seed` inserts synthetic rows first (use a disposable database). The
+"single connection" run is a pool pinned to one connection, which serializes
+queries exactly like the previous single AsyncConnection did.
+"""
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from app.db.entity import IEntityDao
+import argparse
+import asyncio
+import random
+import statistics
+import string
+import time
+
+
+TERMS = ["acme", "holdings", "llc", "florida", "group", "capital", "tech", "home"]
+
+
+async def seed(conn_str: str, rows: int):
+    async with AsyncConnectionPool(conn_str, min_size=1, max_size=1) as pool:
+        async with pool.connection() as conn, conn.cursor() as cur:
+            batch = []
+            for i in range(rows):
+                words = random.sample(TERMS, 2) + ["".join(random.choices(string.ascii_lowercase, k=6))]
+                batch.append((" ".join(words).upper(), f"B{i:011d}"))
+                if len(batch) == 5000 or i == rows - 1:
+                    await cur.executemany(
+                        "INSERT INTO entity_details (entity_name, document_number) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
+                        batch,
+                    )
+                    batch = []
+    print(f"Seeded {rows} rows")
+
+
+async def run(conn_str: str, pool_size: int, clients: int, queries: int) -> dict:
+    pool = AsyncConnectionPool(conn_str, min_size=pool_size, max_size=pool_size, kwargs={"row_factory": dict_row}, open=False)
+    await pool.open(wait=True)
+    entity_dao = IEntityDao(pool, None)
+    latencies = []
+
+    async def client():
+        for _ in range(queries):
+            started = time.perf_counter()
+            await entity_dao.search(random.choice(TERMS))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    elapsed = time.perf_counter() - started
+    await pool.close()
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "queries": len(latencies),
+        "qps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(args):
+    if args.seed:
+        await seed(args.database_url, args.seed)
+    for label, pool_size in (("single connection", 1), ("pooled", args.pool_size)):
+        result = await run(args.database_url, pool_size, args.clients, args.queries)
+        print(f"{label:>17}: {result['qps']:8.1f} q/s  p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database_url")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,112 @@
+"""
+Peak Python memory of a bulk export as the row count grows.
+
+Usage (from search_service/):
+    python -m benchmarks.export_memory --database-url DATABASE_URL [--rows 1000 100000] [--batch-size 5000]
+
+DATABASE_URL must point at a disposable database with schema.sql applied;
+synthetic entities are inserted into it. For each row count the export is
+streamed once per format (chunks are counted and dropped, as a socket
+would) and its peak traced allocation is reported next to loading the
+same rows with fetchall(), the way a broad `search` holds them. The export
+peak should stay flat while fetchall grows with the rows.
+"""
+from app.db.entity import IEntityDao
+from app.models.entity import EXPORT_COLUMNS, ExportFilter
+from app.services.entity_export import CSV, NDJSON, PARQUET, EntityExporter, pyarrow
+from datetime import datetime, timezone
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+import argparse
+import asyncio
+import psycopg
+import time
+import tracemalloc
+
+
+SINCE = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def insert_entities(database_url: str, rows: int):
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        conn.execute("""
+INSERT INTO entity_details (entity_type, entity_name, document_number, status, date_filed, principal_address, registered_agent_name, authorized_persons, annual_reports, document_images, updated_at)
+SELECT
+    'Florida Limited Liability Company',
+    'EXPORTBENCH HOLDINGS ' || i || ' LLC',
+    'X' || lpad(i::text, 11, '0'),
+    'ACTIVE',
+    date '2012-01-05' + i %% 3000,
+    i || E' MAIN ST\\nMIAMI, FL 33101',
+    'DOE, JOHN',
+    jsonb_build_array(jsonb_build_object('title', 'MGR', 'name', 'ROE, JANE', 'address', i || ' MAIN ST')),
+    '[{"year": "2024", "filed_date": "01/05/2024"}]',
+    '[]',
+    NOW() - i * interval '1 second'
+FROM generate_series(1, %s) AS i
+ON CONFLICT (document_number) DO NOTHING;
+""", (rows,))
+
+
+async def export_peak(exporter: EntityExporter, entity_dao: IEntityDao, format: str, since: datetime):
+    # Timed untraced; tracemalloc slows allocation-heavy encoding down.
+    size = 0
+    start = time.perf_counter()
+    async for chunk in exporter.stream(entity_dao, ExportFilter(updated_since=since), format):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    async for chunk in exporter.stream(entity_dao, ExportFilter(updated_since=since), format):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+async def fetchall_peak(pool: AsyncConnectionPool, since: datetime):
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM entity_details WHERE updated_at >= %s"
+    start = time.perf_counter()
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, (since,))
+        count = len(await cur.fetchall())
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, (since,))
+        await cur.fetchall()
+        peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    insert_entities(args.database_url, max(args.rows))
+    pool = AsyncConnectionPool(args.database_url, kwargs={"row_factory": dict_row}, open=False)
+    await pool.open(wait=True)
+    entity_dao = IEntityDao(pool, None)
+    exporter = EntityExporter(batch_size=args.batch_size)
+    formats = [NDJSON, CSV] + ([PARQUET] if pyarrow is not None else [])
+    try:
+        print(f"{'rows':>8} {'format':>8} {'output':>10} {'time':>8} {'peak':>10}")
+        for rows in args.rows:
+            async with pool.connection() as conn, conn.cursor() as cur:
+                # The newest `rows` entities of the benchmark set.
+                await cur.execute("SELECT updated_at FROM entity_details ORDER BY updated_at DESC OFFSET %s LIMIT 1", (rows - 1,))
+                since = (await cur.fetchone() or {"updated_at": SINCE})["updated_at"]
+            for format in formats:
+                size, elapsed, peak = await export_peak(exporter, entity_dao, format, since)
+                print(f"{rows:>8} {format:>8} {size / 1e6:>8.1f}MB {elapsed:>7.2f}s {peak / 1e6:>8.2f}MB")
+            count, elapsed, peak = await fetchall_peak(pool, since)
+            print(f"{count:>8} {'fetchall':>8} {'':>10} {elapsed:>7.2f}s {peak / 1e6:>8.2f}MB")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
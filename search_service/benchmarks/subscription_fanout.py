@@ -0,0 +1,145 @@
+"""
+Notification fan-out load test with many concurrent websocket connections.
+
+Usage (from search_service/):
+    python -m benchmarks.subscription_fanout [--subscriptions 1000] [--terms-per-connection 5] [--notifications 20000]
+    python -m benchmarks.subscription_fanout --database-url DATABASE_URL [--inserts 2000]
+
+Each connection is a Subscriber watching --terms-per-connection terms, as
+the websocket sets them up; --subscriptions counts terms across all
+connections. The in-process run dispatches synthetic notifications
+through the NotificationHub and compares it with checking every term of
+every connection one by one with the same match rule, as the per-term
+triggers did for each INSERT; the hub's time also covers queueing each
+delivery.
+A connection gets an entity once however many of its terms match. With
+--database-url it also inserts rows (use a disposable database with
+migrations/0003 applied) and measures insert-to-connection latency
+through the single LISTEN connection.
+"""
+from app.db import DB
+from app.models.entity import EntityNotification
+from app.services.notification_hub import NotificationHub, Subscriber
+from app.services.term_matcher import matches as search_matches, word_similarity_threshold
+from typing import List
+import argparse
+import asyncio
+import psycopg
+import random
+import statistics
+import string
+import time
+
+
+WORDS = ["acme", "holdings", "llc", "florida", "group", "capital", "tech", "home", "realty", "partners",
+         "services", "medical", "trust", "ventures", "marine", "solar", "logistics", "consulting"]
+
+
+def random_term() -> str:
+    if random.random() < 0.5:
+        return random.choice(WORDS)
+    return random.choice(WORDS) + " " + "".join(random.choices(string.ascii_lowercase, k=3))
+
+
+def random_name() -> str:
+    words = random.sample(WORDS, 3) + ["".join(random.choices(string.ascii_lowercase, k=6))]
+    return " ".join(words).upper()
+
+
+def connect(hub: NotificationHub, subscriptions: int, terms_per_connection: int, terms=random_term, max_pending: int = 1000) -> List[Subscriber]:
+    connections = []
+    for _ in range(max(1, subscriptions // terms_per_connection)):
+        subscriber = Subscriber(max_pending=max_pending)
+        while len(subscriber.terms) < terms_per_connection:
+            hub.add_term(subscriber, terms())
+        connections.append(subscriber)
+    return connections
+
+
+def in_process(subscriptions: int, terms_per_connection: int, notifications: int):
+    hub = NotificationHub()
+    # Nobody reads, so past the first 1000 per connection the oldest are dropped.
+    connections = connect(hub, subscriptions, terms_per_connection)
+    batch = [EntityNotification(id=i, document_number=f"B{i:011d}", entity_name=random_name()) for i in range(notifications)]
+
+    started = time.perf_counter()
+    delivered = sum(hub.dispatch(notification) for notification in batch)
+    hub_elapsed = time.perf_counter() - started
+
+    threshold = word_similarity_threshold()
+    started = time.perf_counter()
+    naive = 0
+    matches = 0
+    for notification in batch:
+        name = notification.entity_name
+        for subscriber in connections:
+            matched = sum(1 for key in subscriber.terms if search_matches(key, name, threshold))
+            matches += matched
+            naive += matched > 0
+    naive_elapsed = time.perf_counter() - started
+
+    assert delivered == naive, (delivered, naive)
+    distinct = len({key for subscriber in connections for key in subscriber.terms})
+    dropped = sum(subscriber.dropped for subscriber in connections)
+    print(f"{len(connections)} connections x {terms_per_connection} terms ({distinct} distinct), {notifications} notifications")
+    print(f"{delivered} deliveries for {matches} term matches, {dropped} dropped")
+    print(f"      hub: {notifications / hub_elapsed:10.0f} notifications/s  {hub_elapsed / notifications * 1e6:8.1f} us each")
+    print(f" per-term: {notifications / naive_elapsed:10.0f} notifications/s  {naive_elapsed / notifications * 1e6:8.1f} us each")
+    for subscriber in connections:
+        hub.remove_subscriber(subscriber)
+
+
+async def end_to_end(database_url: str, subscriptions: int, terms_per_connection: int, inserts: int):
+    db = DB()
+    await db.connect(database_url)
+    hub = NotificationHub()
+    hub.start(lambda: db.entity_dao.listen(), db.reconnect_listener)
+    # Every connection watches terms matching every inserted name, among
+    # others, so each insert fans out to all of them, once each.
+    fanout_terms = ["fanout", "FanOut", "fan", "fano"]
+    terms = lambda: random.choice(fanout_terms) if random.random() < 0.5 else random_term()
+    connections = connect(hub, subscriptions, terms_per_connection, terms, max_pending=inserts)
+    for subscriber in connections:
+        hub.add_term(subscriber, "fanout")
+    sent_at = {}
+    latencies = []
+
+    async def read(subscriber: Subscriber):
+        received = 0
+        while received < inserts:
+            delivery = await subscriber.get()
+            if delivery.notification.document_number in sent_at:
+                latencies.append(time.perf_counter() - sent_at[delivery.notification.document_number])
+                received += 1
+
+    readers = [asyncio.create_task(read(subscriber)) for subscriber in connections]
+    await asyncio.sleep(0.5)
+    prefix = "".join(random.choices(string.ascii_uppercase, k=4))
+    conn = await psycopg.AsyncConnection.connect(database_url, autocommit=True)
+    async with conn.cursor() as cur:
+        for i in range(inserts):
+            document_number = f"F{prefix}{i:07d}"
+            sent_at[document_number] = time.perf_counter()
+            await cur.execute("INSERT INTO entity_details (entity_name, document_number) VALUES (%s, %s);", (f"{random_name()} FANOUT", document_number))
+    await asyncio.wait_for(asyncio.gather(*readers), timeout=60)
+    await conn.close()
+    await hub.stop()
+    await db.dispose()
+    latencies.sort()
+    terms_watched = sum(len(subscriber.terms) for subscriber in connections)
+    print(f"{len(connections)} connections watching {terms_watched} terms, {inserts} inserts, {len(latencies)} deliveries")
+    print(f"insert-to-connection latency  p50 {statistics.median(latencies) * 1000:.1f} ms  p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--notifications", type=int, default=20000)
+    parser.add_argument("--database-url")
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--terms-per-connection", type=int, default=5)
+    args = parser.parse_args()
+    if args.database_url:
+        asyncio.run(end_to_end(args.database_url, args.subscriptions, args.terms_per_connection, args.inserts))
+    else:
+        in_process(args.subscriptions, args.terms_per_connection, args.notifications)
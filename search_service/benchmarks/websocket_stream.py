@@ -0,0 +1,169 @@
+"""
+Delivery of a 10k-row result over the websocket: one message vs streamed frames.
+
+Usage (from search_service/):
+    python -m benchmarks.websocket_stream [--rows 10000] [--chunk-size 500]
+    python -m benchmarks.websocket_stream --database-url DATABASE_URL [--rows 10000] [--chunk-size 500]
+
+The in-process run serializes synthetic EntitySummary rows three ways: the
+previous `json.dumps([asdict(...)], default=str)` message, the orjson
+message, and stream frames joined from per-row JSON text as Postgres
+returns it. "max block" is the longest serialization step between awaits,
+i.e. the worst delay it adds for every other websocket. With
+--database-url (a disposable database with schema.sql applied) matching
+rows are inserted first and timed through IEntityDao, query included.
+"""
+from app.db.entity import IEntityDao
+from app.models.entity import EntitySummary, SearchPage
+from app.api.search import serialize_page, stream_done_frame, stream_frame
+from dataclasses import asdict
+from datetime import date, datetime, timezone
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from typing import Callable, List
+import argparse
+import asyncio
+import json
+import orjson
+import time
+
+
+TERM = "streambench"
+
+
+def synthetic_entities(rows: int) -> List[EntitySummary]:
+    now = datetime.now(timezone.utc)
+    return [
+        EntitySummary(
+            id=i,
+            entity_type="Florida Limited Liability Company",
+            entity_name=f"{TERM.upper()} HOLDINGS {i:06d} LLC",
+            document_number=f"S{i:011d}",
+            fe_ein_number=f"{i % 100:02d}-{i:07d}",
+            date_filed=date(2012, 1, 5),
+            state="FL",
+            status="ACTIVE",
+            principal_address=f"{i} MAIN ST\nMIAMI, FL 33101",
+            principal_address_changed=date(2015, 4, 30),
+            mailing_address=f"PO BOX {i}\nMIAMI, FL 33101",
+            registered_agent_name="DOE, JOHN",
+            registered_agent_address="9 AGENT RD\nTAMPA, FL 33602",
+            created_at=now,
+            updated_at=now,
+            rank=1.0,
+        )
+        for i in range(rows)
+    ]
+
+
+def legacy_message(page: SearchPage) -> str:
+    return json.dumps({
+        "search_term": TERM,
+        "entities": [asdict(entity) for entity in page.entities],
+        "next_cursor": None,
+    }, default=str)
+
+
+def timed(build: Callable[[], str]) -> tuple:
+    started = time.perf_counter()
+    message = build()
+    return time.perf_counter() - started, len(message)
+
+
+def report(label: str, total: float, max_block: float, frames: int, max_frame: int):
+    print(f"{label:>22}: total {total * 1000:8.1f} ms  max block {max_block * 1000:7.2f} ms  {frames:4d} frames  largest {max_frame / 1024:8.1f} KiB")
+
+
+def in_process(rows: int, chunk_size: int):
+    entities = synthetic_entities(rows)
+    page = SearchPage(entities=entities)
+
+    elapsed, size = timed(lambda: legacy_message(page))
+    report("asdict + json.dumps", elapsed, elapsed, 1, size)
+
+    elapsed, size = timed(lambda: serialize_page(page))
+    report("orjson", elapsed, elapsed, 1, size)
+
+    # What row_to_json hands back: one JSON text per row.
+    row_texts = [orjson.dumps(entity).decode() for entity in entities]
+    total = 0.0
+    max_block = 0.0
+    max_frame = 0
+    frames = 0
+    for start in range(0, len(row_texts), chunk_size):
+        elapsed, size = timed(lambda: stream_frame(TERM, frames, row_texts[start:start + chunk_size]))
+        total += elapsed
+        max_block = max(max_block, elapsed)
+        max_frame = max(max_frame, size)
+        frames += 1
+    elapsed, size = timed(lambda: stream_done_frame(TERM, rows, False))
+    report("streamed frames", total + elapsed, max_block, frames + 1, max_frame)
+
+
+async def seed(pool: AsyncConnectionPool, rows: int):
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute("DELETE FROM entity_details WHERE document_number LIKE 'S%%' AND entity_name LIKE %s;", (f"{TERM.upper()} %",))
+        await cur.executemany(
+            """
+INSERT INTO entity_details (entity_type, entity_name, document_number, status, principal_address, mailing_address, registered_agent_name, date_filed)
+VALUES ('Florida Limited Liability Company', %s, %s, 'ACTIVE', %s, %s, 'DOE, JOHN', '2012-01-05')
+ON CONFLICT DO NOTHING;
+""",
+            [(f"{TERM.upper()} HOLDINGS {i:06d} LLC", f"S{i:011d}", f"{i} MAIN ST\nMIAMI, FL 33101", f"PO BOX {i}\nMIAMI, FL 33101") for i in range(rows)],
+        )
+    print(f"Seeded {rows} rows matching '{TERM}'")
+
+
+async def with_database(database_url: str, rows: int, chunk_size: int):
+    async with AsyncConnectionPool(database_url, min_size=1, max_size=2, kwargs={"row_factory": dict_row}) as pool:
+        await seed(pool, rows)
+        entity_dao = IEntityDao(pool, None)
+
+        started = time.perf_counter()
+        page = await entity_dao.search(TERM, limit=rows)
+        queried = time.perf_counter()
+        message = legacy_message(page)
+        finished = time.perf_counter()
+        report("query + asdict/json", finished - started, finished - queried, 1, len(message))
+
+        started = time.perf_counter()
+        page = await entity_dao.search(TERM, limit=rows)
+        queried = time.perf_counter()
+        message = serialize_page(page)
+        finished = time.perf_counter()
+        report("query + orjson", finished - started, finished - queried, 1, len(message))
+
+        started = time.perf_counter()
+        first_frame = None
+        max_block = 0.0
+        max_frame = 0
+        frames = 0
+        count = 0
+        async for chunk in entity_dao.stream_search(TERM, chunk_size, rows):
+            built = time.perf_counter()
+            frame = stream_frame(TERM, frames, chunk)
+            max_block = max(max_block, time.perf_counter() - built)
+            max_frame = max(max_frame, len(frame))
+            first_frame = first_frame or time.perf_counter() - started
+            frames += 1
+            count += len(chunk)
+        stream_done_frame(TERM, count, count >= rows)
+        report("row_to_json stream", time.perf_counter() - started, max_block, frames + 1, max_frame)
+        print(f"{'':>22}  first frame after {first_frame * 1000:.1f} ms, {count} rows")
+
+
+async def main(args):
+    print(f"In process, {args.rows} rows, {args.chunk_size} rows per frame")
+    in_process(args.rows, args.chunk_size)
+    if args.database_url:
+        print(f"Through Postgres, {args.rows} rows, {args.chunk_size} rows per frame")
+        await with_database(args.database_url, args.rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.api.search import search
 from app.db import DB
+from app.services.autocomplete import AutocompleteIndex
+from app.services.entity_export import EntityExporter
+from app.services.notification_hub import NotificationHub
+from app.services.search_cache import SearchCache
+from app.utils.metrics import render_metrics
 import asyncio
 import uvicorn
 from dotenv import load_dotenv
@@ -14,7 +19,19 @@ load_dotenv()
 async def fastapi_lifespan(app: FastAPI):
     db = DB()
     await db.connect(os.getenv("DATABASE_URL"))
+    cache = SearchCache.from_env()
+    EntityExporter.from_env()
+    autocomplete = AutocompleteIndex.from_env()
+    hub = NotificationHub()
+    hub.observe(cache.on_entity_inserted)
+    # Observed before the first load starts, so inserts during it are kept aside.
+    hub.observe(autocomplete.on_entity_inserted)
+    hub.start(lambda: db.entity_dao.listen(), db.reconnect_listener)
+    autocomplete.start(lambda batch_size: db.entity_dao.autocomplete_names(batch_size))
     yield
+    await autocomplete.stop()
+    await hub.stop()
+    cache.clear()
     await db.dispose()
 
 app = FastAPI(lifespan=fastapi_lifespan, openapi_url="/api/v1/search/openapi.json", docs_url="/api/v1/search/docs")
@@ -31,6 +48,11 @@ app.add_middleware(
 async def index():
     return {"message": "Search Service is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(search, prefix="/api/v1/search", tags=["search"])
 
 async def main():    
@@ -0,0 +1,34 @@
+from app.models.entity import EntityNotification
+from app.services.notification_hub import NotificationHub, Subscriber
+from app.utils.singleton import Singleton
+import pytest
+
+
+@pytest.fixture
+def hub():
+    yield NotificationHub(threshold=0.6)
+    Singleton.dispose(NotificationHub)
+
+
+def notification(id: int, entity_name: str) -> EntityNotification:
+    return EntityNotification(id=id, document_number=f"P{id:011d}", entity_name=entity_name)
+
+
+def test_pushes_what_a_search_returns(hub):
+    subscriber = Subscriber()
+    hub.add_term(subscriber, "Acme  Holdings")
+    hub.add_term(subscriber, "ac")
+
+    assert hub.dispatch(notification(1, "ACME HOLDINGS, LLC")) == 1
+    assert hub.dispatch(notification(2, "ACME HOLDING CO")) == 1
+    assert hub.dispatch(notification(3, "BAC INC")) == 0
+    assert subscriber.qsize() == 2
+
+
+def test_terms_are_normalized(hub):
+    subscriber = Subscriber()
+
+    assert hub.add_term(subscriber, "acme  inc")
+    assert not hub.add_term(subscriber, "ACME INC ")
+    assert hub.remove_term(subscriber, " Acme Inc")
+    assert len(hub) == 0
@@ -0,0 +1,55 @@
+from app.models.entity import EntityNotification
+from app.services.search_cache import SearchCache
+from app.utils.singleton import Singleton
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def cache():
+    yield SearchCache(threshold=0.6)
+    Singleton.dispose(SearchCache)
+
+
+def cached(cache: SearchCache, search_term: str, body: str) -> str:
+    async def load() -> str:
+        return body
+
+    return asyncio.run(cache.get(search_term, None, load))
+
+
+def inserted(cache: SearchCache, entity_name: str):
+    cache.on_entity_inserted(EntityNotification(id=1, document_number="P00000000001", entity_name=entity_name))
+
+
+def test_terms_share_entries_in_normalized_form(cache):
+    cached(cache, "acme  inc", "first")
+
+    assert cached(cache, " ACME INC ", "second") == "first"
+    assert cache.stats.entries == 1
+
+
+def test_fuzzy_only_insert_invalidates_term(cache):
+    cached(cache, "acme holdings", "stale")
+
+    inserted(cache, "ACME HOLDING CO")
+
+    assert cached(cache, "acme holdings", "fresh") == "fresh"
+    assert cache.stats.invalidations == 1
+
+
+def test_prefix_insert_invalidates_term(cache):
+    cached(cache, "acme", "stale")
+
+    inserted(cache, "Acme, Inc.")
+
+    assert cached(cache, "acme", "fresh") == "fresh"
+
+
+def test_insert_matching_inside_a_word_keeps_term(cache):
+    cached(cache, "ac", "kept")
+
+    inserted(cache, "BAC INC")
+
+    assert cached(cache, "ac", "fresh") == "kept"
+    assert cache.stats.invalidations == 0
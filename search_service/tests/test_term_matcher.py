@@ -0,0 +1,41 @@
+"""
+TermMatcher decides which cached pages and websocket subscriptions a new
+entity reaches, so it must agree with what IEntityDao.search returns.
+"""
+from app.services.term_matcher import TermMatcher, matches
+from app.utils.trigram import word_similarity
+import pytest
+
+
+THRESHOLD = 0.6
+
+
+@pytest.mark.parametrize("term, text, expected", [
+    # From the pg_trgm documentation and regression tests.
+    ("word", "two words", 0.8),
+    ("Kabankala", "Kabankala", 1.0),
+    ("Kabankala", "Kabankalan City Public Plaza", 0.9),
+    ("Kabankala", "Abankala", 0.7),
+    ("Kabankala", "Ntombankala School", 0.6),
+])
+def test_word_similarity_matches_pg_trgm(term, text, expected):
+    assert word_similarity(term, text) == pytest.approx(expected, abs=1e-6)
+
+
+def test_prefix_matches_in_normalized_form():
+    assert matches("ACME INC", "  acme   inc. of florida", THRESHOLD)
+    assert TermMatcher(["ACME INC"], THRESHOLD).search("acme  Inc of Florida") == {"ACME INC"}
+
+
+def test_fuzzy_matches_similar_words():
+    assert TermMatcher(["ACME HOLDINGS", "ZEPHYR"], THRESHOLD).search("ACME HOLDING CO") == {"ACME HOLDINGS"}
+
+
+def test_no_match_inside_a_word():
+    assert TermMatcher(["AC"], THRESHOLD).search("BAC INC") == set()
+    assert not matches("AC", "BAC INC", THRESHOLD)
+
+
+def test_blank_term_matches_nothing():
+    assert TermMatcher([""], THRESHOLD).search("ACME") == set()
+    assert not matches("", "ACME", THRESHOLD)